@@ -0,0 +1,13 @@
+-- Migration (optional): Index for GET /merchants/parcels/available
+-- The endpoint runs one anti-join: a merchant's pending parcels with no
+-- pickup_request_parcels row. This partial index keeps the parcels side
+-- small no matter how much delivered history a merchant has; the junction
+-- side uses idx_pickup_request_parcels_parcel_id.
+
+CREATE INDEX IF NOT EXISTS idx_parcels_sender_pending
+    ON parcels(sender_id, created_at)
+    WHERE status = 'pending';
+
+-- Make sure the junction lookup index exists (created by pickup_parcels_junction_migration.sql)
+CREATE INDEX IF NOT EXISTS idx_pickup_request_parcels_parcel_id
+    ON pickup_request_parcels(parcel_id);
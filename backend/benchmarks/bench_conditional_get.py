@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark: polling with and without If-None-Match
+Polls the endpoints the frontend refreshes against the in-process fake PostgREST
+while nothing changes, and compares latency, response bytes and upstream bytes
+"""
+
+import asyncio
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+# Run against a fake Supabase URL and import the backend app
+os.environ.setdefault("SUPABASE_URL", "http://supabase.bench")
+os.environ.setdefault("SUPABASE_ANON_KEY", "bench-key")
+os.environ.setdefault("UPSTREAM_TRACE_MAX_CALLS", "1000000")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import main  # noqa: E402
+from fake_postgrest import FakePostgREST, seed_dataset  # noqa: E402
+from storage import create_storage  # noqa: E402
+from supabase_client import supabase_http  # noqa: E402
+
+ROUND_TRIP_MS = float(os.getenv("BENCH_ROUND_TRIP_MS", "5"))
+POLLS = int(os.getenv("BENCH_POLLS", "200"))
+UPSTREAM = re.compile(r'desc="(\d+) calls, (\d+) bytes"')
+
+
+async def poll(client: httpx.AsyncClient, url: str, headers: dict, conditional: bool):
+    """Mean ms, response bytes and upstream bytes per poll of an unchanged resource"""
+    etag = (await client.get(url, headers=headers)).headers.get("etag")
+    if conditional:
+        headers = {**headers, "If-None-Match": etag}
+
+    body_bytes = upstream_bytes = 0
+    statuses = set()
+    started = time.perf_counter()
+    for _ in range(POLLS):
+        response = await client.get(url, headers=headers)
+        statuses.add(response.status_code)
+        body_bytes += len(response.content)
+        upstream = UPSTREAM.search(response.headers.get("server-timing", ""))
+        if upstream:
+            upstream_bytes += int(upstream.group(2))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    return elapsed_ms / POLLS, body_bytes / POLLS, upstream_bytes / POLLS, statuses
+
+
+async def main_bench():
+    fake = FakePostgREST(latency_ms=ROUND_TRIP_MS)
+    seed_dataset(fake, merchants=200, parcels=20_000, pickup_requests=2_000, seed=7)
+    main.storage = create_storage("postgrest")
+    supabase_http._client = httpx.AsyncClient(transport=fake.transport())
+
+    merchant_id = next(p["id"] for p in fake.table("profiles").rows.values() if p["role"] == "merchant")
+    parcel_id = next(p["id"] for p in fake.table("parcels").rows.values() if p["sender_id"] == merchant_id)
+    merchant = {"Authorization": "Bearer " + main.create_access_token({"sub": merchant_id, "role": "merchant"})}
+    admin = {"Authorization": "Bearer " + main.create_access_token({"sub": "admin", "role": "admin"})}
+
+    cases = [
+        ("GET /parcels (admin, 200 rows)", "/parcels?limit=200", admin),
+        ("GET /parcels (merchant)", "/parcels", merchant),
+        ("GET /parcels?fields=summary", "/parcels?fields=summary&include_total=true", merchant),
+        ("GET /parcels/{id}", f"/parcels/{parcel_id}", merchant),
+        ("GET /pickup-requests", "/pickup-requests", merchant),
+        ("GET /merchant/stats", "/merchant/stats", merchant),
+    ]
+
+    print(f"Simulated Supabase round trip: {ROUND_TRIP_MS:.0f} ms, {POLLS} polls per case, nothing changes")
+    print(f"{'endpoint':<36} | {'mode':<11} | {'status':>6} | {'ms/poll':>8} | {'body B':>8} | {'upstream B':>10}")
+    print("-" * 96)
+    async with main.app.router.lifespan_context(main.app):
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+        for name, url, headers in cases:
+            for conditional in (False, True):
+                ms, body, upstream, statuses = await poll(client, url, headers, conditional)
+                mode = "conditional" if conditional else "plain"
+                status = ",".join(str(s) for s in sorted(statuses))
+                print(f"{name:<36} | {mode:<11} | {status:>6} | {ms:>8.2f} | {body:>8.0f} | {upstream:>10.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main_bench())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of PrometheusMiddleware per request
+Drives a small FastAPI app directly through ASGI (no sockets, no HTTP client)
+with and without the middleware and reports the added time per request.
+The figure is noisy on shared machines, so it is the median of paired rounds
+and the spread across rounds is printed with it
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from fastapi import FastAPI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics import PrometheusMiddleware  # noqa: E402
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "20000"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "9"))
+
+
+def build_app(with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/parcels/{parcel_id}")
+    async def get_parcel(parcel_id: str):
+        return {"id": parcel_id}
+
+    if with_metrics:
+        app.add_middleware(PrometheusMiddleware)
+    return app
+
+
+async def drive(app, count: int) -> float:
+    """Send count GET requests straight into the ASGI app; returns seconds elapsed"""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for i in range(count):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": f"/parcels/{i}",
+            "raw_path": f"/parcels/{i}".encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [],
+            "client": ("127.0.0.1", 1234),
+            "server": ("127.0.0.1", 8000)
+        }
+        await app(scope, receive, send)
+    return time.perf_counter() - started
+
+
+async def main_bench():
+    plain = build_app(with_metrics=False)
+    instrumented = build_app(with_metrics=True)
+
+    # Warm up routing, label children and the event loop
+    await drive(plain, 1000)
+    await drive(instrumented, 1000)
+
+    # Interleave the two apps so both see the same machine load in each round,
+    # and compare within a round rather than the best of each across rounds
+    plain_rounds, added_rounds = [], []
+    for _ in range(ROUNDS):
+        plain_us = await drive(plain, REQUESTS) / REQUESTS * 1e6
+        instrumented_us = await drive(instrumented, REQUESTS) / REQUESTS * 1e6
+        plain_rounds.append(plain_us)
+        added_rounds.append(instrumented_us - plain_us)
+
+    plain_us = statistics.median(plain_rounds)
+    added_us = statistics.median(added_rounds)
+    print(f"Requests per round: {REQUESTS} (median of {ROUNDS} paired rounds)")
+    print(f"{'without metrics':>18}: {plain_us:8.2f} us/request")
+    print(f"{'with metrics':>18}: {plain_us + added_us:8.2f} us/request")
+    print(f"{'added cost':>18}: {added_us:8.2f} us/request ({added_us / plain_us * 100:.1f}%), "
+          f"rounds ranged {min(added_rounds):.2f} to {max(added_rounds):.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main_bench())
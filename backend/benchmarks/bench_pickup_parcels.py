@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark: GET /pickup-requests/{id}/parcels hydration
+Compares the old one-GET-per-parcel loop with the single embedded
+junction fetch against a mocked Supabase that adds a fixed round-trip latency
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import unquote
+
+import httpx
+import orjson
+
+# Run against a fake Supabase URL and import the backend app
+os.environ.setdefault("SUPABASE_URL", "http://supabase.bench")
+os.environ.setdefault("SUPABASE_ANON_KEY", "bench-key")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+from storage_postgrest import supabase_request  # noqa: E402
+from supabase_client import supabase_http  # noqa: E402
+
+ROUND_TRIP_MS = float(os.getenv("BENCH_ROUND_TRIP_MS", "20"))
+PICKUP_SIZES = [1, 10, 50, 200, 500]
+
+
+class FakeSupabase:
+    """Minimal PostgREST stand-in for the parcels and junction tables"""
+
+    def __init__(self, pickup_size: int):
+        self.round_trips = 0
+        self.request_id = str(uuid.uuid4())
+        self.parcels = {}
+        for i in range(pickup_size):
+            parcel_id = str(uuid.uuid4())
+            self.parcels[parcel_id] = {
+                "id": parcel_id,
+                "tracking_id": f"FT{i:08d}",
+                "sender_id": "merchant-1",
+                "recipient_name": f"Recipient {i}",
+                "recipient_phone": "01700000000",
+                "origin_address": "Dhaka",
+                "destination_address": "Dhaka",
+                "package_description": None,
+                "weight": 1.0,
+                "dimensions": None,
+                "status": "pending",
+                "created_at": "2025-01-01T00:00:00",
+                "updated_at": "2025-01-01T00:00:00"
+            }
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.round_trips += 1
+        await asyncio.sleep(ROUND_TRIP_MS / 1000)
+        path = request.url.path.rsplit("/", 1)[-1]
+        query = unquote(request.url.query.decode())
+
+        if path == "pickup_request_parcels" and "parcels(" in query:
+            rows = [{"parcel_id": parcel_id, "parcels": parcel} for parcel_id, parcel in self.parcels.items()]
+        elif path == "pickup_request_parcels":
+            rows = [{"parcel_id": parcel_id} for parcel_id in self.parcels]
+        elif "id=in.(" in query:
+            ids = query.split("id=in.(", 1)[1].split(")", 1)[0].split(",")
+            rows = [self.parcels[i] for i in ids if i in self.parcels]
+        else:
+            parcel_id = query.split("id=eq.", 1)[1].split("&", 1)[0]
+            rows = [self.parcels[parcel_id]] if parcel_id in self.parcels else []
+
+        return httpx.Response(200, json=rows)
+
+
+async def old_get_pickup_request_parcels(request_id: str):
+    """The previous N+1 implementation, kept here for comparison"""
+    parcels_data = await supabase_request(
+        f"pickup_request_parcels?pickup_request_id=eq.{request_id}",
+        "GET"
+    )
+    parcels = []
+    for item in parcels_data:
+        parcel_data = await supabase_request(f"parcels?id=eq.{item['parcel_id']}", "GET")
+        if parcel_data:
+            parcels.append(parcel_data[0])
+    return parcels
+
+
+async def run_case(pickup_size: int, batched: bool):
+    fake = FakeSupabase(pickup_size)
+    supabase_http._client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handler))
+    token = {"sub": "merchant-1", "role": "admin"}
+
+    started = time.perf_counter()
+    if batched:
+        # The handler returns an ORJSONResponse; decoding it keeps the comparison on parsed rows
+        response = await main.get_pickup_request_parcels(fake.request_id, token)
+        parcels = orjson.loads(response.body)
+    else:
+        parcels = await old_get_pickup_request_parcels(fake.request_id)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    await supabase_http.close()
+    assert len(parcels) == pickup_size
+    return fake.round_trips, elapsed_ms
+
+
+async def main_bench():
+    print(f"Simulated Supabase round trip: {ROUND_TRIP_MS:.0f} ms")
+    print(f"{'parcels':>8} | {'old trips':>9} | {'old ms':>9} | {'new trips':>9} | {'new ms':>9} | {'speedup':>7}")
+    print("-" * 68)
+    for size in PICKUP_SIZES:
+        old_trips, old_ms = await run_case(size, batched=False)
+        new_trips, new_ms = await run_case(size, batched=True)
+        print(f"{size:>8} | {old_trips:>9} | {old_ms:>9.1f} | {new_trips:>9} | {new_ms:>9.1f} | {old_ms / new_ms:>6.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main_bench())
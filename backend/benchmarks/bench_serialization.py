@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serialising and compressing a 10k-parcel response
+Part 1 times each way of turning 10k seeded parcel rows into JSON bytes, and
+the size and cost of each compression setting. Part 2 measures GET /parcels?limit=10000
+end to end against the in-process fake PostgREST, before (response_model
+validation, no compression) and after (trusted rows + orjson, gzip, brotli)
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import httpx
+
+# Run against a fake Supabase URL, with pages large enough for one 10k-row response
+os.environ.setdefault("SUPABASE_URL", "http://supabase.bench")
+os.environ.setdefault("SUPABASE_ANON_KEY", "bench-key")
+os.environ["MAX_PAGE_SIZE"] = "10000"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+import compression  # noqa: E402
+import main  # noqa: E402
+import responses  # noqa: E402
+from fake_postgrest import FakePostgREST, seed_dataset  # noqa: E402
+from storage import create_storage  # noqa: E402
+from supabase_client import supabase_http  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROWS = 10_000
+REPEATS = int(os.getenv("BENCH_REPEATS", "20"))
+UPSTREAM_MS = re.compile(r"supabase;dur=([\d.]+)")
+
+
+def timed(function, repeats: int = REPEATS):
+    """(median ms, last result) over repeats"""
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def serialisation_table(rows: List[dict]):
+    adapter = TypeAdapter(List[main.ParcelListItem])
+    cases = [
+        ("jsonable_encoder + json.dumps", lambda: json.dumps(jsonable_encoder(rows)).encode()),
+        ("response_model validate + json.dumps", lambda: json.dumps(
+            adapter.dump_python(adapter.validate_python(rows), exclude_unset=True)
+        ).encode()),
+        ("response_model validate + dump_json", lambda: adapter.dump_json(
+            adapter.validate_python(rows), exclude_unset=True
+        )),
+        ("trusted rows + orjson", lambda: responses.ORJSONResponse(
+            responses.project_rows(rows, main.ParcelListItem)
+        ).body),
+    ]
+
+    print(f"Serialising {len(rows)} parcel rows (median of {REPEATS})")
+    print(f"{'method':<40} | {'ms':>8} | {'bytes':>10}")
+    print("-" * 64)
+    body = b""
+    for name, function in cases:
+        ms, body = timed(function)
+        print(f"{name:<40} | {ms:>8.1f} | {len(body):>10}")
+    return body
+
+
+def compression_table(body: bytes):
+    cases = [(f"gzip level {level}", lambda level=level: gzip.compress(body, compresslevel=level)) for level in (1, 6, 9)]
+    if brotli is not None:
+        cases += [(f"brotli quality {q}", lambda q=q: brotli.compress(body, quality=q)) for q in (1, 4, 6)]
+
+    print(f"\nCompressing the {len(body)}-byte body")
+    print(f"{'setting':<40} | {'ms':>8} | {'bytes':>10} | {'ratio':>6}")
+    print("-" * 73)
+    for name, function in cases:
+        ms, compressed = timed(function)
+        print(f"{name:<40} | {ms:>8.1f} | {len(compressed):>10} | {len(compressed) / len(body):>6.3f}")
+
+
+async def end_to_end_table(fake: FakePostgREST):
+    main.storage = create_storage("postgrest")
+    supabase_http._client = httpx.AsyncClient(transport=fake.transport())
+    admin = {"Authorization": "Bearer " + main.create_access_token({"sub": "admin", "role": "admin"})}
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def measure(accept_encoding: str):
+        samples, app_samples = [], []
+        wire_bytes = 0
+        for _ in range(REPEATS):
+            request = httpx.Request(
+                "GET",
+                f"http://bench/parcels?limit={ROWS}",
+                headers={**admin, "Accept-Encoding": accept_encoding}
+            )
+            started = time.perf_counter()
+            response = await transport.handle_async_request(request)
+            wire_bytes = len(b"".join([chunk async for chunk in response.stream]))
+            elapsed = (time.perf_counter() - started) * 1000
+            upstream = UPSTREAM_MS.search(response.headers.get("server-timing", ""))
+            samples.append(elapsed)
+            app_samples.append(elapsed - (float(upstream.group(1)) if upstream else 0.0))
+        return statistics.median(samples), statistics.median(app_samples), wire_bytes
+
+    cases = [
+        ("before: response_model, identity", False, "identity"),
+        ("after: trusted + orjson, identity", True, "identity"),
+        ("after: trusted + orjson, gzip", True, "gzip"),
+        ("after: trusted + orjson, br", True, "br"),
+    ]
+
+    print(f"\nGET /parcels?limit={ROWS} through the app (median of {REPEATS}; upstream excluded from 'app ms')")
+    print(f"{'case':<40} | {'total ms':>8} | {'app ms':>8} | {'wire bytes':>10}")
+    print("-" * 76)
+    async with main.app.router.lifespan_context(main.app):
+        for name, trusted, accept_encoding in cases:
+            if accept_encoding == "br" and brotli is None:
+                continue
+            responses.TRUST_STORAGE_ROWS = trusted
+            compression.COMPRESSION_ENABLED = accept_encoding != "identity"
+            total_ms, app_ms, wire_bytes = await measure(accept_encoding)
+            print(f"{name:<40} | {total_ms:>8.1f} | {app_ms:>8.1f} | {wire_bytes:>10}")
+
+
+def main_bench():
+    fake = FakePostgREST(latency_ms=0)
+    seed_dataset(fake, merchants=50, parcels=ROWS, pickup_requests=500, seed=11)
+    rows = list(fake.table("parcels").rows.values())
+
+    body = serialisation_table(rows)
+    compression_table(body)
+    asyncio.run(end_to_end_table(fake))
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,827 @@
+"""
+In-process stand-in for Supabase's PostgREST API, for benchmarks
+Serves /rest/v1/<table> from Python dicts through an httpx transport and
+supports the subset of PostgREST that backend/main.py uses:
+
+  filters  eq, neq, gt, gte, lt, lte, in, like, ilike, is, not.<op>,
+           or=(...) / and=(...) with nesting
+  select   column lists and embedded resources (name(cols), name!left(cols),
+           name!inner(cols)), plus top-level embed filters (embed=is.null)
+  paging   order, limit, offset
+  Prefer   return=representation, count=exact (GET and HEAD),
+           resolution=ignore-duplicates / merge-duplicates with on_conflict
+  methods  GET, HEAD, POST (object or array), PATCH, PUT, DELETE
+
+Columns are not validated, so unknown columns are stored as given. Equality
+and in() lookups on indexed columns, and ordered scans that can stop at the
+limit, keep queries fast on a 100k-row dataset.
+"""
+
+import asyncio
+import json
+import random
+import re
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import httpx
+
+# table -> (indexed columns, unique column groups)
+SCHEMA = {
+    "profiles": (["email", "role"], [("email",)]),
+    "parcels": (["sender_id", "tracking_id", "status"], [("tracking_id",)]),
+    "pickup_requests": (["merchant_id", "status"], []),
+    "pickup_request_parcels": (["pickup_request_id", "parcel_id"], [("pickup_request_id", "parcel_id")]),
+    "couriers": (["status"], []),
+}
+
+# (table, column) -> referenced table
+FOREIGN_KEYS = {
+    ("parcels", "sender_id"): "profiles",
+    ("pickup_requests", "merchant_id"): "profiles",
+    ("pickup_requests", "courier_id"): "couriers",
+    ("pickup_request_parcels", "pickup_request_id"): "pickup_requests",
+    ("pickup_request_parcels", "parcel_id"): "parcels",
+}
+
+# Column defaults applied on insert
+DEFAULTS = {
+    "profiles": {"role": "merchant", "status": "active"},
+    "parcels": {"status": "pending"},
+    "pickup_requests": {"status": "pending", "package_count": 1},
+    "couriers": {"status": "active"},
+}
+
+
+class PostgRESTError(Exception):
+    def __init__(self, status_code: int, code: str, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.message = message
+
+
+def now_iso() -> str:
+    return datetime.utcnow().isoformat(timespec="microseconds")
+
+
+# ---------------------------------------------------------------- parsing
+
+def split_top_level(text: str) -> List[str]:
+    """Split on commas outside parentheses and double quotes"""
+    parts, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    if current:
+        parts.append("".join(current))
+    return parts
+
+
+def unquote_value(value: str) -> str:
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1].replace('\\"', '"')
+    return value
+
+
+def coerce(raw: str, sample):
+    """Convert a filter value to the type of the stored value it is compared with"""
+    if isinstance(sample, bool):
+        return raw == "true"
+    if isinstance(sample, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+_like_cache: Dict[Tuple[str, bool], re.Pattern] = {}
+
+
+def like_pattern(pattern: str, ignore_case: bool) -> re.Pattern:
+    key = (pattern, ignore_case)
+    if key not in _like_cache:
+        regex = "^" + ".*".join(re.escape(part) for part in re.split(r"[*%]", pattern)) + "$"
+        _like_cache[key] = re.compile(regex, re.IGNORECASE if ignore_case else 0)
+    return _like_cache[key]
+
+
+class Condition:
+    """column.op.value, optionally negated; evaluated against a row"""
+
+    __slots__ = ("column", "op", "value", "negate", "values")
+
+    def __init__(self, column: str, expression: str):
+        negate = False
+        if expression.startswith("not."):
+            negate = True
+            expression = expression[4:]
+        op, _, value = expression.partition(".")
+        if op not in ("eq", "neq", "gt", "gte", "lt", "lte", "in", "like", "ilike", "is"):
+            raise PostgRESTError(400, "PGRST100", f"unsupported operator: {op}")
+        self.column = column
+        self.op = op
+        self.negate = negate
+        self.value = unquote_value(value)
+        self.values = None
+        if op == "in":
+            inner = value[1:-1] if value.startswith("(") and value.endswith(")") else value
+            self.values = [unquote_value(v) for v in split_top_level(inner)]
+
+    def matches(self, row: dict) -> bool:
+        result = self._matches(row.get(self.column))
+        return not result if self.negate else result
+
+    def _matches(self, stored) -> bool:
+        op = self.op
+        if op == "is":
+            if self.value == "null":
+                return stored is None
+            return stored is (self.value == "true")
+        if stored is None:
+            return False
+        if op == "in":
+            return any(stored == coerce(v, stored) for v in self.values)
+        if op in ("like", "ilike"):
+            return bool(like_pattern(self.value, op == "ilike").match(str(stored)))
+        value = coerce(self.value, stored)
+        try:
+            if op == "eq":
+                return stored == value
+            if op == "neq":
+                return stored != value
+            if op == "gt":
+                return stored > value
+            if op == "gte":
+                return stored >= value
+            if op == "lt":
+                return stored < value
+            return stored <= value
+        except TypeError:
+            return False
+
+
+class Group:
+    """or(...) / and(...) of conditions and nested groups"""
+
+    def __init__(self, kind: str, body: str):
+        self.kind = kind
+        self.items = [parse_logic_item(item) for item in split_top_level(body)]
+
+    def matches(self, row: dict) -> bool:
+        if self.kind == "or":
+            return any(item.matches(row) for item in self.items)
+        return all(item.matches(row) for item in self.items)
+
+
+def parse_logic_item(item: str):
+    for kind in ("or", "and"):
+        if item.startswith(f"{kind}(") and item.endswith(")"):
+            return Group(kind, item[len(kind) + 1:-1])
+    column, _, expression = item.partition(".")
+    return Condition(column, expression)
+
+
+class EmbedFilter:
+    """embed=is.null / embed=not.is.null on an embedded resource"""
+
+    def __init__(self, alias: str, expression: str):
+        if expression not in ("is.null", "not.is.null"):
+            raise PostgRESTError(400, "PGRST100", f"unsupported embed filter: {expression}")
+        self.alias = alias
+        self.want_null = expression == "is.null"
+
+
+class Embed:
+    def __init__(self, name: str, hint: Optional[str], select: list):
+        self.name = name
+        self.hint = hint
+        self.select = select
+
+
+def parse_select(text: str) -> list:
+    """Column names, "*" and Embed entries"""
+    items = []
+    for item in split_top_level(text or "*"):
+        item = item.strip()
+        if not item:
+            continue
+        if "(" in item and item.endswith(")"):
+            head, _, inner = item.partition("(")
+            name, _, hint = head.partition("!")
+            items.append(Embed(name.split(":")[-1], hint or None, parse_select(inner[:-1])))
+        else:
+            items.append(item.split("::")[0])
+    return items
+
+
+def parse_order(text: Optional[str]) -> List[Tuple[str, bool]]:
+    order = []
+    for part in (text or "").split(","):
+        if not part:
+            continue
+        column, *modifiers = part.split(".")
+        order.append((column, "desc" in modifiers))
+    return order
+
+
+def sort_rows(items: list, order: List[Tuple[str, bool]], get_row: Callable = lambda item: item):
+    """Sort in place, one stable pass per column from last to first"""
+    for column, desc in reversed(order):
+        # (is_null, value): nulls last ascending and, reversed, first descending
+        items.sort(key=lambda item: (get_row(item).get(column) is None, get_row(item).get(column) or ""), reverse=desc)
+
+
+def compare_rows(a: dict, b: dict, order: List[Tuple[str, bool]]) -> int:
+    """Postgres default null placement: last for ascending, first for descending"""
+    for column, desc in order:
+        x, y = a.get(column), b.get(column)
+        if x == y:
+            continue
+        if x is None or y is None:
+            result = 1 if x is None else -1
+        else:
+            result = -1 if x < y else 1
+        return -result if desc else result
+    return 0
+
+
+def parse_prefer(header: str) -> Dict[str, str]:
+    prefs = {}
+    for part in header.split(","):
+        key, _, value = part.strip().partition("=")
+        if key:
+            prefs[key] = value
+    return prefs
+
+
+# ---------------------------------------------------------------- storage
+
+class Table:
+    """Rows by id with hash indexes, unique constraints and sort orders kept up to date on writes"""
+
+    def __init__(self, name: str, indexed: List[str], unique: List[tuple]):
+        self.name = name
+        self.rows: Dict[str, dict] = {}
+        self.indexes = {column: defaultdict(set) for column in indexed}
+        self.unique = {columns: {} for columns in unique}
+        self._orders: Dict[tuple, List[str]] = {}
+
+    def _index_add(self, row: dict):
+        for column, index in self.indexes.items():
+            index[row.get(column)].add(row["id"])
+        for columns, keys in self.unique.items():
+            keys[tuple(row.get(c) for c in columns)] = row["id"]
+
+    def _index_remove(self, row: dict):
+        for column, index in self.indexes.items():
+            ids = index.get(row.get(column))
+            if ids is not None:
+                ids.discard(row["id"])
+                if not ids:
+                    del index[row.get(column)]
+        for columns, keys in self.unique.items():
+            key = tuple(row.get(c) for c in columns)
+            if keys.get(key) == row["id"]:
+                del keys[key]
+
+    def conflict(self, row: dict, columns: Optional[tuple] = None) -> Optional[str]:
+        """Id of an existing row that row would collide with, if any"""
+        if row.get("id") in self.rows and columns in (None, ("id",)):
+            return row["id"]
+        groups = [columns] if columns and columns in self.unique else list(self.unique)
+        for group in groups:
+            existing = self.unique[group].get(tuple(row.get(c) for c in group))
+            if existing is not None and existing != row.get("id"):
+                return existing
+        return None
+
+    def _place(self, ids: List[str], row: dict, order: List[Tuple[str, bool]]):
+        """Binary-search insert into a cached order (after any equal rows)"""
+        low, high = 0, len(ids)
+        while low < high:
+            middle = (low + high) // 2
+            if compare_rows(self.rows[ids[middle]], row, order) <= 0:
+                low = middle + 1
+            else:
+                high = middle
+        ids.insert(low, row["id"])
+
+    def insert(self, row: dict):
+        self.rows[row["id"]] = row
+        self._index_add(row)
+        for order, ids in self._orders.items():
+            self._place(ids, row, list(order))
+
+    def update(self, row_id: str, changes: dict):
+        row = self.rows[row_id]
+        self._index_remove(row)
+        reordered = [(order, ids) for order, ids in self._orders.items() if any(column in changes for column, _ in order)]
+        for _, ids in reordered:
+            ids.remove(row_id)
+        row.update(changes)
+        self._index_add(row)
+        for order, ids in reordered:
+            self._place(ids, row, list(order))
+
+    def delete(self, row_id: str) -> dict:
+        row = self.rows.pop(row_id)
+        self._index_remove(row)
+        for ids in self._orders.values():
+            ids.remove(row_id)
+        return row
+
+    def lookup(self, column: str, values: List[str]) -> Optional[set]:
+        """Ids whose column equals one of values, or None when the column is not indexed"""
+        if column == "id":
+            return {v for v in values if v in self.rows}
+        index = self.indexes.get(column)
+        if index is None:
+            return None
+        if len(values) == 1:
+            return index.get(values[0], set())
+        found = set()
+        for value in values:
+            found |= index.get(value, set())
+        return found
+
+    def estimate(self, column: str, values: List[str]) -> Optional[int]:
+        """Size of lookup(column, values) without building it, or None when not indexed"""
+        if column == "id":
+            return len(values)
+        index = self.indexes.get(column)
+        if index is None:
+            return None
+        return sum(len(index.get(value, ())) for value in values)
+
+    def ordered_ids(self, order: List[Tuple[str, bool]]) -> List[str]:
+        key = tuple(order)
+        if key not in self._orders:
+            ids = list(self.rows)
+            sort_rows(ids, order, self.rows.__getitem__)
+            self._orders[key] = ids
+        return self._orders[key]
+
+
+# ---------------------------------------------------------------- server
+
+class FakePostgREST:
+    """PostgREST-compatible handler for an httpx.MockTransport"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.tables = {name: Table(name, indexed, unique) for name, (indexed, unique) in SCHEMA.items()}
+        self.requests = 0
+        self.requests_by_method: Dict[str, int] = defaultdict(int)
+        # Set to False to act like a database without status_transition_rpc_migration.sql
+        self.rpc_enabled = True
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def table(self, name: str) -> Table:
+        if name not in self.tables:
+            raise PostgRESTError(404, "42P01", f'relation "public.{name}" does not exist')
+        return self.tables[name]
+
+    # Seeding bypasses HTTP
+    def load(self, name: str, rows: List[dict]):
+        table = self.table(name)
+        for row in rows:
+            table.insert(self._with_defaults(name, row))
+
+    def _with_defaults(self, name: str, row: dict) -> dict:
+        stamp = now_iso()
+        full = {**DEFAULTS.get(name, {}), **row}
+        full.setdefault("id", str(uuid.uuid4()))
+        full.setdefault("created_at", stamp)
+        if name != "pickup_request_parcels":
+            full.setdefault("updated_at", stamp)
+        return full
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.requests_by_method[request.method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        try:
+            return self._dispatch(request)
+        except PostgRESTError as e:
+            return httpx.Response(e.status_code, json={"code": e.code, "message": e.message, "details": None, "hint": None})
+
+    def _dispatch(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if not path.startswith("/rest/v1/"):
+            raise PostgRESTError(404, "PGRST125", f"invalid path {path}")
+        if path.startswith("/rest/v1/rpc/"):
+            return self._rpc(path[len("/rest/v1/rpc/"):], json.loads(request.content or b"{}"))
+        table = self.table(path[len("/rest/v1/"):])
+        params = parse_qsl(request.url.query.decode(), keep_blank_values=True)
+        prefer = parse_prefer(request.headers.get("prefer", ""))
+
+        query = Query(self, table, params)
+        method = request.method
+
+        if method in ("GET", "HEAD"):
+            rows, total = query.run(count=prefer.get("count") == "exact", body=method == "GET")
+            headers = {}
+            if total is not None:
+                end = query.offset + len(rows) - 1
+                headers["content-range"] = f"{query.offset}-{end}/{total}" if rows else f"*/{total}"
+            body = b"" if method == "HEAD" else json.dumps(rows).encode()
+            return httpx.Response(200, content=body, headers={"content-type": "application/json", **headers})
+
+        payload = json.loads(request.content) if request.content else None
+        if method == "POST":
+            affected = self._insert(table, payload, query, prefer)
+            status_code = 201
+        elif method in ("PATCH", "PUT"):
+            affected = self._update(table, payload or {}, query)
+            status_code = 200
+        elif method == "DELETE":
+            affected = [table.delete(row["id"]) for row in query.matching_rows()]
+            status_code = 200
+        else:
+            raise PostgRESTError(405, "PGRST117", f"unsupported method {method}")
+
+        if prefer.get("return") != "representation":
+            return httpx.Response(201 if method == "POST" else 204)
+        return httpx.Response(
+            status_code,
+            content=json.dumps([query.project(row) for row in affected]).encode(),
+            headers={"content-type": "application/json"}
+        )
+
+    def _insert(self, table: Table, payload, query: "Query", prefer: dict) -> List[dict]:
+        rows = payload if isinstance(payload, list) else [payload]
+        on_conflict = query.on_conflict
+        resolution = prefer.get("resolution")
+        inserted, pending = [], []
+        for row in rows:
+            full = self._with_defaults(table.name, row)
+            existing = table.conflict(full, on_conflict)
+            # Also catch duplicates inside the same batch
+            if existing is None and any(_same_key(full, other, table, on_conflict) for other in pending):
+                existing = "batch"
+            if existing is not None:
+                if resolution == "ignore-duplicates":
+                    continue
+                if resolution == "merge-duplicates" and existing != "batch":
+                    pending.append(("merge", existing, row))
+                    continue
+                raise PostgRESTError(409, "23505", f"duplicate key value violates unique constraint on {table.name}")
+            pending.append(full)
+        # All-or-nothing, like one INSERT statement
+        for item in pending:
+            if isinstance(item, tuple):
+                _, existing, changes = item
+                table.update(existing, changes)
+                inserted.append(table.rows[existing])
+            else:
+                table.insert(item)
+                inserted.append(item)
+        return inserted
+
+    def _rpc(self, name: str, args: dict) -> httpx.Response:
+        """The functions from the backend's *_migration.sql files"""
+        if name != "status_transition" or not self.rpc_enabled:
+            raise PostgRESTError(404, "PGRST202", f"Could not find the function public.{name}")
+        table = self.table(args["p_table"])
+        changes = args["p_changes"]
+
+        def matches(row: dict) -> bool:
+            for column, value in args["p_filters"].items():
+                stored = row.get(column)
+                if isinstance(value, list):
+                    if stored not in value:
+                        return False
+                elif stored != value:
+                    return False
+            return True
+
+        updated = []
+        for row in [row for row in table.rows.values() if matches(row)]:
+            previous_status = row.get("status")
+            table.update(row["id"], changes)
+            updated.append({**table.rows[row["id"]], "previous_status": previous_status})
+        return httpx.Response(200, content=json.dumps(updated).encode(), headers={"content-type": "application/json"})
+
+    def _update(self, table: Table, changes: dict, query: "Query") -> List[dict]:
+        matched = query.matching_rows()
+        for row in matched:
+            if table.conflict({**row, **changes}) not in (None, row["id"]):
+                raise PostgRESTError(409, "23505", f"duplicate key value violates unique constraint on {table.name}")
+        for row in matched:
+            table.update(row["id"], changes)
+        return matched
+
+
+def _same_key(row: dict, other, table: Table, on_conflict: Optional[tuple]) -> bool:
+    if isinstance(other, tuple):
+        return False
+    groups = [on_conflict] if on_conflict else list(table.unique)
+    return any(all(row.get(c) == other.get(c) for c in group) for group in groups)
+
+
+class Query:
+    """Filters, embeds, order and paging parsed from one request's query string"""
+
+    def __init__(self, server: FakePostgREST, table: Table, params: List[Tuple[str, str]]):
+        self.server = server
+        self.table = table
+        self.select = parse_select("*")
+        self.order: List[Tuple[str, bool]] = []
+        self.limit: Optional[int] = None
+        self.offset = 0
+        self.on_conflict: Optional[tuple] = None
+        self.filters = []
+        self.embed_filters: List[EmbedFilter] = []
+        embed_params = []
+
+        for key, value in params:
+            if key == "select":
+                self.select = parse_select(value)
+            elif key == "order":
+                self.order = parse_order(value)
+            elif key == "limit":
+                self.limit = int(value)
+            elif key == "offset":
+                self.offset = int(value)
+            elif key == "on_conflict":
+                self.on_conflict = tuple(value.split(","))
+            elif key in ("or", "and"):
+                self.filters.append(Group(key, value[1:-1]))
+            else:
+                embed_params.append((key, value))
+
+        embed_names = {item.name for item in self.select if isinstance(item, Embed)}
+        for key, value in embed_params:
+            if key in embed_names:
+                self.embed_filters.append(EmbedFilter(key, value))
+            else:
+                self.filters.append(Condition(key, value))
+
+        self.inner_embeds = [item for item in self.select if isinstance(item, Embed) and item.hint == "inner"]
+        self._residual = self.filters
+
+    # Candidate rows
+    def _candidate_ids(self) -> Optional[set]:
+        """
+        Narrowest index match among the top-level eq/in filters, or None for a full scan
+
+        The filter that produced the candidates is moved out of self._residual,
+        since every candidate already satisfies it.
+        """
+        best_size, used = None, None
+        for condition in self.filters:
+            if not isinstance(condition, Condition) or condition.negate or condition.op not in ("eq", "in"):
+                continue
+            size = self.table.estimate(condition.column, self._lookup_values(condition))
+            if size is not None and (best_size is None or size < best_size):
+                best_size, used = size, condition
+        self._residual = [condition for condition in self.filters if condition is not used]
+        if used is None:
+            return None
+        return self.table.lookup(used.column, self._lookup_values(used))
+
+    @staticmethod
+    def _lookup_values(condition: Condition) -> List[str]:
+        return condition.values if condition.op == "in" else [condition.value]
+
+    def _simple(self) -> bool:
+        """True when rows need no checks beyond the candidate lookup"""
+        return not self._residual and not self.embed_filters and not self.inner_embeds
+
+    def _matches(self, row: dict) -> bool:
+        if not all(condition.matches(row) for condition in self._residual):
+            return False
+        for embed_filter in self.embed_filters:
+            embed = next(item for item in self.select if isinstance(item, Embed) and item.name == embed_filter.alias)
+            if (not self._related(row, embed)) != embed_filter.want_null:
+                return False
+        for embed in self.inner_embeds:
+            if not self._related(row, embed):
+                return False
+        return True
+
+    def _matching(self, candidates: Optional[set]) -> List[dict]:
+        rows = self.table.rows
+        source = [rows[i] for i in candidates] if candidates is not None else list(rows.values())
+        if self._simple():
+            return source
+        return [row for row in source if self._matches(row)]
+
+    def matching_rows(self) -> List[dict]:
+        return self._matching(self._candidate_ids())
+
+    def run(self, count: bool = False, body: bool = True) -> Tuple[List[dict], Optional[int]]:
+        """Matching rows (projected, ordered, paged) and the exact total when count is set (or for HEAD)"""
+        end = None if self.limit is None else self.offset + self.limit
+        candidates = self._candidate_ids()
+        rows = self.table.rows
+
+        if candidates is None and self.order and not count and body:
+            # Walk the cached sort order and stop once the page is full
+            page = []
+            for row_id in self.table.ordered_ids(self.order):
+                row = rows[row_id]
+                if self._matches(row):
+                    page.append(row)
+                    if end is not None and len(page) >= end:
+                        break
+            return [self.project(row) for row in page[self.offset:end]], None
+
+        if not body:
+            # HEAD only needs the total; simple filters need only the candidate set size
+            if self._simple():
+                return [], len(candidates) if candidates is not None else len(rows)
+            return [], len(self._matching(candidates))
+
+        matched = self._matching(candidates)
+
+        if self.order:
+            sort_rows(matched, self.order)
+        page = matched[self.offset:end]
+        return [self.project(row) for row in page], (len(matched) if count else None)
+
+    # Projection
+    def _relation(self, embed: Embed) -> Tuple[str, str, bool]:
+        """(foreign key column, target table, to_one) for an embed of this table"""
+        for (table, column), target in FOREIGN_KEYS.items():
+            if table == self.table.name and target == embed.name:
+                return column, embed.name, True
+        for (table, column), target in FOREIGN_KEYS.items():
+            if table == embed.name and target == self.table.name:
+                return column, embed.name, False
+        raise PostgRESTError(400, "PGRST200", f"no relationship between {self.table.name} and {embed.name}")
+
+    def _related(self, row: dict, embed: Embed):
+        column, target_name, to_one = self._relation(embed)
+        target = self.server.table(target_name)
+        if to_one:
+            return target.rows.get(row.get(column))
+        ids = target.lookup(column, [row["id"]])
+        if ids is None:
+            return [child for child in target.rows.values() if child.get(column) == row["id"]]
+        return [target.rows[i] for i in ids]
+
+    def project(self, row: dict, select: list = None, table: Table = None) -> dict:
+        select = self.select if select is None else select
+        table = table or self.table
+        result = {}
+        for item in select:
+            if item == "*":
+                result.update(row)
+            elif isinstance(item, Embed):
+                nested = Query(self.server, table, [])
+                related = nested._related(row, item)
+                target = self.server.table(item.name)
+                if isinstance(related, list):
+                    result[item.name] = [self.project(child, item.select, target) for child in related]
+                else:
+                    result[item.name] = self.project(related, item.select, target) if related else None
+            else:
+                result[item] = row.get(item)
+        return result
+
+
+# ---------------------------------------------------------------- dataset
+
+PARCEL_STATUS_WEIGHTS = {
+    "pending": 25,
+    "assigned": 8,
+    "picked_up": 7,
+    "in_transit": 15,
+    "delivered": 38,
+    "returned": 3,
+    "cancelled": 4,
+}
+PICKUP_STATUS_WEIGHTS = {"pending": 20, "approved": 45, "rejected": 10, "completed": 25}
+CITIES = ["Dhaka", "Chattogram", "Khulna", "Rajshahi", "Sylhet", "Barishal", "Rangpur", "Mymensingh", "Cumilla", "Gazipur"]
+
+
+def seed_dataset(
+    server: FakePostgREST,
+    merchants: int = 5000,
+    parcels: int = 100_000,
+    pickup_requests: int = 20_000,
+    couriers: int = 200,
+    admins: int = 5,
+    seed: int = 42
+) -> dict:
+    """
+    Fill the fake with a synthetic but realistically skewed dataset
+
+    Parcel counts per merchant follow a long-tailed distribution, statuses
+    follow a delivery funnel, and timestamps spread over the last 180 days.
+    Returns the ids the load test needs to build requests.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    def stamp(days_ago_max: float) -> str:
+        return (now - timedelta(seconds=rng.uniform(0, days_ago_max * 86400))).isoformat(timespec="microseconds")
+
+    admin_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(admins)]
+    merchant_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(merchants)]
+    profiles = []
+    for i, admin_id in enumerate(admin_ids):
+        created = stamp(365)
+        profiles.append({
+            "id": admin_id, "email": f"admin{i}@fasttrack.test", "business_name": None,
+            "full_name": f"Admin {i}", "phone": "01700000000", "address": "Dhaka",
+            "role": "admin", "status": "active", "created_at": created, "updated_at": created
+        })
+    for i, merchant_id in enumerate(merchant_ids):
+        created = stamp(365)
+        profiles.append({
+            "id": merchant_id, "email": f"merchant{i}@fasttrack.test", "business_name": f"Shop {i}",
+            "full_name": f"Merchant {i}", "phone": f"017{i:08d}", "address": rng.choice(CITIES),
+            "role": "merchant", "status": "active", "created_at": created, "updated_at": created
+        })
+    server.load("profiles", profiles)
+
+    courier_rows = []
+    for i in range(couriers):
+        created = stamp(365)
+        courier_rows.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))), "full_name": f"Courier {i}",
+            "phone": f"018{i:08d}", "vehicle_type": rng.choice(["bike", "van", "truck"]),
+            "vehicle_number": f"DHK-{i:04d}", "coverage_area": rng.choice(CITIES),
+            "status": rng.choice(["active", "active", "active", "busy", "inactive"]),
+            "current_location": rng.choice(CITIES), "created_at": created, "updated_at": created
+        })
+    server.load("couriers", courier_rows)
+
+    # Long tail: a few merchants ship most parcels
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(merchants)]
+    senders = rng.choices(merchant_ids, weights=weights, k=parcels)
+    statuses = rng.choices(list(PARCEL_STATUS_WEIGHTS), weights=list(PARCEL_STATUS_WEIGHTS.values()), k=parcels)
+    parcel_rows = []
+    parcels_by_merchant: Dict[str, List[str]] = defaultdict(list)
+    tracking_ids = []
+    for i in range(parcels):
+        created = stamp(180)
+        parcel_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        tracking_id = f"FT{i:08X}"
+        city = rng.choice(CITIES)
+        parcel_rows.append({
+            "id": parcel_id, "tracking_id": tracking_id, "sender_id": senders[i],
+            "recipient_name": f"Recipient {rng.randrange(1_000_000)}", "recipient_phone": f"019{rng.randrange(10**8):08d}",
+            "origin_address": city, "destination_address": rng.choice(CITIES),
+            "package_description": rng.choice([None, "Documents", "Clothing", "Electronics", "Books"]),
+            "weight": round(rng.uniform(0.1, 20), 2), "dimensions": None, "status": statuses[i],
+            "pickup_date": None, "delivery_date": None, "created_at": created, "updated_at": created
+        })
+        parcels_by_merchant[senders[i]].append(parcel_id)
+        tracking_ids.append(tracking_id)
+    server.load("parcels", parcel_rows)
+
+    # Pickup requests for merchants with parcels, each linking a few of their non-pending parcels
+    active_merchants = list(parcels_by_merchant)
+    parcel_status = {row["id"]: row["status"] for row in parcel_rows}
+    pickup_rows, junction_rows = [], []
+    pickups_by_merchant: Dict[str, List[str]] = defaultdict(list)
+    linked = set()
+    for i in range(pickup_requests):
+        merchant_id = rng.choice(active_merchants)
+        created = stamp(180)
+        request_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        status = rng.choices(list(PICKUP_STATUS_WEIGHTS), weights=list(PICKUP_STATUS_WEIGHTS.values()))[0]
+        candidates = [p for p in parcels_by_merchant[merchant_id] if p not in linked and parcel_status[p] != "pending"]
+        chosen = rng.sample(candidates, min(len(candidates), rng.randint(1, 10)))
+        pickup_rows.append({
+            "id": request_id, "merchant_id": merchant_id, "pickup_address": rng.choice(CITIES),
+            "pickup_date": (now + timedelta(days=rng.randint(-90, 7))).date().isoformat(),
+            "pickup_time_slot": rng.choice(["09:00-12:00", "12:00-15:00", "15:00-18:00"]),
+            "package_count": max(1, len(chosen)), "special_instructions": None, "status": status,
+            "courier_id": rng.choice(courier_rows)["id"] if status in ("approved", "completed") else None,
+            "admin_notes": None, "created_at": created, "updated_at": created
+        })
+        for parcel_id in chosen:
+            linked.add(parcel_id)
+            junction_rows.append({"pickup_request_id": request_id, "parcel_id": parcel_id, "created_at": created})
+        pickups_by_merchant[merchant_id].append(request_id)
+    server.load("pickup_requests", pickup_rows)
+    server.load("pickup_request_parcels", junction_rows)
+
+    return {
+        "admin_ids": admin_ids,
+        "merchant_ids": active_merchants,
+        "parcels_by_merchant": dict(parcels_by_merchant),
+        "pickups_by_merchant": dict(pickups_by_merchant),
+        "tracking_ids": tracking_ids,
+    }
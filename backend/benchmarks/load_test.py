@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Load test: backend/main.py against an in-process fake PostgREST or a real Postgres
+Seeds a synthetic dataset (100k parcels, 5k merchants by default), starts the
+app's lifespan, drives a weighted mix of merchant, admin and public requests
+from concurrent workers, and reports per endpoint:
+  requests, errors, RPS, p50/p95/p99 latency and upstream calls per request
+
+--backend asyncpg copies the same dataset into the Postgres at --database-url
+(the API's five tables are dropped and recreated, so use a scratch database) and
+runs the app with STORAGE_BACKEND=asyncpg. --backend both runs each backend in
+its own process and prints them side by side. The fake answers from memory plus
+--latency-ms, while Postgres does real query work, so set --latency-ms to the
+PostgREST round trip you want to compare against.
+
+Everything runs in one event loop, so absolute numbers are lower than a real
+deployment; compare runs made with the same options on the same machine.
+
+    python benchmarks/load_test.py --duration 30 --concurrency 50
+    python benchmarks/load_test.py --json results.json   # machine-readable output
+    python benchmarks/load_test.py --backend both --database-url postgresql://localhost/loadtest
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+# Fake Supabase settings, and N+1 warnings off so they don't flood the output
+os.environ.setdefault("SUPABASE_URL", "http://supabase.bench")
+os.environ.setdefault("SUPABASE_ANON_KEY", "bench-key")
+os.environ.setdefault("UPSTREAM_TRACE_MAX_CALLS", "1000000")
+os.environ.setdefault("UPSTREAM_TRACE_MAX_REPEATS", "1000000")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_postgrest import FakePostgREST, seed_dataset  # noqa: E402
+
+UPSTREAM_CALLS = re.compile(r'desc="(\d+) calls')
+
+
+class Context:
+    """Seeded ids plus per-user tokens, shared by all workers"""
+
+    def __init__(self, main, seeded: dict, rng: random.Random):
+        self.main = main
+        self.seeded = seeded
+        self.rng = rng
+        self._tokens = {}
+        # Merchants with at least one pickup request, for the pickup scenarios
+        self.pickup_merchants = list(seeded["pickups_by_merchant"])
+
+    def token(self, user_id: str, role: str) -> dict:
+        if user_id not in self._tokens:
+            token = self.main.create_access_token({"sub": user_id, "role": role})
+            self._tokens[user_id] = {"Authorization": f"Bearer {token}"}
+        return self._tokens[user_id]
+
+    def merchant(self):
+        merchant_id = self.rng.choice(self.seeded["merchant_ids"])
+        return merchant_id, self.token(merchant_id, "merchant")
+
+    def pickup_merchant(self):
+        merchant_id = self.rng.choice(self.pickup_merchants)
+        return merchant_id, self.token(merchant_id, "merchant")
+
+    def admin(self):
+        admin_id = self.rng.choice(self.seeded["admin_ids"])
+        return self.token(admin_id, "admin")
+
+
+# Scenarios: coroutine(client, ctx) -> response
+
+async def list_parcels(client, ctx):
+    _, headers = ctx.merchant()
+    return await client.get("/parcels?limit=20", headers=headers)
+
+
+async def list_parcels_summary(client, ctx):
+    _, headers = ctx.merchant()
+    return await client.get("/parcels?limit=50&fields=summary", headers=headers)
+
+
+async def get_parcel(client, ctx):
+    merchant_id, headers = ctx.merchant()
+    parcel_id = ctx.rng.choice(ctx.seeded["parcels_by_merchant"][merchant_id])
+    return await client.get(f"/parcels/{parcel_id}", headers=headers)
+
+
+async def track_parcel(client, ctx):
+    tracking_id = ctx.rng.choice(ctx.seeded["tracking_ids"])
+    return await client.get(f"/parcels/tracking/{tracking_id}")
+
+
+async def track_unknown_parcel(client, ctx):
+    return await client.get(f"/parcels/tracking/FTX{ctx.rng.getrandbits(40):010X}")
+
+
+async def search_parcels(client, ctx):
+    _, headers = ctx.merchant()
+    return await client.get("/parcels/search?status=delivered&limit=20", headers=headers)
+
+
+async def create_parcel(client, ctx):
+    _, headers = ctx.merchant()
+    return await client.post("/parcels", headers=headers, json={
+        "recipient_name": f"Load Test {ctx.rng.randrange(10**6)}",
+        "recipient_phone": "01900000000",
+        "recipient_address": "Dhaka",
+        "package_description": "Benchmark",
+        "weight": 1.5
+    })
+
+
+async def update_parcel(client, ctx):
+    merchant_id, headers = ctx.merchant()
+    parcel_id = ctx.rng.choice(ctx.seeded["parcels_by_merchant"][merchant_id])
+    return await client.put(f"/parcels/{parcel_id}", headers=headers, json={
+        "recipient_phone": f"019{ctx.rng.randrange(10**8):08d}"
+    })
+
+
+async def merchant_stats(client, ctx):
+    _, headers = ctx.merchant()
+    return await client.get("/merchant/stats", headers=headers)
+
+
+async def list_pickup_requests(client, ctx):
+    _, headers = ctx.pickup_merchant()
+    return await client.get("/pickup-requests?limit=20", headers=headers)
+
+
+async def pickup_request_parcels(client, ctx):
+    merchant_id, headers = ctx.pickup_merchant()
+    request_id = ctx.rng.choice(ctx.seeded["pickups_by_merchant"][merchant_id])
+    return await client.get(f"/pickup-requests/{request_id}/parcels", headers=headers)
+
+
+async def available_parcels(client, ctx):
+    _, headers = ctx.merchant()
+    return await client.get("/merchants/parcels/available", headers=headers)
+
+
+async def current_user(client, ctx):
+    _, headers = ctx.merchant()
+    return await client.get("/auth/me", headers=headers)
+
+
+async def admin_list_parcels(client, ctx):
+    return await client.get("/parcels?limit=50", headers=ctx.admin())
+
+
+async def admin_stats(client, ctx):
+    return await client.get("/admin/stats", headers=ctx.admin())
+
+
+async def admin_dashboard(client, ctx):
+    return await client.get("/admin/dashboard", headers=ctx.admin())
+
+
+# (label, weight, scenario[, expected status]); anything else counts as an error
+SCENARIOS = [
+    ("GET /parcels", 18, list_parcels),
+    ("GET /parcels?fields=summary", 5, list_parcels_summary),
+    ("GET /parcels/{parcel_id}", 10, get_parcel),
+    ("GET /parcels/tracking/{tracking_id}", 15, track_parcel),
+    ("GET /parcels/tracking/{tracking_id} (unknown)", 3, track_unknown_parcel, 404),
+    ("GET /parcels/search", 4, search_parcels),
+    ("POST /parcels", 6, create_parcel),
+    ("PUT /parcels/{parcel_id}", 3, update_parcel),
+    ("GET /merchant/stats", 8, merchant_stats),
+    ("GET /pickup-requests", 5, list_pickup_requests),
+    ("GET /pickup-requests/{request_id}/parcels", 5, pickup_request_parcels),
+    ("GET /merchants/parcels/available", 4, available_parcels),
+    ("GET /auth/me", 5, current_user),
+    ("GET /parcels (admin)", 3, admin_list_parcels),
+    ("GET /admin/stats", 3, admin_stats),
+    ("GET /admin/dashboard", 3, admin_dashboard),
+]
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.upstream_calls = defaultdict(int)
+
+    def record(self, label: str, seconds: float, response: httpx.Response = None, expected_status: int = 200):
+        self.latencies[label].append(seconds)
+        if response is None or response.status_code != expected_status:
+            self.errors[label] += 1
+        if response is not None:
+            match = UPSTREAM_CALLS.search(response.headers.get("server-timing", ""))
+            if match:
+                self.upstream_calls[label] += int(match.group(1))
+
+
+def percentile(ordered: list, p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def summarize(results: Results, elapsed: float) -> dict:
+    endpoints = {}
+    for label in sorted(results.latencies, key=lambda name: -len(results.latencies[name])):
+        ordered = sorted(results.latencies[label])
+        endpoints[label] = {
+            "requests": len(ordered),
+            "errors": results.errors[label],
+            "rps": round(len(ordered) / elapsed, 1),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+            "upstream_calls_per_request": round(results.upstream_calls[label] / len(ordered), 2)
+        }
+    everything = sorted(latency for values in results.latencies.values() for latency in values)
+    total_calls = sum(results.upstream_calls.values())
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "total": {
+            "requests": len(everything),
+            "errors": sum(results.errors.values()),
+            "rps": round(len(everything) / elapsed, 1),
+            "p50_ms": round(percentile(everything, 50) * 1000, 2),
+            "p95_ms": round(percentile(everything, 95) * 1000, 2),
+            "p99_ms": round(percentile(everything, 99) * 1000, 2),
+            "upstream_calls_per_request": round(total_calls / len(everything), 2) if everything else 0.0
+        },
+        "endpoints": endpoints
+    }
+
+
+def print_report(summary: dict, title: str):
+    print(f"\n{title}")
+    header = f"{'endpoint':<46} {'reqs':>7} {'errs':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/req':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = list(summary["endpoints"].items()) + [("TOTAL", summary["total"])]
+    for label, stats in rows:
+        print(
+            f"{label:<46} {stats['requests']:>7} {stats['errors']:>5} {stats['rps']:>8.1f} "
+            f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+            f"{stats['upstream_calls_per_request']:>9.2f}"
+        )
+
+
+async def worker(client: httpx.AsyncClient, ctx: Context, results: Results, deadline: float, weights: list):
+    while time.perf_counter() < deadline:
+        label, _, scenario, *expected = ctx.rng.choices(SCENARIOS, weights=weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await scenario(client, ctx)
+        except Exception:
+            response = None
+        results.record(label, time.perf_counter() - started, response, *expected)
+
+
+async def wait_until_warm(main, timeout: float = 120.0):
+    """Wait for the startup scans that build the status counters and tracking filter"""
+    deadline = time.perf_counter() + timeout
+    while not (main.status_counters.ready and main.tracking_id_filter.ready):
+        if time.perf_counter() > deadline:
+            raise RuntimeError("Backend did not finish its startup scans in time")
+        await asyncio.sleep(0.1)
+
+
+async def run_load_test(args) -> dict:
+    import main
+    from storage import create_storage
+    from supabase_client import supabase_http
+
+    print(f"Seeding fake PostgREST: {args.parcels} parcels, {args.merchants} merchants, {args.pickup_requests} pickup requests")
+    started = time.perf_counter()
+    fake = FakePostgREST(latency_ms=args.latency_ms)
+    seeded = seed_dataset(
+        fake,
+        merchants=args.merchants,
+        parcels=args.parcels,
+        pickup_requests=args.pickup_requests,
+        seed=args.seed
+    )
+    print(f"Seeded in {time.perf_counter() - started:.1f}s; simulated Supabase latency {args.latency_ms:.1f} ms")
+
+    if args.backend == "asyncpg":
+        from postgres_seed import load_into_postgres
+
+        await load_into_postgres(fake, args.database_url)
+        main.storage = create_storage("asyncpg", dsn=args.database_url)
+    else:
+        main.storage = create_storage("postgrest")
+        # The lifespan keeps an existing client, so every upstream call goes to the fake
+        supabase_http._client = httpx.AsyncClient(transport=fake.transport())
+
+    async with main.app.router.lifespan_context(main.app):
+        await wait_until_warm(main)
+        ctx = Context(main, seeded, random.Random(args.seed))
+        weights = [scenario[1] for scenario in SCENARIOS]
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend.bench") as client:
+            # Short warm-up so first-request costs (route compilation, caches) are not measured
+            warmup = Results()
+            await asyncio.gather(*[
+                worker(client, ctx, warmup, time.perf_counter() + args.warmup, weights)
+                for _ in range(args.concurrency)
+            ])
+
+            results = Results()
+            fake_requests_before = fake.requests
+            queries_before = getattr(main.storage, "total_queries", 0)
+            started = time.perf_counter()
+            await asyncio.gather(*[
+                worker(client, ctx, results, started + args.duration, weights)
+                for _ in range(args.concurrency)
+            ])
+            elapsed = time.perf_counter() - started
+            queries = getattr(main.storage, "total_queries", 0) - queries_before
+
+    summary = summarize(results, elapsed)
+    summary["options"] = vars(args)
+    summary["backend"] = args.backend
+    if args.backend == "asyncpg":
+        summary["sql_queries"] = queries
+    else:
+        summary["fake_postgrest_requests"] = fake.requests - fake_requests_before
+    return summary
+
+
+def run_each_backend(argv: list) -> dict:
+    """Run the postgrest and asyncpg load tests in separate processes, so no cache or counter is shared"""
+    summaries = {}
+    for backend in ("postgrest", "asyncpg"):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "summary.json"
+            subprocess.run(
+                [sys.executable, __file__, *argv, "--backend", backend, "--json", str(output)],
+                check=True
+            )
+            summaries[backend] = json.loads(output.read_text())
+    return summaries
+
+
+def print_comparison(summaries: dict):
+    baseline, candidate = summaries["postgrest"], summaries["asyncpg"]
+    print("\npostgrest vs asyncpg (p50 / p95 ms, and asyncpg speedup at p50)")
+    header = f"{'endpoint':<46} {'postgrest':>17} {'asyncpg':>17} {'speedup':>8}"
+    print(header)
+    print("-" * len(header))
+    rows = [(label, stats, candidate["endpoints"].get(label)) for label, stats in baseline["endpoints"].items()]
+    rows.append(("TOTAL", baseline["total"], candidate["total"]))
+    for label, before, after in rows:
+        if not after:
+            continue
+        speedup = before["p50_ms"] / after["p50_ms"] if after["p50_ms"] else float("inf")
+        print(
+            f"{label:<46} {before['p50_ms']:>8.2f} /{before['p95_ms']:>7.2f} "
+            f"{after['p50_ms']:>8.2f} /{after['p95_ms']:>7.2f} {speedup:>7.1f}x"
+        )
+    print(f"\nRPS: postgrest {baseline['total']['rps']:.1f}, asyncpg {candidate['total']['rps']:.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds (default 20)")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured warm-up seconds (default 3)")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent virtual users (default 50)")
+    parser.add_argument("--parcels", type=int, default=100_000)
+    parser.add_argument("--merchants", type=int, default=5000)
+    parser.add_argument("--pickup-requests", type=int, default=20_000)
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="simulated Supabase round trip (default 1 ms)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backend", choices=["postgrest", "asyncpg", "both"], default="postgrest",
+                        help="storage backend under test (default postgrest)")
+    parser.add_argument("--database-url", help="scratch Postgres for --backend asyncpg/both (tables are recreated)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+    if args.backend != "postgrest" and not args.database_url:
+        parser.error("--database-url is required for --backend asyncpg or both")
+    return args
+
+
+def main_cli(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.backend == "both":
+        # Forward every option except --backend and --json to the per-backend runs
+        forwarded, skip = [], False
+        for arg in argv:
+            if skip:
+                skip = False
+            elif arg in ("--backend", "--json"):
+                skip = True
+            elif not arg.startswith(("--backend=", "--json=")):
+                forwarded.append(arg)
+        summaries = run_each_backend(forwarded)
+        print_comparison(summaries)
+        if args.json:
+            Path(args.json).write_text(json.dumps(summaries, indent=2))
+            print(f"\nWrote {args.json}")
+        return
+
+    summary = asyncio.run(run_load_test(args))
+    print_report(summary, f"{args.backend}: {args.concurrency} workers for {summary['elapsed_seconds']}s")
+    if args.json:
+        Path(args.json).write_text(json.dumps(summary, indent=2))
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main_cli()
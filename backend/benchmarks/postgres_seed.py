@@ -0,0 +1,135 @@
+"""
+Copy a seeded FakePostgREST dataset into a real Postgres database
+Used by load_test.py --backend asyncpg so both backends run against the same rows.
+The five tables the API uses are DROPPED and recreated: point it at a scratch database.
+"""
+
+import time
+from typing import Dict
+
+import asyncpg
+
+from fake_postgrest import FakePostgREST
+from storage_asyncpg import TABLES, to_param
+
+# Tables, keys and indexes from supabase_setup_fixed.sql and the *_migration.sql files, without the
+# Supabase-specific parts (RLS policies, auth.uid()) and without the status CHECK constraints
+SCHEMA_SQL = """
+DROP TABLE IF EXISTS pickup_request_parcels, pickup_requests, parcels, couriers, profiles CASCADE;
+
+CREATE TABLE profiles (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    email VARCHAR(255) UNIQUE NOT NULL,
+    business_name VARCHAR(255),
+    full_name VARCHAR(255) NOT NULL,
+    role VARCHAR(50) NOT NULL DEFAULT 'merchant',
+    status VARCHAR(50) NOT NULL DEFAULT 'active',
+    phone VARCHAR(50),
+    address TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE parcels (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    tracking_id VARCHAR(50) UNIQUE NOT NULL,
+    sender_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    recipient_name VARCHAR(255) NOT NULL,
+    recipient_phone VARCHAR(50) NOT NULL,
+    package_description TEXT,
+    weight DECIMAL(10,2),
+    dimensions VARCHAR(100),
+    origin_address TEXT NOT NULL,
+    destination_address TEXT NOT NULL,
+    status VARCHAR(50) NOT NULL DEFAULT 'pending',
+    pickup_date DATE,
+    delivery_date DATE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE couriers (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    full_name VARCHAR(255) NOT NULL,
+    phone VARCHAR(50) NOT NULL,
+    vehicle_type VARCHAR(100),
+    vehicle_number VARCHAR(50),
+    coverage_area TEXT,
+    status VARCHAR(50) NOT NULL DEFAULT 'active',
+    current_location TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE pickup_requests (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    merchant_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    pickup_address TEXT NOT NULL,
+    pickup_date DATE NOT NULL,
+    pickup_time_slot VARCHAR(50),
+    package_count INTEGER DEFAULT 1,
+    special_instructions TEXT,
+    status VARCHAR(50) NOT NULL DEFAULT 'pending',
+    courier_id UUID,
+    admin_notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE pickup_request_parcels (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    pickup_request_id UUID NOT NULL REFERENCES pickup_requests(id) ON DELETE CASCADE,
+    parcel_id UUID NOT NULL REFERENCES parcels(id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE(pickup_request_id, parcel_id)
+);
+
+CREATE INDEX idx_profiles_email ON profiles(email);
+CREATE INDEX idx_profiles_role ON profiles(role);
+CREATE INDEX idx_parcels_tracking_id ON parcels(tracking_id);
+CREATE INDEX idx_parcels_sender_id ON parcels(sender_id);
+CREATE INDEX idx_parcels_status ON parcels(status);
+CREATE INDEX idx_pickup_requests_merchant_id ON pickup_requests(merchant_id);
+CREATE INDEX idx_pickup_requests_status ON pickup_requests(status);
+CREATE INDEX idx_couriers_status ON couriers(status);
+CREATE INDEX idx_pickup_request_parcels_pickup_request_id ON pickup_request_parcels(pickup_request_id);
+CREATE INDEX idx_pickup_request_parcels_parcel_id ON pickup_request_parcels(parcel_id);
+CREATE INDEX idx_parcels_sender_pending ON parcels(sender_id, created_at) WHERE status = 'pending';
+CREATE INDEX idx_parcels_created_id ON parcels(created_at DESC, id DESC);
+CREATE INDEX idx_parcels_sender_created_id ON parcels(sender_id, created_at DESC, id DESC);
+CREATE INDEX idx_parcels_status_created_id ON parcels(status, created_at DESC, id DESC);
+CREATE INDEX idx_pickup_requests_created_id ON pickup_requests(created_at DESC, id DESC);
+CREATE INDEX idx_pickup_requests_merchant_created_id ON pickup_requests(merchant_id, created_at DESC, id DESC);
+"""
+
+
+async def load_into_postgres(server: FakePostgREST, dsn: str) -> Dict[str, int]:
+    """Recreate the schema and COPY every row of the fake into Postgres; returns rows per table"""
+    started = time.perf_counter()
+    connection = await asyncpg.connect(dsn)
+    try:
+        await connection.execute(SCHEMA_SQL)
+        types = {name: {} for name in TABLES}
+        for row in await connection.fetch(
+            "SELECT table_name, column_name, udt_name FROM information_schema.columns "
+            "WHERE table_schema = 'public' AND table_name = ANY($1::text[])",
+            TABLES
+        ):
+            types[row["table_name"]][row["column_name"]] = row["udt_name"]
+
+        loaded = {}
+        # Referenced tables first
+        for name in ["profiles", "couriers", "parcels", "pickup_requests", "pickup_request_parcels"]:
+            rows = list(server.table(name).rows.values())
+            columns = [column for column in types[name] if rows and column in rows[0]]
+            records = [tuple(to_param(types[name][column], row.get(column)) for column in columns) for row in rows]
+            if records:
+                await connection.copy_records_to_table(name, records=records, columns=columns)
+            loaded[name] = len(records)
+
+        await connection.execute("ANALYZE")
+    finally:
+        await connection.close()
+
+    print(f"Copied dataset into Postgres in {time.perf_counter() - started:.1f}s")
+    return loaded
@@ -0,0 +1,133 @@
+"""
+Bloom filter for set membership with a configurable false-positive rate
+Used to answer "this tracking ID definitely does not exist" without a database query
+"""
+
+import asyncio
+import hashlib
+import math
+from typing import Any, AsyncIterator, Iterable, List, Optional, Tuple
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity: int, fp_rate: float = 0.01):
+        """
+        Args:
+            capacity: Expected number of items
+            fp_rate: Target false-positive rate at that capacity
+        """
+        self.capacity = max(1, capacity)
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, int(math.ceil(-self.capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: two 64-bit halves of one digest give all k positions
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, items: Iterable[str]):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def estimated_fp_rate(self) -> float:
+        """False-positive rate expected for the current number of items"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def get_stats(self) -> dict:
+        return {
+            "items": self.count,
+            "capacity": self.capacity,
+            "bits": self.num_bits,
+            "hashes": self.num_hashes,
+            "memory_bytes": len(self._bits),
+            "target_fp_rate": self.fp_rate,
+            "estimated_fp_rate": round(self.estimated_fp_rate(), 6)
+        }
+
+
+class KnownIdFilter:
+    """
+    Bloom filter of known IDs, trusted only after a full build
+
+    Until rebuild() has run, might_exist() answers True for everything so
+    callers fall through to the database. A miss only means the ID was not in
+    the last build or sync: other workers' inserts arrive with the next sync.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float = 0.01):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.ready = False
+        self.watermark = None
+        self.checks = 0
+        self.rejections = 0
+        self.stale_misses = 0
+        self._filter = BloomFilter(capacity, fp_rate)
+        self._added_during_rebuild: Optional[List[str]] = None
+
+    async def rebuild(self, expected: int, pages: AsyncIterator[Tuple[List[str], Any]]):
+        """
+        Replace the filter with one built from a full scan
+
+        pages yields (ids, watermark) per page of the scan; expected is the
+        approximate number of IDs. IDs added while the scan runs may be missing
+        from its pages, so they are recorded and replayed into the new filter.
+        """
+        self._added_during_rebuild = []
+        try:
+            # Leave headroom so the filter keeps its target rate as new IDs arrive
+            new_filter = BloomFilter(max(self.capacity, expected * 2), self.fp_rate)
+            watermark = None
+            async for ids, page_watermark in pages:
+                # Hashing costs a few microseconds per ID, so large pages are added off the event loop
+                await asyncio.to_thread(new_filter.update, ids)
+                if page_watermark is not None and (watermark is None or page_watermark > watermark):
+                    watermark = page_watermark
+            new_filter.update(self._added_during_rebuild)
+        finally:
+            self._added_during_rebuild = None
+        self._filter = new_filter
+        self.watermark = watermark
+        self.ready = True
+
+    def add(self, item: str):
+        self._filter.add(item)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(item)
+
+    def might_exist(self, item: str) -> bool:
+        """False when the ID was not in the last build or sync"""
+        if not self.ready:
+            return True
+        self.checks += 1
+        if item in self._filter:
+            return True
+        self.rejections += 1
+        return False
+
+    def get_stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "watermark": self.watermark,
+            "checks": self.checks,
+            "rejections": self.rejections,
+            # Misses the database then found (IDs newer than the last sync)
+            "stale_misses": self.stale_misses,
+            **self._filter.get_stats()
+        }
@@ -0,0 +1,163 @@
+"""
+In-process caches for the FastTrack backend
+Each worker process keeps its own copy; nothing here is shared across workers
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotCache:
+    """
+    A single shared value produced by an async loader
+
+    Fresh for `ttl` seconds. For a further `stale_ttl` seconds the old value
+    is still served while one background refresh runs (stale-while-revalidate).
+    After that, callers wait for a refresh, and concurrent waiters share it.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float = 0.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._value: Any = None
+        self._loaded_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def age(self) -> Optional[float]:
+        """Seconds since the snapshot was built, or None if it was never built"""
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    async def _refresh(self):
+        value = await self.loader()
+        self._value = value
+        self._loaded_at = time.monotonic()
+        return value
+
+    def _start_refresh(self) -> asyncio.Task:
+        # Only one refresh runs at a time; everyone else awaits the same task
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+            self._refresh_task.add_done_callback(self._log_refresh_error)
+        return self._refresh_task
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Error refreshing snapshot", exc_info=task.exception())
+
+    async def get(self) -> Tuple[Any, float]:
+        """Return (value, age_seconds), refreshing as needed"""
+        age = self.age()
+
+        if age is not None and age < self.ttl:
+            return self._value, age
+
+        if age is not None and age < self.ttl + self.stale_ttl:
+            self._start_refresh()
+            return self._value, age
+
+        await asyncio.shield(self._start_refresh())
+        return self._value, self.age()
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a TTL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value, or default when missing or expired"""
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        """Store a value; ttl overrides the cache default for this entry"""
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers with the same key share its result"""
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn: Callable[[], Awaitable[Any]]):
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        self.calls += 1
+        try:
+            # Shielded so a cancelled caller does not cancel the call for everyone else
+            return await asyncio.shield(task)
+        finally:
+            if self._calls.get(key) is task:
+                del self._calls[key]
+
+    def get_stats(self) -> dict:
+        total = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0
+        }
@@ -0,0 +1,218 @@
+"""
+Response compression negotiated from Accept-Encoding
+Brotli is used when the client accepts it and the brotli package is installed,
+otherwise gzip. Bodies under COMPRESSION_MIN_SIZE bytes are sent uncompressed,
+and streamed responses are compressed chunk by chunk
+"""
+
+import asyncio
+import os
+import zlib
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv(override=True)
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# Larger bodies are compressed in a worker thread so the event loop keeps serving other requests
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", "262144"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Preferred first when the client gives several codings the same q-value
+SUPPORTED_ENCODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header: Optional[str]) -> Optional[str]:
+    """Best supported content coding for an Accept-Encoding header, or None for identity"""
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class StreamCompressor:
+    """Incremental gzip or brotli encoder; each compress() call returns everything compressed so far"""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            # wbits=31 writes a gzip header and trailer around the deflate stream
+            self._zlib = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    """Compress a complete body in one call"""
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+class CompressionStats:
+    """Bytes before and after compression, per coding, for /health/stats"""
+
+    def __init__(self):
+        self.responses: Dict[str, int] = {}
+        self.bytes_in: Dict[str, int] = {}
+        self.bytes_out: Dict[str, int] = {}
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, responses: int = 0):
+        self.responses[encoding] = self.responses.get(encoding, 0) + responses
+        self.bytes_in[encoding] = self.bytes_in.get(encoding, 0) + bytes_in
+        self.bytes_out[encoding] = self.bytes_out.get(encoding, 0) + bytes_out
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": COMPRESSION_ENABLED,
+            "encodings": SUPPORTED_ENCODINGS,
+            "min_size": COMPRESSION_MIN_SIZE,
+            "by_encoding": {
+                encoding: {
+                    "responses": self.responses[encoding],
+                    "bytes_in": self.bytes_in[encoding],
+                    "bytes_out": self.bytes_out[encoding],
+                    "ratio": round(self.bytes_out[encoding] / self.bytes_in[encoding], 4) if self.bytes_in[encoding] else 0.0
+                }
+                for encoding in self.responses
+            }
+        }
+
+
+compression_stats = CompressionStats()
+
+
+class CompressionMiddleware:
+    """Compresses compressible responses for clients that accept br or gzip"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        # None until the first body chunk decides; then "identity" or a StreamCompressor
+        mode = None
+
+        async def send_wrapper(message):
+            nonlocal start_message, mode
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if mode is None:
+                headers = MutableHeaders(raw=list(start_message.get("headers", [])))
+                content_type = headers.get("content-type", "")
+                compressible = "content-encoding" not in headers and content_type.startswith(COMPRESSIBLE_TYPES)
+                if compressible or start_message["status"] == 304:
+                    # Compressed bytes differ from the identity ones, so the validator is weak.
+                    # A 304 has no body to measure against COMPRESSION_MIN_SIZE, so it applies to
+                    # every response negotiated with a coding and 200 and 304 send the same ETag
+                    headers.add_vary_header("Accept-Encoding")
+                    etag = headers.get("etag")
+                    if etag and etag.startswith('"'):
+                        headers["ETag"] = "W/" + etag
+                    start_message = {**start_message, "headers": headers.raw}
+
+                if not compressible or (not more_body and len(body) < COMPRESSION_MIN_SIZE):
+                    mode = "identity"
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = encoding
+
+                if not more_body:
+                    mode = "identity"
+                    if len(body) >= COMPRESSION_THREAD_MIN_SIZE:
+                        compressed = await asyncio.to_thread(compress_body, body, encoding)
+                    else:
+                        compressed = compress_body(body, encoding)
+                    compression_stats.record(encoding, len(body), len(compressed), responses=1)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send({**start_message, "headers": headers.raw})
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+                # Streaming: the final length is unknown
+                del headers["Content-Length"]
+                mode = StreamCompressor(encoding)
+                compression_stats.record(encoding, 0, 0, responses=1)
+                await send({**start_message, "headers": headers.raw})
+
+            if mode == "identity":
+                await send(message)
+                return
+
+            if len(body) >= COMPRESSION_THREAD_MIN_SIZE:
+                chunk = await asyncio.to_thread(mode.compress, body)
+            else:
+                chunk = mode.compress(body) if body else b""
+            if not more_body:
+                chunk += mode.finish()
+            compression_stats.record(encoding, len(body), len(chunk))
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,168 @@
+"""
+In-process status counters for parcels and pickup requests
+Rebuilt from a full scan at startup, updated by every write path in main.py
+and periodically reconciled against the database to correct drift
+(for example from writes handled by other workers)
+"""
+
+import asyncio
+from collections import Counter
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+Counts = Dict[Optional[str], Counter]
+
+
+class ScanProgress:
+    """How far a rebuild's keyset scan (ordered by id) has read, and the writes it has to account for"""
+
+    def __init__(self):
+        self.scanned_to: Optional[str] = None
+        self.done = False
+        # Deltas for rows the scan had already read past when they were written
+        self.missed: List[Tuple[Optional[str], Optional[str], Optional[str]]] = []
+        # Latest (owner, status) of rows written ahead of the scan; None status means deleted
+        self.ahead: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+    def passed(self, row_id: str) -> bool:
+        """Whether the scan has already read past row_id, so it cannot see a write to it"""
+        return self.done or (self.scanned_to is not None and row_id <= self.scanned_to)
+
+    def record(self, row_id: str, owner: Optional[str], old: Optional[str], new: Optional[str]):
+        if self.passed(row_id):
+            self.missed.append((owner, old, new))
+        else:
+            self.ahead[row_id] = (owner, new)
+
+class StatusCounters:
+    """Counts of rows by status, globally and per merchant"""
+
+    def __init__(self):
+        self.ready = False
+        self.last_rebuild: Optional[float] = None
+        self._parcels: Counts = {}
+        self._pickups: Counts = {}
+        # Set while rebuild() scans: {"parcels": ScanProgress, "pickups": ScanProgress}
+        self._rebuilding: Optional[Dict[str, ScanProgress]] = None
+
+    @classmethod
+    async def _count_pages(cls, pages: AsyncIterator[List[dict]], owner_field: str, progress: ScanProgress) -> Counts:
+        counts: Counts = {None: Counter()}
+        async for rows in pages:
+            if not rows:
+                continue
+            seen = {}
+            for row in rows:
+                owner = row.get(owner_field)
+                status = row.get("status")
+                counts[None][status] += 1
+                counts.setdefault(owner, Counter())[status] += 1
+                seen[row["id"]] = status
+            # The page read may have landed before or after a write ahead of the
+            # scan, so correct from what the page actually saw to the latest state
+            last_id = rows[-1]["id"]
+            for row_id in [row_id for row_id in progress.ahead if row_id <= last_id]:
+                owner, status = progress.ahead.pop(row_id)
+                cls._apply(counts, owner, seen.get(row_id), status)
+            progress.scanned_to = last_id
+        for owner, status in progress.ahead.values():
+            cls._apply(counts, owner, None, status)
+        progress.ahead.clear()
+        progress.done = True
+        return counts
+
+    async def rebuild(
+        self,
+        parcel_pages: AsyncIterator[List[dict]],
+        pickup_pages: AsyncIterator[List[dict]],
+        rebuilt_at: float
+    ):
+        """
+        Replace all counters from paged scans ordered by id
+        ({id, sender_id, status} and {id, merchant_id, status} rows)
+
+        Writes applied while the scans run are accounted for in the new counts:
+        replayed when the scan had already read past their row, and reconciled
+        against the page that covers the row otherwise, so the swap loses none of
+        them and counts none twice. (A write whose storage call finishes before a
+        page that includes it but is counted only after that page is read is left
+        to the next reconcile.)
+        """
+        self._rebuilding = {"parcels": ScanProgress(), "pickups": ScanProgress()}
+        try:
+            parcels, pickups = await asyncio.gather(
+                self._count_pages(parcel_pages, "sender_id", self._rebuilding["parcels"]),
+                self._count_pages(pickup_pages, "merchant_id", self._rebuilding["pickups"])
+            )
+            for counts, progress in ((parcels, self._rebuilding["parcels"]), (pickups, self._rebuilding["pickups"])):
+                for owner, old, new in progress.missed:
+                    self._apply(counts, owner, old, new)
+        finally:
+            self._rebuilding = None
+        self._parcels = parcels
+        self._pickups = pickups
+        self.last_rebuild = rebuilt_at
+        self.ready = True
+
+    @staticmethod
+    def _apply(counts: Counts, owner: str, old: Optional[str], new: Optional[str], n: int = 1):
+        for key in (None, owner):
+            counter = counts.setdefault(key, Counter())
+            if old is not None:
+                # Concurrent writes can apply out of commit order, so a count may go
+                # below zero until the other transition lands; reads clamp it
+                counter[old] -= n
+                if counter[old] == 0:
+                    del counter[old]
+            if new is not None:
+                counter[new] += n
+
+    def _change(self, table: str, row_ids: Iterable[str], owner: str, old: Optional[str], new: Optional[str]):
+        row_ids = list(row_ids)
+        self._apply(self._parcels if table == "parcels" else self._pickups, owner, old, new, len(row_ids))
+        if self._rebuilding is not None:
+            progress = self._rebuilding[table]
+            for row_id in row_ids:
+                progress.record(row_id, owner, old, new)
+
+    # Parcel write paths
+    def parcel_created(self, merchant_id: str, row_ids: Iterable[str], status: str = "pending"):
+        self._change("parcels", row_ids, merchant_id, None, status)
+
+    def parcel_status_changed(self, merchant_id: str, row_id: str, old_status: str, new_status: str):
+        if old_status != new_status:
+            self._change("parcels", [row_id], merchant_id, old_status, new_status)
+
+    def parcel_deleted(self, merchant_id: str, row_id: str, status: str):
+        self._change("parcels", [row_id], merchant_id, status, None)
+
+    # Pickup request write paths
+    def pickup_created(self, merchant_id: str, row_id: str, status: str = "pending"):
+        self._change("pickups", [row_id], merchant_id, None, status)
+
+    def pickup_status_changed(self, merchant_id: str, row_id: str, old_status: str, new_status: str):
+        if old_status != new_status:
+            self._change("pickups", [row_id], merchant_id, old_status, new_status)
+
+    def pickup_deleted(self, merchant_id: str, row_id: str, status: str):
+        self._change("pickups", [row_id], merchant_id, status, None)
+
+    # Reads
+    def parcel_counts(self, merchant_id: Optional[str] = None) -> Counter:
+        """Parcel counts by status for one merchant, or globally when merchant_id is None"""
+        return +self._parcels.get(merchant_id, Counter())
+
+    def pickup_counts(self, merchant_id: Optional[str] = None) -> Counter:
+        """Pickup request counts by status for one merchant, or globally when merchant_id is None"""
+        return +self._pickups.get(merchant_id, Counter())
+
+    def get_stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "last_rebuild": self.last_rebuild,
+            "rebuilding": self._rebuilding is not None,
+            "merchants_tracked": len((set(self._parcels) | set(self._pickups)) - {None})
+        }
+
+
+# Global counter store
+status_counters = StatusCounters()
@@ -0,0 +1,94 @@
+"""
+Strong ETags and If-None-Match handling for polled GET endpoints
+A matching request gets an empty 304 instead of the JSON body. CompressionMiddleware
+sends the weak form when the request negotiated a content coding.
+List endpoints derive their ETag from the (id, updated_at) watermarks of the page,
+which can be read without fetching the full rows
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+
+load_dotenv(override=True)
+
+ETAGS_ENABLED = os.getenv("ETAGS_ENABLED", "true").lower() == "true"
+
+# Clients may keep the body but must revalidate before reusing it;
+# responses depend on the bearer token, so shared caches must not store them
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag over JSON-serialisable parts (row order matters, key order does not)"""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return '"' + hashlib.blake2b(raw, digest_size=16).hexdigest() + '"'
+
+
+def request_scope(request: Request, user_id: Optional[str]) -> str:
+    """What the representation depends on besides the data: path, query string and caller"""
+    return f"{user_id}:{request.url.path}?{request.url.query}"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match lists this ETag (weak comparison, as RFC 9110 requires for GET)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+class EtagStats:
+    """Conditional request counters for /health/stats"""
+
+    def __init__(self):
+        self.not_modified = 0
+        self.modified = 0
+        self.unconditional = 0
+
+    def get_stats(self) -> dict:
+        conditional = self.not_modified + self.modified
+        return {
+            "enabled": ETAGS_ENABLED,
+            "not_modified": self.not_modified,
+            "modified": self.modified,
+            "unconditional": self.unconditional,
+            "hit_rate": round(self.not_modified / conditional, 4) if conditional else 0.0
+        }
+
+
+etag_stats = EtagStats()
+
+
+def etag_headers(etag: str) -> dict:
+    """Validator headers sent with both 200 and 304 responses"""
+    return {"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL, "Vary": "Authorization"}
+
+
+def check_etag(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Return a 304 response if the client already has this ETag
+
+    Otherwise the validator headers are set on `response` and None is returned,
+    so the endpoint returns its body as usual.
+    """
+    if not ETAGS_ENABLED:
+        return None
+
+    if etag_matches(request, etag):
+        etag_stats.not_modified += 1
+        return Response(status_code=304, headers=etag_headers(etag))
+
+    if "if-none-match" in request.headers:
+        etag_stats.modified += 1
+    else:
+        etag_stats.unconditional += 1
+    response.headers.update(etag_headers(etag))
+    return None
@@ -0,0 +1,28 @@
+-- Migration (optional): Indexes for keyset pagination on list endpoints
+-- GET /parcels, /parcels/status/{status}, /pickup-requests and the exports page
+-- newest first with ORDER BY created_at DESC, id DESC and a (created_at, id)
+-- cursor. With these indexes every page, however deep, is a short index range
+-- scan; without them Postgres sorts all matching rows for each page.
+
+-- Admin views of all parcels, and the Bloom filter sync (created_at >= ...)
+CREATE INDEX IF NOT EXISTS idx_parcels_created_id
+    ON parcels(created_at DESC, id DESC);
+
+-- A merchant's parcels
+CREATE INDEX IF NOT EXISTS idx_parcels_sender_created_id
+    ON parcels(sender_id, created_at DESC, id DESC);
+
+-- Parcels by status (GET /parcels/status/{status} for admins)
+CREATE INDEX IF NOT EXISTS idx_parcels_status_created_id
+    ON parcels(status, created_at DESC, id DESC);
+
+-- Admin views of all pickup requests
+CREATE INDEX IF NOT EXISTS idx_pickup_requests_created_id
+    ON pickup_requests(created_at DESC, id DESC);
+
+-- A merchant's pickup requests
+CREATE INDEX IF NOT EXISTS idx_pickup_requests_merchant_created_id
+    ON pickup_requests(merchant_id, created_at DESC, id DESC);
+
+ANALYZE parcels;
+ANALYZE pickup_requests;
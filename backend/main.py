@@ -1,24 +1,57 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 from typing import List, Optional
 import jwt as PyJWT
 from datetime import datetime, timedelta
 import time
-from pydantic import BaseModel
-import httpx
+from pydantic import BaseModel, ValidationError
 import uuid
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+
+from storage import Contains, Table, create_storage, split_columns
+from cache import SnapshotCache, SingleFlight, TTLCache
+from counters import status_counters
+from bloom import KnownIdFilter
+from metrics import PrometheusMiddleware, metrics_response
+from tracing import UpstreamTraceMiddleware, trace_stats
+from etag import ETAGS_ENABLED, check_etag, etag_matches, etag_stats, make_etag, request_scope
+from responses import json_rows, ndjson_lines
+from compression import CompressionMiddleware, compression_stats
 
 # Load environment variables with override to ensure fresh values
 load_dotenv(override=True)
 
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One connection pool per worker (Supabase HTTP or Postgres), reused across requests
+    await storage.start()
+    # Status counters are rebuilt in the background; stats fall back to database counts until ready
+    background_tasks = [
+        asyncio.create_task(reconcile_status_counters_loop()),
+        asyncio.create_task(tracking_id_filter_loop())
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await storage.close()
+
 app = FastAPI(
     title="FastTrack Courier API",
     description="Backend API for FastTrack Courier Service",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -36,18 +69,69 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Server-Timing", "ETag"],
 )
 
+# gzip/brotli for large responses, negotiated from Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+
+# Upstream call tracing: Server-Timing header and N+1 warnings
+app.add_middleware(UpstreamTraceMiddleware)
+
+# Request metrics (added last so it wraps everything, including CORS)
+app.add_middleware(PrometheusMiddleware)
+
 # Security
 security = HTTPBearer()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Supabase configuration
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+# Profile cache for /auth/me; written through on register/login
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "60"))
+
+# Decoded-token cache; entries never outlive the token's own exp
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_TTL = float(os.getenv("JWT_CACHE_TTL", "300"))
+
+# Admin dashboard snapshot: fresh for TTL seconds, then served stale while one refresh runs
+ADMIN_DASHBOARD_TTL = float(os.getenv("ADMIN_DASHBOARD_TTL", "10"))
+ADMIN_DASHBOARD_STALE_TTL = float(os.getenv("ADMIN_DASHBOARD_STALE_TTL", "60"))
+
+# Public tracking cache: entries are dropped on every parcel write in this worker,
+# the TTL bounds staleness from writes handled by other workers
+TRACKING_CACHE_SIZE = int(os.getenv("TRACKING_CACHE_SIZE", "10000"))
+TRACKING_CACHE_TTL = float(os.getenv("TRACKING_CACHE_TTL", "30"))
+
+# Tracking ID shield: Bloom filter of known IDs plus a short-lived cache of IDs that were not found.
+# The filter is fully rebuilt every REBUILD_INTERVAL seconds and picks up IDs created by other
+# workers every SYNC_INTERVAL seconds (re-reading SYNC_OVERLAP seconds before the last watermark)
+TRACKING_BLOOM_CAPACITY = int(os.getenv("TRACKING_BLOOM_CAPACITY", "1000000"))
+TRACKING_BLOOM_FP_RATE = float(os.getenv("TRACKING_BLOOM_FP_RATE", "0.01"))
+TRACKING_BLOOM_SYNC_INTERVAL = float(os.getenv("TRACKING_BLOOM_SYNC_INTERVAL", "15"))
+TRACKING_BLOOM_SYNC_OVERLAP = float(os.getenv("TRACKING_BLOOM_SYNC_OVERLAP", "60"))
+TRACKING_BLOOM_REBUILD_INTERVAL = float(os.getenv("TRACKING_BLOOM_REBUILD_INTERVAL", "3600"))
+TRACKING_NEGATIVE_CACHE_SIZE = int(os.getenv("TRACKING_NEGATIVE_CACHE_SIZE", "100000"))
+TRACKING_NEGATIVE_CACHE_TTL = float(os.getenv("TRACKING_NEGATIVE_CACHE_TTL", "10"))
+
+# In-memory status counters: full rebuild interval (seconds)
+STATUS_COUNTER_RECONCILE_INTERVAL = float(os.getenv("STATUS_COUNTER_RECONCILE_INTERVAL", "300"))
+
+# List endpoint page sizes
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+# Bulk parcel creation: rows per multi-row insert, inserts in flight, and max rows per upload
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "500"))
+BULK_INSERT_CONCURRENCY = int(os.getenv("BULK_INSERT_CONCURRENCY", "4"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "50000"))
+# Times a batch is retried with fresh tracking IDs after a unique violation
+BULK_INSERT_CONFLICT_RETRIES = int(os.getenv("BULK_INSERT_CONFLICT_RETRIES", "3"))
+# Rows fetched from Supabase per page while streaming an export
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# Parcel statuses reported as "in transit" / "active" in stats
+IN_TRANSIT_STATUSES = ["assigned", "picked_up", "in_transit"]
 
 # Pydantic models
 class UserCreate(BaseModel):
@@ -103,6 +187,24 @@ class ParcelResponse(BaseModel):
     created_at: str
     updated_at: str
 
+class ParcelListItem(BaseModel):
+    """Parcel in list responses; only the fields selected with fields= are returned"""
+    id: str
+    tracking_id: Optional[str] = None
+    sender_id: Optional[str] = None
+    recipient_name: Optional[str] = None
+    recipient_phone: Optional[str] = None
+    origin_address: Optional[str] = None
+    destination_address: Optional[str] = None
+    package_description: Optional[str] = None
+    weight: Optional[float] = None
+    dimensions: Optional[str] = None
+    status: Optional[str] = None
+    pickup_date: Optional[str] = None
+    delivery_date: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
 class PickupRequestCreate(BaseModel):
     pickup_address: str
     pickup_date: str
@@ -122,6 +224,21 @@ class PickupRequestResponse(BaseModel):
     courier_id: Optional[str]
     created_at: str
     updated_at: str
+
+class PickupRequestListItem(BaseModel):
+    """Pickup request in list responses; only the fields selected with fields= are returned"""
+    id: str
+    merchant_id: Optional[str] = None
+    pickup_address: Optional[str] = None
+    pickup_date: Optional[str] = None
+    pickup_time_slot: Optional[str] = None
+    package_count: Optional[int] = None
+    special_instructions: Optional[str] = None
+    status: Optional[str] = None
+    courier_id: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
 # Admin Models
 # Junction table models
 class PickupRequestParcelCreate(BaseModel):
@@ -166,6 +283,32 @@ class PickupRequestUpdate(BaseModel):
 class PickupRequestReject(BaseModel):
     admin_notes: str
 
+# Sparse fieldsets for list endpoints
+# Summary fields used by the frontend list views (fields=summary)
+PARCEL_SUMMARY_FIELDS = ["tracking_id", "status", "recipient_name", "created_at"]
+PICKUP_REQUEST_SUMMARY_FIELDS = ["pickup_address", "pickup_date", "pickup_time_slot", "status", "created_at"]
+
+def build_select(fields: Optional[str], allowed: List[str], summary: List[str]) -> str:
+    """Map a fields= query parameter onto a PostgREST select= projection"""
+    if not fields:
+        return "*"
+    
+    requested = summary if fields == "summary" else [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    # id and created_at are always needed for the pagination cursor
+    return ",".join(dict.fromkeys(["id", "created_at", *requested]))
+
+def parcel_select(fields: Optional[str] = None) -> str:
+    """fields= dependency for parcel list endpoints"""
+    return build_select(fields, list(ParcelListItem.model_fields), PARCEL_SUMMARY_FIELDS)
+
+def pickup_request_select(fields: Optional[str] = None) -> str:
+    """fields= dependency for pickup request list endpoints"""
+    return build_select(fields, list(PickupRequestListItem.model_fields), PICKUP_REQUEST_SUMMARY_FIELDS)
+
 # Admin authentication helper
 # Authentication functions
 def create_access_token(data: dict):
@@ -175,10 +318,24 @@ def create_access_token(data: dict):
     encoded_jwt = PyJWT.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# Verified payloads keyed by a hash of the raw token, so raw tokens are never held in memory
+token_cache = TTLCache(maxsize=JWT_CACHE_SIZE, ttl=JWT_CACHE_TTL)
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Runs on the event loop (not the threadpool) so the cache needs no locking
+    token_key = hashlib.sha256(credentials.credentials.encode()).hexdigest()
+    cached = token_cache.get(token_key)
+    if cached is not None:
+        return dict(cached)
+    
     try:
         payload = PyJWT.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            token_cache.set(token_key, payload, ttl=min(JWT_CACHE_TTL, remaining))
+        
+        return dict(payload)
     except PyJWT.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -190,62 +347,214 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
             detail="Could not validate credentials"
         )
 
-# Supabase client functions
-async def get_supabase_client():
-    return {
-        "url": SUPABASE_URL,
-        "key": SUPABASE_ANON_KEY
-    }
+# Repositories for the configured backend (STORAGE_BACKEND=postgrest or asyncpg)
+storage = create_storage()
+
+async def count_rows(queries: dict) -> dict:
+    """Run several (table, filters) counts concurrently, returning {name: count}"""
+    names = list(queries.keys())
+    counts = await asyncio.gather(*[table.count(filters) for table, filters in queries.values()])
+    return dict(zip(names, counts))
 
-async def supabase_request(endpoint: str, method: str = "GET", data: dict = None, headers: dict = None, user_token: str = None):
-    """Make requests to Supabase API"""
-    if not SUPABASE_URL or not SUPABASE_ANON_KEY:
-        raise HTTPException(status_code=500, detail="Supabase configuration missing")
+def first_row(rows: List[dict]) -> Optional[dict]:
+    """The row a conditional write affected, or None when no row matched its filters"""
+    return rows[0] if rows else None
+
+async def explain_failed_write(
+    table: Table,
+    row_id: str,
+    owner_field: str,
+    user_id: str,
+    user_role: str,
+    not_found: str,
+    forbidden: str,
+    required_status: Optional[str] = None,
+    wrong_status: Optional[str] = None
+):
+    """Raise the right error for a conditional write that matched no rows (only runs on the failure path)"""
+    row = await table.get(row_id, f"{owner_field},status")
+    
+    if not row:
+        raise HTTPException(status_code=404, detail=not_found)
+    if user_role != "admin" and row.get(owner_field) != user_id:
+        raise HTTPException(status_code=403, detail=forbidden)
+    if required_status and row.get("status") != required_status:
+        raise HTTPException(status_code=400, detail=wrong_status)
     
-    url = f"{SUPABASE_URL}/rest/v1/{endpoint}"
+    # The row changed between the write and this read
+    raise HTTPException(status_code=409, detail="Row was modified concurrently, please retry")
+
+# Narrow projection that determines a page's ETag: which rows, and when each last changed
+PAGE_WATERMARK_COLUMNS = "id,created_at,updated_at"
+
+async def read_page(table: Table, filters: dict, limit: int, cursor: Optional[str], include_total: bool, select: str):
+    """(rows, next_cursor, total) for one page; total is None unless include_total is set"""
+    if include_total:
+        (rows, next_cursor), total = await asyncio.gather(
+            table.page(filters, limit, cursor, select),
+            table.count(filters)
+        )
+        return rows, next_cursor, total
     
-    # Use service key for backend operations to bypass RLS
-    auth_key = SUPABASE_SERVICE_KEY if SUPABASE_SERVICE_KEY else SUPABASE_ANON_KEY
+    rows, next_cursor = await table.page(filters, limit, cursor, select)
+    return rows, next_cursor, None
+
+def page_etag(scope: str, rows: List[dict], next_cursor: Optional[str], total: Optional[int]) -> str:
+    """ETag of a page from its rows' (id, updated_at) watermarks, so it is the same for any projection"""
+    return make_etag(scope, [(row.get("id"), row.get("updated_at")) for row in rows], next_cursor, total)
+
+async def fetch_page(
+    table: Table,
+    filters: dict,
+    response: Response,
+    limit: int = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    select: str = "*",
+    request: Optional[Request] = None,
+    user_id: Optional[str] = None
+):
+    """
+    One page of a list endpoint, newest first by (created_at, id)
     
-    default_headers = {
-        "apikey": auth_key,
-        "Authorization": f"Bearer {auth_key}",
-        "Content-Type": "application/json"
-    }
+    Sets X-Next-Cursor when more rows exist and X-Total-Count when include_total is set.
+    Deep pages cost the same as the first one because no OFFSET is used.
     
-    if headers:
-        default_headers.update(headers)
+    With a request, the page gets an ETag. A conditional request first reads only the
+    watermark columns of the page and returns a 304 response if nothing changed.
+    """
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
     
-    async with httpx.AsyncClient(timeout=15.0) as client:
+    if request is None or not ETAGS_ENABLED:
+        rows, next_cursor, total = await read_page(table, filters, limit, cursor, include_total, select)
+        etag = None
+    else:
+        scope = request_scope(request, user_id)
+        
+        if "if-none-match" in request.headers:
+            watermarks = await read_page(table, filters, limit, cursor, include_total, PAGE_WATERMARK_COLUMNS)
+            etag = page_etag(scope, *watermarks)
+            if etag_matches(request, etag):
+                return check_etag(request, response, etag)
+        
+        # The ETag is computed from the rows actually returned, so it never runs ahead of the body
+        columns = select if select == "*" or "updated_at" in split_columns(select) else f"{select},updated_at"
+        rows, next_cursor, total = await read_page(table, filters, limit, cursor, include_total, columns)
+        etag = page_etag(scope, rows, next_cursor, total)
+        if columns != select:
+            rows = [{key: value for key, value in row.items() if key != "updated_at"} for row in rows]
+    
+    if etag:
+        not_modified = check_etag(request, response, etag)
+        if not_modified:
+            return not_modified
+    
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return rows
+
+async def rebuild_status_counters():
+    """Rebuild the in-memory status counters from paged scans of parcels and pickup requests"""
+    rebuilt_at = time.time()
+    await status_counters.rebuild(
+        storage.parcels.scan_pages("id,sender_id,status"),
+        storage.pickup_requests.scan_pages("id,merchant_id,status"),
+        rebuilt_at
+    )
+
+async def reconcile_status_counters_loop():
+    """Rebuild counters at startup, then periodically to correct drift"""
+    while True:
         try:
-            if method == "GET":
-                response = await client.get(url, headers=default_headers)
-            elif method == "POST":
-                response = await client.post(url, headers=default_headers, json=data)
-            elif method == "PUT":
-                response = await client.put(url, headers=default_headers, json=data)
-            elif method == "PATCH":
-                response = await client.patch(url, headers=default_headers, json=data)
-            elif method == "DELETE":
-                response = await client.delete(url, headers=default_headers)
-            else:
-                raise HTTPException(status_code=400, detail="Invalid HTTP method")
-            
-            if response.status_code >= 400:
-                raise HTTPException(status_code=response.status_code, detail=f"Supabase error: {response.text}")
-            
-            # Handle empty responses (common with POST/PUT operations)
-            if response.text.strip():
-                try:
-                    return response.json()
-                except:
-                    # If JSON parsing fails, return empty dict
-                    return {}
+            await rebuild_status_counters()
+        except Exception:
+            logger.exception("Error rebuilding status counters")
+        await asyncio.sleep(STATUS_COUNTER_RECONCILE_INTERVAL)
+
+# Public tracking projection by tracking ID
+tracking_cache = TTLCache(maxsize=TRACKING_CACHE_SIZE, ttl=TRACKING_CACHE_TTL)
+TRACKING_FIELDS = "tracking_id,status,recipient_name,created_at,updated_at"
+
+# Known tracking IDs and recently seen unknown ones
+tracking_id_filter = KnownIdFilter(TRACKING_BLOOM_CAPACITY, TRACKING_BLOOM_FP_RATE)
+tracking_not_found = TTLCache(maxsize=TRACKING_NEGATIVE_CACHE_SIZE, ttl=TRACKING_NEGATIVE_CACHE_TTL)
+
+# Parcel writes that touched tracking data. A lookup only caches what it read when
+# no write landed during its read, so a stale row never outlives the invalidation
+tracking_write_generation = 0
+
+def invalidate_tracking(*tracking_ids: Optional[str]):
+    """Drop cached tracking responses, found or not, after a parcel write"""
+    global tracking_write_generation
+    tracking_write_generation += 1
+    for tracking_id in tracking_ids:
+        if tracking_id:
+            tracking_cache.delete(tracking_id)
+            tracking_not_found.delete(tracking_id)
+
+async def rebuild_tracking_id_filter():
+    """Rebuild the tracking ID Bloom filter from a paged scan of parcels"""
+    async def pages():
+        async for rows in storage.parcels.scan_pages("id,tracking_id,created_at"):
+            watermark = max((row["created_at"] for row in rows if row.get("created_at")), default=None)
+            yield [row["tracking_id"] for row in rows if row.get("tracking_id")], watermark
+    
+    await tracking_id_filter.rebuild(await storage.parcels.count(), pages())
+
+async def sync_tracking_id_filter():
+    """Add tracking IDs created since the last watermark, including other workers' inserts"""
+    if tracking_id_filter.watermark is None:
+        await rebuild_tracking_id_filter()
+        return
+    
+    since = datetime.fromisoformat(tracking_id_filter.watermark) - timedelta(seconds=TRACKING_BLOOM_SYNC_OVERLAP)
+    rows = await storage.parcels.created_since(since.isoformat(), "id,tracking_id,created_at")
+    
+    for row in rows:
+        if row.get("tracking_id"):
+            tracking_id_filter.add(row["tracking_id"])
+            tracking_not_found.delete(row["tracking_id"])
+    if rows:
+        tracking_id_filter.watermark = max(tracking_id_filter.watermark, rows[-1]["created_at"])
+
+async def tracking_id_filter_loop():
+    """Build the tracking ID filter at startup, then keep it in sync"""
+    last_rebuild = None
+    while True:
+        try:
+            if last_rebuild is None or time.monotonic() - last_rebuild >= TRACKING_BLOOM_REBUILD_INTERVAL:
+                await rebuild_tracking_id_filter()
+                last_rebuild = time.monotonic()
             else:
-                # For successful POST/PUT operations, return the data that was sent
-                return data if data else {}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Supabase request failed: {str(e)}")
+                await sync_tracking_id_filter()
+        except Exception:
+            logger.exception("Error refreshing tracking ID filter")
+        await asyncio.sleep(TRACKING_BLOOM_SYNC_INTERVAL)
+
+# Profiles by user ID; concurrent misses for the same user share one upstream read
+profile_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+profile_loads = SingleFlight()
+
+def cache_profile(profile: dict):
+    """Write a freshly read or written profile through to the cache"""
+    if profile and profile.get("id"):
+        profile_cache.set(profile["id"], profile)
+
+async def get_profile(user_id: str) -> Optional[dict]:
+    """Profile for a user, served from the cache when possible"""
+    cached = profile_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
+    async def load():
+        profile = await storage.profiles.get(user_id)
+        cache_profile(profile)
+        return profile
+    
+    return await profile_loads.do(user_id, load)
 
 # Routes
 @app.get("/")
@@ -256,15 +565,38 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics (request counts, in-flight requests, latency per route)"""
+    return metrics_response()
+
+@app.get("/health/pool")
+async def pool_stats():
+    """Storage connection pool statistics for this worker"""
+    return storage.pool_stats()
+
+@app.get("/health/stats")
+async def runtime_stats():
+    """In-process pool, cache and counter statistics for this worker"""
+    return {
+        "storage": storage.get_stats(),
+        "upstream_trace": trace_stats.get_stats(),
+        "status_counters": status_counters.get_stats(),
+        "token_cache": token_cache.get_stats(),
+        "profile_cache": {**profile_cache.get_stats(), "loads": profile_loads.get_stats()},
+        "tracking_cache": tracking_cache.get_stats(),
+        "tracking_not_found_cache": tracking_not_found.get_stats(),
+        "tracking_id_filter": tracking_id_filter.get_stats(),
+        "etags": etag_stats.get_stats(),
+        "compression": compression_stats.get_stats()
+    }
+
 @app.post("/auth/register", response_model=UserResponse)
 async def register(user_data: UserCreate):
     """User registration endpoint"""
     try:
         # Check if user already exists
-        existing_user = await supabase_request(
-            f"profiles?email=eq.{user_data.email}",
-            "GET"
-        )
+        existing_user = await storage.profiles.find({"email": user_data.email})
         
         if existing_user and len(existing_user) > 0:
             raise HTTPException(
@@ -287,15 +619,11 @@ async def register(user_data: UserCreate):
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        # Insert profile into Supabase with proper headers
-        result = await supabase_request(
-            "profiles",
-            "POST",
-            profile_data,
-            headers={"Prefer": "return=representation"}
-        )
+        # Insert profile, returning the stored row
+        result = await storage.profiles.insert(profile_data)
         
-        # For POST operations, Supabase may return an empty response; we already set user_id above
+        # Fall back to the submitted data if no row came back; we already set user_id above
+        cache_profile(result[0] if result else profile_data)
         
         # Create access token
         token_data = {
@@ -313,6 +641,8 @@ async def register(user_data: UserCreate):
         
         return response_data
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -321,10 +651,7 @@ async def login(user_data: UserLogin):
     """User login endpoint"""
     try:
         # Find user by email
-        user = await supabase_request(
-            f"profiles?email=eq.{user_data.email}",
-            "GET"
-        )
+        user = await storage.profiles.find({"email": user_data.email})
         
         if not user or len(user) == 0:
             raise HTTPException(
@@ -333,6 +660,7 @@ async def login(user_data: UserLogin):
             )
         
         user_profile = user[0]
+        cache_profile(user_profile)
         
         # In a real app, you'd verify the password here
         # For now, we'll just check if the user exists
@@ -351,6 +679,8 @@ async def login(user_data: UserLogin):
             "user": user_profile
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -359,19 +689,58 @@ async def get_current_user(token: dict = Depends(verify_token)):
     """Get current user profile"""
     try:
         user_id = token.get("sub")
-        user = await supabase_request(
-            f"profiles?id=eq.{user_id}",
-            "GET"
-        )
+        user = await get_profile(user_id)
         
-        if not user or len(user) == 0:
+        if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        return user[0]
+        return user
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def new_tracking_id() -> str:
+    return f"FT{uuid.uuid4().hex[:8].upper()}"
+
+def is_unique_violation(error: HTTPException) -> bool:
+    """A 409 from a duplicate key (both backends put the Postgres message in the detail)"""
+    return error.status_code == 409 and "duplicate key" in str(error.detail)
+
+def build_parcel_record(parcel_data: ParcelCreate, user_id: str) -> dict:
+    """Database row for a new parcel, with a fresh tracking ID"""
+    # Generate tracking ID
+    tracking_id = new_tracking_id()
+    
+    parcel_data_dict = parcel_data.dict()
+    
+    # Map recipient_address to origin_address and destination_address for compatibility
+    if "recipient_address" in parcel_data_dict:
+        parcel_data_dict["origin_address"] = parcel_data_dict.pop("recipient_address")
+        parcel_data_dict["destination_address"] = parcel_data_dict["origin_address"]
+    
+    # Filter out fields that don't exist in the database
+    allowed_fields = {
+        "recipient_name", "recipient_phone", "origin_address", "destination_address",
+        "package_description", "weight", "dimensions", "sender_id", "tracking_id", 
+        "status", "created_at", "updated_at"
+    }
+    
+    # Remove fields that don't exist in the database
+    filtered_data = {k: v for k, v in parcel_data_dict.items() if k in allowed_fields}
+    
+    now = datetime.utcnow().isoformat()
+    filtered_data.update({
+        "sender_id": user_id,
+        "tracking_id": tracking_id,
+        "status": "pending",
+        "created_at": now,
+        "updated_at": now
+    })
+    
+    return filtered_data
+
 @app.post("/parcels", response_model=ParcelResponse)
 async def create_parcel(
     parcel_data: ParcelCreate,
@@ -381,89 +750,378 @@ async def create_parcel(
     try:
         user_id = token.get("sub")
         
-        # Generate tracking ID
-        import uuid
-        tracking_id = f"FT{uuid.uuid4().hex[:8].upper()}"
+        filtered_data = build_parcel_record(parcel_data, user_id)
         
-        parcel_data_dict = parcel_data.dict()
+        # Return the stored row, including its database-generated id
+        result = await storage.parcels.insert(filtered_data)
         
-        # Map recipient_address to origin_address and destination_address for compatibility
-        if "recipient_address" in parcel_data_dict:
-            parcel_data_dict["origin_address"] = parcel_data_dict.pop("recipient_address")
-            parcel_data_dict["destination_address"] = parcel_data_dict["origin_address"]
+        if not result:
+            raise HTTPException(status_code=500, detail="Failed to create parcel")
         
-        # Filter out fields that don't exist in the database
-        allowed_fields = {
-            "recipient_name", "recipient_phone", "origin_address", "destination_address",
-            "package_description", "weight", "dimensions", "sender_id", "tracking_id", 
-            "status", "created_at", "updated_at"
-        }
+        # The schema's insert trigger may replace the generated tracking ID; index the stored one
+        tracking_id = result[0]["tracking_id"]
+        status_counters.parcel_created(user_id, [result[0]["id"]])
+        tracking_id_filter.add(tracking_id)
+        invalidate_tracking(tracking_id)
         
-        # Remove fields that don't exist in the database
-        filtered_data = {k: v for k, v in parcel_data_dict.items() if k in allowed_fields}
+        return result[0]
         
-        filtered_data.update({
-            "sender_id": user_id,
-            "tracking_id": tracking_id,
-            "status": "pending",
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def decode_line(line: bytes, first: bool):
+    """One body line as text, or the UnicodeDecodeError if it is not valid UTF-8"""
+    try:
+        return line.decode("utf-8-sig" if first else "utf-8").rstrip("\r")
+    except UnicodeDecodeError as e:
+        return e
+
+async def iter_body_lines(request: Request):
+    """
+    Yield decoded lines from a streamed request body
+    
+    Lines are split before decoding, so invalid UTF-8 is yielded as a
+    UnicodeDecodeError for that line instead of failing the whole body.
+    """
+    pending = b""
+    first = True
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield decode_line(line, first)
+            first = False
+    if pending:
+        yield decode_line(pending, first)
+
+async def iter_csv_rows(request: Request):
+    """Yield dicts from a streamed CSV body with a header row"""
+    header = None
+    record = ""
+    async for line in iter_body_lines(request):
+        if isinstance(line, Exception):
+            # The record this line belonged to cannot be parsed; report it as one row error
+            record = ""
+            yield line
+            continue
+        record = f"{record}\n{line}" if record else line
+        # A quoted field can span lines; the record is complete once its quotes balance
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader([record])) if record.strip() else None
+        record = ""
+        if values is None:
+            continue
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+        # Empty CSV cells mean "not provided"
+        yield {key: (value if value != "" else None) for key, value in zip(header, values)}
+
+async def iter_ndjson_rows(request: Request):
+    """Yield one parsed JSON value per non-empty line of a streamed body"""
+    async for line in iter_body_lines(request):
+        if isinstance(line, Exception):
+            yield line
+        elif line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+
+async def iter_bulk_rows(request: Request):
+    """Rows of a bulk upload: a JSON array, or streamed CSV / NDJSON"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    
+    if content_type in ("text/csv", "application/csv"):
+        async for row in iter_csv_rows(request):
+            yield row
+    elif content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        async for row in iter_ndjson_rows(request):
+            yield row
+    elif content_type in ("application/json", ""):
+        try:
+            rows = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of parcels")
+        for row in rows:
+            yield row
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+
+@app.post("/parcels/bulk")
+async def create_parcels_bulk(
+    request: Request,
+    token: dict = Depends(verify_token)
+):
+    """
+    Create many parcels from a JSON array or a streamed CSV/NDJSON upload
+    
+    Rows are validated as they arrive and inserted in multi-row batches.
+    Returns one result per input row (0-based), in input order.
+    """
+    user_id = token.get("sub")
+    results = []
+    batch = []
+    inserts = []
+    semaphore = asyncio.Semaphore(BULK_INSERT_CONCURRENCY)
+    
+    async def insert_batch(rows):
+        records = [record for _, record in rows]
+        for attempt in range(BULK_INSERT_CONFLICT_RETRIES + 1):
+            try:
+                created = await storage.parcels.insert(records, "id,tracking_id")
+                break
+            except HTTPException as e:
+                # One multi-row insert is one statement, so a failed batch created nothing;
+                # a tracking ID collision fails the whole batch, so retry it with new IDs
+                if is_unique_violation(e) and attempt < BULK_INSERT_CONFLICT_RETRIES:
+                    records = [{**record, "tracking_id": new_tracking_id()} for record in records]
+                    continue
+                error = e.detail
+            except Exception as e:
+                error = str(e)
+            results.extend({"row": index, "status": "error", "error": error} for index, _ in rows)
+            return
+        
+        # Rows come back in insert order; the tracking ID is the one the database stored,
+        # since the schema's trigger may replace the generated one
+        for (index, _), row in zip(rows, created):
+            tracking_id = row["tracking_id"]
+            results.append({"row": index, "status": "created", "id": row["id"], "tracking_id": tracking_id})
+            tracking_id_filter.add(tracking_id)
+        invalidate_tracking(*[row["tracking_id"] for row in created])
+        status_counters.parcel_created(user_id, [row["id"] for row in created])
+    
+    async def start_insert(rows):
+        # Waiting for a free slot before reading on keeps at most
+        # BULK_INSERT_CONCURRENCY batches in memory (backpressure on the upload)
+        await semaphore.acquire()
+        task = asyncio.create_task(insert_batch(rows))
+        task.add_done_callback(lambda _: semaphore.release())
+        inserts.append(task)
+    
+    try:
+        index = -1
+        async for raw in iter_bulk_rows(request):
+            index += 1
+            if index >= BULK_MAX_ROWS:
+                # Rows already inserted stay created, so report them instead of failing the request
+                results.append({"row": index, "status": "error", "error": f"Upload limit of {BULK_MAX_ROWS} rows reached; remaining rows were not read"})
+                break
+            
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                if not isinstance(raw, dict):
+                    raise ValueError("Expected an object")
+                batch.append((index, build_parcel_record(ParcelCreate(**raw), user_id)))
+            except (ValidationError, ValueError, TypeError) as e:
+                # UnicodeDecodeError is a ValueError, so undecodable lines land here too
+                results.append({"row": index, "status": "error", "error": str(e)})
+            
+            if len(batch) >= BULK_INSERT_BATCH_SIZE:
+                await start_insert(batch)
+                batch = []
+        
+        if batch:
+            await start_insert(batch)
+    
+    except Exception as e:
+        # Nothing was read yet (bad content type, invalid JSON): fail the request as usual
+        if index < 0 and not inserts:
+            if isinstance(e, HTTPException):
+                raise
+            raise HTTPException(status_code=500, detail=str(e))
+        
+        # The upload broke partway (client disconnect, malformed CSV, ...). Batches already
+        # sent may have committed, so let them finish and report what happened to every row
+        logger.warning("Bulk upload aborted after row %d: %s", index, e)
+        reason = e.detail if isinstance(e, HTTPException) else str(e) or type(e).__name__
+        results.extend({"row": row, "status": "error", "error": "Upload aborted before this row was inserted"} for row, _ in batch)
+        results.append({"row": index + 1, "status": "error", "error": f"Upload aborted: {reason}; remaining rows were not read"})
+    
+    await asyncio.gather(*inserts)
+    
+    results.sort(key=lambda result: result["row"])
+    created_count = sum(1 for result in results if result["status"] == "created")
+    
+    return {
+        "created": created_count,
+        "failed": len(results) - created_count,
+        "results": results
+    }
+
+@app.get("/parcels", response_model=List[ParcelListItem], response_model_exclude_unset=True)
+async def get_parcels(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    select: str = Depends(parcel_select),
+    token: dict = Depends(verify_token)
+):
+    """Get user's parcels (one page, newest first; see X-Next-Cursor)"""
+    try:
+        user_id = token.get("sub")
+        user_role = token.get("role")
+        
+        # Admin can see all parcels, merchant can only see their own parcels
+        filters = {} if user_role == "admin" else {"sender_id": user_id}
         
-        result = await supabase_request(
-            "parcels",
-            "POST",
-            filtered_data
+        rows = await fetch_page(
+            storage.parcels, filters, response, limit, cursor, include_total, select, request, user_id
         )
+        return json_rows(rows, response, ParcelListItem)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def parcel_search_filters(
+    user_id: str,
+    user_role: str,
+    tracking_id: Optional[str] = None,
+    status: Optional[str] = None,
+    recipient_name: Optional[str] = None
+) -> dict:
+    """Filters shared by parcel search and export"""
+    # Build query filters
+    query_params = {}
+    
+    if tracking_id:
+        query_params["tracking_id"] = tracking_id
+    if status:
+        query_params["status"] = status
+    if recipient_name:
+        query_params["recipient_name"] = Contains(recipient_name)
+    
+    # Add user restriction for non-admin users
+    if user_role != "admin":
+        query_params["sender_id"] = user_id
+    
+    return query_params
+
+# Registered before /parcels/{parcel_id} so "search" and "export" are not captured as parcel IDs
+@app.get("/parcels/search", response_model=List[ParcelListItem], response_model_exclude_unset=True)
+async def search_parcels(
+    response: Response,
+    tracking_id: Optional[str] = None,
+    status: Optional[str] = None,
+    recipient_name: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    select: str = Depends(parcel_select),
+    token: dict = Depends(verify_token)
+):
+    """Search parcels with filters (one page, newest first; see X-Next-Cursor)"""
+    try:
+        user_id = token.get("sub")
+        user_role = token.get("role")
         
-        # Generate a UUID for the response since Supabase POST returns empty body
-        import uuid
-        parcel_id = str(uuid.uuid4())
+        query_params = parcel_search_filters(user_id, user_role, tracking_id, status, recipient_name)
         
-        return {**filtered_data, "id": parcel_id}
+        rows = await fetch_page(storage.parcels, query_params, response, limit, cursor, include_total, select)
+        return json_rows(rows, response, ParcelListItem)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/parcels", response_model=List[ParcelResponse])
-async def get_parcels(token: dict = Depends(verify_token)):
-    """Get user's parcels"""
+@app.get("/parcels/export")
+async def export_parcels(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    tracking_id: Optional[str] = None,
+    status: Optional[str] = None,
+    recipient_name: Optional[str] = None,
+    select: str = Depends(parcel_select),
+    token: dict = Depends(verify_token)
+):
+    """Stream all matching parcels as NDJSON or CSV, paging through Supabase internally"""
     try:
         user_id = token.get("sub")
         user_role = token.get("role")
         
-        if user_role == "admin":
-            # Admin can see all parcels
-            parcels = await supabase_request("parcels", "GET")
-        else:
-            # Merchant can only see their own parcels
-            parcels = await supabase_request(
-                f"parcels?sender_id=eq.{user_id}",
-                "GET"
-            )
+        filters = parcel_search_filters(user_id, user_role, tracking_id, status, recipient_name)
         
-        return parcels or []
+        # Fetch the first page before streaming so upstream errors still produce a proper error response
+        first_page, next_cursor = await storage.parcels.page(filters, EXPORT_PAGE_SIZE, None, select)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    async def pages():
+        page, cursor = first_page, next_cursor
+        while True:
+            yield page
+            if not cursor:
+                break
+            try:
+                page, cursor = await storage.parcels.page(filters, EXPORT_PAGE_SIZE, cursor, select)
+            except Exception:
+                # Headers are already sent, so abort the response instead of ending it
+                # cleanly; the client sees a broken transfer rather than a truncated 200
+                logger.exception("Error exporting parcels")
+                raise
+    
+    if export_format == "csv":
+        columns = list(ParcelListItem.model_fields) if select == "*" else select.split(",")
+        
+        async def csv_stream():
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            async for page in pages():
+                writer.writerows(page)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        
+        return StreamingResponse(
+            csv_stream(),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=parcels.csv"}
+        )
+    
+    async def ndjson_stream():
+        async for page in pages():
+            yield ndjson_lines(page)
+    
+    return StreamingResponse(
+        ndjson_stream(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=parcels.ndjson"}
+    )
 
 @app.get("/parcels/{parcel_id}", response_model=ParcelResponse)
 async def get_parcel(
     parcel_id: str,
+    request: Request,
+    response: Response,
     token: dict = Depends(verify_token)
 ):
     """Get specific parcel details"""
     try:
-        parcel = await supabase_request(
-            f"parcels?id=eq.{parcel_id}",
-            "GET"
-        )
+        parcel = await storage.parcels.get(parcel_id)
         
-        if not parcel or len(parcel) == 0:
+        if not parcel:
             raise HTTPException(status_code=404, detail="Parcel not found")
         
-        return parcel[0]
+        # A single row costs one round trip either way, so its ETag is a hash of the row
+        return check_etag(request, response, make_etag(parcel)) or parcel
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -478,36 +1136,38 @@ async def update_parcel(
         user_id = token.get("sub")
         user_role = token.get("role")
         
-        # Check if parcel exists and user has permission
-        existing_parcel = await supabase_request(
-            f"parcels?id=eq.{parcel_id}",
-            "GET"
-        )
-        
-        if not existing_parcel or len(existing_parcel) == 0:
-            raise HTTPException(status_code=404, detail="Parcel not found")
-        
-        parcel = existing_parcel[0]
-        
-        # Only sender or admin can update
-        if user_role != "admin" and parcel.get("sender_id") != user_id:
-            raise HTTPException(status_code=403, detail="Not authorized to update this parcel")
+        # Only sender or admin can update; the check is a filter on the write itself
+        filters = {"id": parcel_id}
+        if user_role != "admin":
+            filters["sender_id"] = user_id
         
         # Add updated timestamp
         update_data = parcel_data.copy()
         update_data["updated_at"] = datetime.utcnow().isoformat()
         
-        result = await supabase_request(
-            f"parcels?id=eq.{parcel_id}",
-            "PUT",
-            update_data
-        )
+        # A status change also returns the previous status, for the counters
+        write = storage.parcels.transition if "status" in update_data else storage.parcels.update
+        parcel = first_row(await write(filters, update_data))
         
-        if not result:
-            raise HTTPException(status_code=500, detail="Failed to update parcel")
+        if parcel is None:
+            await explain_failed_write(
+                storage.parcels, parcel_id, "sender_id", user_id, user_role,
+                not_found="Parcel not found",
+                forbidden="Not authorized to update this parcel"
+            )
         
-        return {**parcel, **update_data}
+        if "status" in update_data:
+            previous_status = parcel.pop("previous_status", None)
+            status_counters.parcel_status_changed(parcel.get("sender_id"), parcel["id"], previous_status, parcel.get("status"))
+        invalidate_tracking(parcel.get("tracking_id"))
+        if "tracking_id" in update_data and parcel.get("tracking_id"):
+            # A changed tracking ID must be trackable straight away
+            tracking_id_filter.add(parcel["tracking_id"])
         
+        return parcel
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -521,32 +1181,29 @@ async def delete_parcel(
         user_id = token.get("sub")
         user_role = token.get("role")
         
-        # Check if parcel exists
-        existing_parcel = await supabase_request(
-            f"parcels?id=eq.{parcel_id}",
-            "GET"
-        )
-        
-        if not existing_parcel or len(existing_parcel) == 0:
-            raise HTTPException(status_code=404, detail="Parcel not found")
-        
-        parcel = existing_parcel[0]
+        # Only sender or admin can delete, and only while the parcel is pending
+        filters = {"id": parcel_id, "status": "pending"}
+        if user_role != "admin":
+            filters["sender_id"] = user_id
         
-        # Only sender or admin can delete
-        if user_role != "admin" and parcel.get("sender_id") != user_id:
-            raise HTTPException(status_code=403, detail="Not authorized to delete this parcel")
+        parcel = first_row(await storage.parcels.delete(filters))
         
-        # Only allow deletion if status is pending
-        if parcel.get("status") != "pending":
-            raise HTTPException(status_code=400, detail="Can only delete parcels with pending status")
+        if parcel is None:
+            await explain_failed_write(
+                storage.parcels, parcel_id, "sender_id", user_id, user_role,
+                not_found="Parcel not found",
+                forbidden="Not authorized to delete this parcel",
+                required_status="pending",
+                wrong_status="Can only delete parcels with pending status"
+            )
         
-        result = await supabase_request(
-            f"parcels?id=eq.{parcel_id}",
-            "DELETE"
-        )
+        status_counters.parcel_deleted(parcel.get("sender_id"), parcel["id"], parcel.get("status"))
+        invalidate_tracking(parcel.get("tracking_id"))
         
         return {"message": "Parcel deleted successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -567,21 +1224,6 @@ async def update_parcel_status(
         if not new_status:
             raise HTTPException(status_code=400, detail="Status is required")
         
-        # Check if parcel exists
-        existing_parcel = await supabase_request(
-            f"parcels?id=eq.{parcel_id}",
-            "GET"
-        )
-        
-        if not existing_parcel or len(existing_parcel) == 0:
-            raise HTTPException(status_code=404, detail="Parcel not found")
-        
-        parcel = existing_parcel[0]
-        
-        # Only sender or admin can update status
-        if user_role != "admin" and parcel.get("sender_id") != user_id:
-            raise HTTPException(status_code=403, detail="Not authorized to update this parcel")
-        
         # Admin-only statuses
         admin_only_statuses = ["assigned", "picked_up", "in_transit", "delivered", "returned"]
         if new_status in admin_only_statuses and user_role != "admin":
@@ -596,17 +1238,27 @@ async def update_parcel_status(
         if notes:
             update_data["status_notes"] = notes
         
-        result = await supabase_request(
-            f"parcels?id=eq.{parcel_id}",
-            "PUT",
-            update_data
-        )
+        # Only sender or admin can update status
+        filters = {"id": parcel_id}
+        if user_role != "admin":
+            filters["sender_id"] = user_id
         
-        if not result:
-            raise HTTPException(status_code=500, detail="Failed to update parcel status")
+        parcel = first_row(await storage.parcels.transition(filters, update_data, "id,sender_id,status,tracking_id"))
+        
+        if parcel is None:
+            await explain_failed_write(
+                storage.parcels, parcel_id, "sender_id", user_id, user_role,
+                not_found="Parcel not found",
+                forbidden="Not authorized to update this parcel"
+            )
+        
+        status_counters.parcel_status_changed(parcel.get("sender_id"), parcel["id"], parcel.get("previous_status"), new_status)
+        invalidate_tracking(parcel.get("tracking_id"))
         
         return {"message": f"Parcel status updated to {new_status}"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -614,32 +1266,52 @@ async def update_parcel_status(
 async def track_parcel(tracking_id: str):
     """Track parcel by tracking ID (public endpoint)"""
     try:
-        parcel = await supabase_request(
-            f"parcels?tracking_id=eq.{tracking_id}",
-            "GET"
-        )
+        cached = tracking_cache.get(tracking_id)
+        if cached is not None:
+            return cached
+        
+        # Recently confirmed unknown IDs (mostly scanners) are answered without touching the database
+        if tracking_not_found.get(tracking_id):
+            raise HTTPException(status_code=404, detail="Parcel not found")
+        
+        # A filter miss is not final: parcels from other workers or written directly
+        # in the database only reach the filter on its next sync
+        known = tracking_id_filter.might_exist(tracking_id)
+        generation = tracking_write_generation
+        parcel = await storage.parcels.find({"tracking_id": tracking_id}, TRACKING_FIELDS)
+        unchanged = generation == tracking_write_generation
         
         if not parcel or len(parcel) == 0:
+            if unchanged:
+                tracking_not_found.set(tracking_id, True)
             raise HTTPException(status_code=404, detail="Parcel not found")
+        if not known:
+            tracking_id_filter.stale_misses += 1
+            tracking_id_filter.add(tracking_id)
         
         # Return limited information for public tracking
         parcel_data = parcel[0]
-        return {
+        tracking_data = {
             "tracking_id": parcel_data.get("tracking_id"),
             "status": parcel_data.get("status"),
             "recipient_name": parcel_data.get("recipient_name"),
             "created_at": parcel_data.get("created_at"),
             "updated_at": parcel_data.get("updated_at")
         }
+        if unchanged:
+            tracking_cache.set(tracking_id, tracking_data)
+        
+        return tracking_data
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/pickup-requests", response_model=PickupRequestResponse)
 async def create_pickup_request(
     request_data: PickupRequestCreate,
-    token: dict = Depends(verify_token),
-    request: Request = None
+    token: dict = Depends(verify_token)
 ):
     """Create a pickup request"""
     try:
@@ -654,20 +1326,12 @@ async def create_pickup_request(
             "updated_at": datetime.utcnow().isoformat()
         })
         
-        # Get the user's JWT token from the request headers
-        auth_header = request.headers.get("authorization") if request else None
-        user_token = auth_header.replace("Bearer ", "") if auth_header and auth_header.startswith("Bearer ") else None
-        
-        result = await supabase_request(
-            "pickup_requests",
-            "POST",
-            pickup_data,
-            user_token=user_token
-        )
+        result = await storage.pickup_requests.insert(pickup_data)
+        if result:
+            status_counters.pickup_created(user_id, result[0]["id"])
         
         # Use the actual database response instead of generating a UUID
-        if result and isinstance(result, list) and len(result) > 0:
-            # Supabase returns the created record in a list
+        if result:
             created_record = result[0]
             pickup_id = created_record.get("id")
         else:
@@ -692,28 +1356,36 @@ async def create_pickup_request(
         
         return response_data
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/pickup-requests", response_model=List[PickupRequestResponse])
-async def get_pickup_requests(token: dict = Depends(verify_token)):
-    """Get pickup requests"""
+@app.get("/pickup-requests", response_model=List[PickupRequestListItem], response_model_exclude_unset=True)
+async def get_pickup_requests(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    select: str = Depends(pickup_request_select),
+    token: dict = Depends(verify_token)
+):
+    """Get pickup requests (one page, newest first; see X-Next-Cursor)"""
     try:
         user_id = token.get("sub")
         user_role = token.get("role")
         
-        if user_role == "admin":
-            # Admin can see all pickup requests
-            requests = await supabase_request("pickup_requests", "GET")
-        else:
-            # Merchant can only see their own requests
-            requests = await supabase_request(
-                f"pickup_requests?merchant_id=eq.{user_id}",
-                "GET"
-            )
+        # Admin can see all pickup requests, merchant can only see their own requests
+        filters = {} if user_role == "admin" else {"merchant_id": user_id}
         
-        return requests or []
+        rows = await fetch_page(
+            storage.pickup_requests, filters, response, limit, cursor, include_total, select, request, user_id
+        )
+        return json_rows(rows, response, PickupRequestListItem)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -727,22 +1399,19 @@ async def get_pickup_request(
         user_id = token.get("sub")
         user_role = token.get("role")
         
-        request_data = await supabase_request(
-            f"pickup_requests?id=eq.{request_id}",
-            "GET"
-        )
+        request = await storage.pickup_requests.get(request_id)
         
-        if not request_data or len(request_data) == 0:
+        if not request:
             raise HTTPException(status_code=404, detail="Pickup request not found")
         
-        request = request_data[0]
-        
         # Check permissions
         if user_role != "admin" and request.get("merchant_id") != user_id:
             raise HTTPException(status_code=403, detail="Not authorized to view this request")
         
         return request
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -763,15 +1432,6 @@ async def update_pickup_request(
                 detail="Only admins can update pickup requests"
             )
         
-        # Check if request exists
-        existing_request = await supabase_request(
-            f"pickup_requests?id=eq.{request_id}",
-            "GET"
-        )
-        
-        if not existing_request or len(existing_request) == 0:
-            raise HTTPException(status_code=404, detail="Pickup request not found")
-        
         # Valid statuses
         valid_statuses = ["pending", "approved", "rejected", "cancelled", "completed"]
         if status not in valid_statuses:
@@ -785,17 +1445,17 @@ async def update_pickup_request(
         if admin_notes:
             update_data["admin_notes"] = admin_notes
         
-        result = await supabase_request(
-            f"pickup_requests?id=eq.{request_id}",
-            "PUT",
-            update_data
-        )
+        request = first_row(await storage.pickup_requests.transition({"id": request_id}, update_data, "id,merchant_id,status"))
         
-        if not result:
-            raise HTTPException(status_code=500, detail="Failed to update pickup request")
+        if request is None:
+            raise HTTPException(status_code=404, detail="Pickup request not found")
+        
+        status_counters.pickup_status_changed(request.get("merchant_id"), request["id"], request.get("previous_status"), status)
         
         return {"message": f"Pickup request status updated to {status}"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -809,34 +1469,31 @@ async def delete_pickup_request(
         user_id = token.get("sub")
         user_role = token.get("role")
         
-        # Check if request exists
-        existing_request = await supabase_request(
-            f"pickup_requests?id=eq.{request_id}",
-            "GET"
-        )
-        
-        if not existing_request or len(existing_request) == 0:
-            raise HTTPException(status_code=404, detail="Pickup request not found")
-        
-        request = existing_request[0]
+        # Only merchant or admin can delete, and only while the request is pending
+        filters = {"id": request_id, "status": "pending"}
+        if user_role != "admin":
+            filters["merchant_id"] = user_id
         
-        # Only merchant or admin can delete
-        if user_role != "admin" and request.get("merchant_id") != user_id:
-            raise HTTPException(status_code=403, detail="Not authorized to delete this request")
+        request = first_row(await storage.pickup_requests.delete(filters))
         
-        # Only allow deletion if status is pending
-        if request.get("status") != "pending":
-            raise HTTPException(status_code=400, detail="Can only delete requests with pending status")
+        if request is None:
+            await explain_failed_write(
+                storage.pickup_requests, request_id, "merchant_id", user_id, user_role,
+                not_found="Pickup request not found",
+                forbidden="Not authorized to delete this request",
+                required_status="pending",
+                wrong_status="Can only delete requests with pending status"
+            )
         
-        result = await supabase_request(
-            f"pickup_requests?id=eq.{request_id}",
-            "DELETE"
-        )
+        status_counters.pickup_deleted(request.get("merchant_id"), request["id"], request.get("status"))
         
         return {"message": "Pickup request deleted successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
 # ================ PICKUP REQUEST PARCELS JUNCTION TABLE ENDPOINTS ================
 
 @app.get("/pickup-requests/{request_id}/parcels")
@@ -849,29 +1506,11 @@ async def get_pickup_request_parcels(
         user_id = token.get("sub")
         user_role = token.get("role")
         
-        # Get pickup request parcels
-        parcels_data = await supabase_request(
-            f"pickup_request_parcels?pickup_request_id=eq.{request_id}",
-            "GET"
-        )
-        
-        if not parcels_data:
-            return []
-        
-        # Get parcel details
-        parcel_ids = [item["parcel_id"] for item in parcels_data]
-        parcels = []
-        
-        for parcel_id in parcel_ids:
-            parcel_data = await supabase_request(
-                f"parcels?id=eq.{parcel_id}",
-                "GET"
-            )
-            if parcel_data and len(parcel_data) > 0:
-                parcels.append(parcel_data[0])
-        
-        return parcels
+        # Junction rows joined to their parcels in one query
+        return json_rows(await storage.pickup_parcels.parcels_in_request(request_id))
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -879,52 +1518,49 @@ async def get_pickup_request_parcels(
 async def add_parcels_to_pickup_request(
     request_id: str,
     parcel_ids: List[str],
-    token: dict = Depends(verify_token),
-    request: Request = None
+    token: dict = Depends(verify_token)
 ):
     """Add parcels to a pickup request"""
     try:
         user_id = token.get("sub")
         
-        # Get the user's JWT token from the request headers
-        auth_header = request.headers.get("authorization") if request else None
-        user_token = auth_header.replace("Bearer ", "") if auth_header and auth_header.startswith("Bearer ") else None
-        
         # Verify the pickup request belongs to the user
-        pickup_request = await supabase_request(
-            f"pickup_requests?id=eq.{request_id}",
-            "GET",
-            user_token=user_token
-        )
+        pickup_request = await storage.pickup_requests.get(request_id, "merchant_id")
         
-        if not pickup_request or pickup_request[0]["merchant_id"] != user_id:
+        if not pickup_request or pickup_request["merchant_id"] != user_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Add each parcel to the pickup request
-        for parcel_id in parcel_ids:
-            # Verify the parcel belongs to the user
-            parcel = await supabase_request(
-                f"parcels?id=eq.{parcel_id}",
-                "GET",
-                user_token=user_token
-            )
-            
-            if not parcel or parcel[0]["sender_id"] != user_id:
-                raise HTTPException(status_code=403, detail=f"Parcel {parcel_id} not found or access denied")
-            
-            # Add to junction table
-            await supabase_request(
-                "pickup_request_parcels",
-                "POST",
-                {
-                    "pickup_request_id": request_id,
-                    "parcel_id": parcel_id
-                },
-                user_token=user_token
+        # Drop duplicate IDs up front, keeping the caller's order
+        parcel_ids = list(dict.fromkeys(parcel_ids))
+        if not parcel_ids:
+            raise HTTPException(status_code=400, detail="No parcel IDs provided")
+        
+        # Verify every parcel belongs to the user in one set-based query
+        owned = await storage.parcels.find({"id": parcel_ids, "sender_id": user_id}, "id")
+        owned_ids = {row["id"] for row in owned}
+        missing = [parcel_id for parcel_id in parcel_ids if parcel_id not in owned_ids]
+        
+        if missing:
+            raise HTTPException(
+                status_code=403,
+                detail=f"Parcels not found or access denied: {', '.join(missing)}"
             )
         
+        # Insert all junction rows in one statement, so either every row is added or none are
+        await storage.pickup_parcels.insert(
+            [
+                {"pickup_request_id": request_id, "parcel_id": parcel_id}
+                for parcel_id in parcel_ids
+            ],
+            on_conflict="pickup_request_id,parcel_id",
+            ignore_duplicates=True,
+            returning=False
+        )
+        
         return {"message": f"Added {len(parcel_ids)} parcels to pickup request"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -940,29 +1576,11 @@ async def get_available_parcels_for_pickup(
         if user_role != "merchant":
             raise HTTPException(status_code=403, detail="Merchant access required")
         
-        # Get all parcels for the merchant
-        parcels = await supabase_request(
-            f"parcels?sender_id=eq.{user_id}&status=eq.pending",
-            "GET"
-        )
-        
-        if not parcels:
-            return []
-        
-        # Filter out parcels that are already in pickup requests
-        available_parcels = []
-        for parcel in parcels:
-            # Check if parcel is already in a pickup request
-            existing = await supabase_request(
-                f"pickup_request_parcels?parcel_id=eq.{parcel['id']}",
-                "GET"
-            )
-            
-            if not existing:
-                available_parcels.append(parcel)
-        
-        return available_parcels
+        # Pending parcels with no junction row, as a single anti-join
+        return json_rows(await storage.parcels.available_for_pickup(user_id))
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -978,26 +1596,40 @@ async def get_admin_stats(token: dict = Depends(verify_token)):
                 detail="Access denied"
             )
         
-        # Get counts from Supabase
-        users = await supabase_request("profiles", "GET")
-        parcels = await supabase_request("parcels", "GET")
-        pickup_requests = await supabase_request("pickup_requests", "GET")
+        if not status_counters.ready:
+            # Count in the database until the in-memory counters have been built
+            return await count_rows({
+                "total_users": (storage.profiles, None),
+                "total_parcels": (storage.parcels, None),
+                "total_pickup_requests": (storage.pickup_requests, None),
+                "pending_pickups": (storage.pickup_requests, {"status": "pending"}),
+                "active_parcels": (storage.parcels, {"status": IN_TRANSIT_STATUSES})
+            })
+        
+        parcels = status_counters.parcel_counts()
+        pickup_requests = status_counters.pickup_counts()
         
         stats = {
-            "total_users": len(users) if users else 0,
-            "total_parcels": len(parcels) if parcels else 0,
-            "total_pickup_requests": len(pickup_requests) if pickup_requests else 0,
-            "pending_pickups": len([r for r in (pickup_requests or []) if r.get("status") == "pending"]),
-            "active_parcels": len([p for p in (parcels or []) if p.get("status") in ["assigned", "picked_up", "in_transit"]])
+            "total_users": await storage.profiles.count(),
+            "total_parcels": sum(parcels.values()),
+            "total_pickup_requests": sum(pickup_requests.values()),
+            "pending_pickups": pickup_requests["pending"],
+            "active_parcels": sum(parcels[s] for s in IN_TRANSIT_STATUSES)
         }
         
         return stats
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/merchant/stats")
-async def get_merchant_stats(token: dict = Depends(verify_token)):
+async def get_merchant_stats(
+    request: Request,
+    response: Response,
+    token: dict = Depends(verify_token)
+):
     """Get merchant dashboard statistics"""
     try:
         user_id = token.get("sub")
@@ -1009,94 +1641,113 @@ async def get_merchant_stats(token: dict = Depends(verify_token)):
                 detail="Use /admin/stats for admin statistics"
             )
         
-        # Get merchant's data
-        parcels = await supabase_request(f"parcels?sender_id=eq.{user_id}", "GET")
-        pickup_requests = await supabase_request(f"pickup_requests?merchant_id=eq.{user_id}", "GET")
+        if not status_counters.ready:
+            # Count the merchant's rows in the database until the in-memory counters have been built
+            parcels = {"sender_id": user_id}
+            pickup_requests = {"merchant_id": user_id}
+            
+            stats = await count_rows({
+                "total_parcels": (storage.parcels, parcels),
+                "pending_parcels": (storage.parcels, {**parcels, "status": "pending"}),
+                "in_transit_parcels": (storage.parcels, {**parcels, "status": IN_TRANSIT_STATUSES}),
+                "delivered_parcels": (storage.parcels, {**parcels, "status": "delivered"}),
+                "total_pickup_requests": (storage.pickup_requests, pickup_requests),
+                "pending_pickup_requests": (storage.pickup_requests, {**pickup_requests, "status": "pending"}),
+                "approved_pickup_requests": (storage.pickup_requests, {**pickup_requests, "status": "approved"})
+            })
+            return check_etag(request, response, make_etag(stats)) or stats
+        
+        parcels = status_counters.parcel_counts(user_id)
+        pickup_requests = status_counters.pickup_counts(user_id)
         
         stats = {
-            "total_parcels": len(parcels) if parcels else 0,
-            "pending_parcels": len([p for p in (parcels or []) if p.get("status") == "pending"]),
-            "in_transit_parcels": len([p for p in (parcels or []) if p.get("status") in ["assigned", "picked_up", "in_transit"]]),
-            "delivered_parcels": len([p for p in (parcels or []) if p.get("status") == "delivered"]),
-            "total_pickup_requests": len(pickup_requests) if pickup_requests else 0,
-            "pending_pickup_requests": len([r for r in (pickup_requests or []) if r.get("status") == "pending"]),
-            "approved_pickup_requests": len([r for r in (pickup_requests or []) if r.get("status") == "approved"])
+            "total_parcels": sum(parcels.values()),
+            "pending_parcels": parcels["pending"],
+            "in_transit_parcels": sum(parcels[s] for s in IN_TRANSIT_STATUSES),
+            "delivered_parcels": parcels["delivered"],
+            "total_pickup_requests": sum(pickup_requests.values()),
+            "pending_pickup_requests": pickup_requests["pending"],
+            "approved_pickup_requests": pickup_requests["approved"]
         }
         
-        return stats
+        return check_etag(request, response, make_etag(stats)) or stats
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/parcels/search")
-async def search_parcels(
-    tracking_id: Optional[str] = None,
-    status: Optional[str] = None,
-    recipient_name: Optional[str] = None,
-    token: dict = Depends(verify_token)
-):
-    """Search parcels with filters"""
-    try:
-        user_id = token.get("sub")
-        user_role = token.get("role")
-        
-        # Build query parameters
-        query_params = []
-        
-        if tracking_id:
-            query_params.append(f"tracking_id=eq.{tracking_id}")
-        if status:
-            query_params.append(f"status=eq.{status}")
-        if recipient_name:
-            query_params.append(f"recipient_name=ilike.*{recipient_name}*")
-        
-        # Add user restriction for non-admin users
-        if user_role != "admin":
-            query_params.append(f"sender_id=eq.{user_id}")
-        
-        # Build query string
-        query_string = "&".join(query_params) if query_params else ""
-        
-        parcels = await supabase_request(f"parcels?{query_string}", "GET")
-        return parcels or []
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 # ================ ADMIN ROUTES ================
 
+async def load_admin_dashboard_stats() -> dict:
+    """Compute admin dashboard statistics with concurrent database-side counts"""
+    if not status_counters.ready:
+        return await count_rows({
+            "total_merchants": (storage.profiles, {"role": "merchant"}),
+            "total_admins": (storage.profiles, {"role": "admin"}),
+            "total_parcels": (storage.parcels, None),
+            "pending_parcels": (storage.parcels, {"status": "pending"}),
+            "in_transit_parcels": (storage.parcels, {"status": IN_TRANSIT_STATUSES}),
+            "delivered_parcels": (storage.parcels, {"status": "delivered"}),
+            "total_pickup_requests": (storage.pickup_requests, None),
+            "pending_pickup_requests": (storage.pickup_requests, {"status": "pending"}),
+            "approved_pickup_requests": (storage.pickup_requests, {"status": "approved"}),
+            "rejected_pickup_requests": (storage.pickup_requests, {"status": "rejected"}),
+            "active_couriers": (storage.couriers, {"status": "active"})
+        })
+    
+    # Parcel and pickup counts come from the in-memory counters
+    stats = await count_rows({
+        "total_merchants": (storage.profiles, {"role": "merchant"}),
+        "total_admins": (storage.profiles, {"role": "admin"}),
+        "active_couriers": (storage.couriers, {"status": "active"})
+    })
+    parcels = status_counters.parcel_counts()
+    pickup_requests = status_counters.pickup_counts()
+    
+    return {
+        "total_merchants": stats["total_merchants"],
+        "total_admins": stats["total_admins"],
+        "total_parcels": sum(parcels.values()),
+        "pending_parcels": parcels["pending"],
+        "in_transit_parcels": sum(parcels[s] for s in IN_TRANSIT_STATUSES),
+        "delivered_parcels": parcels["delivered"],
+        "total_pickup_requests": sum(pickup_requests.values()),
+        "pending_pickup_requests": pickup_requests["pending"],
+        "approved_pickup_requests": pickup_requests["approved"],
+        "rejected_pickup_requests": pickup_requests["rejected"],
+        "active_couriers": stats["active_couriers"]
+    }
+
+# Shared by every admin watching the dashboard in this worker
+admin_dashboard_snapshot = SnapshotCache(
+    load_admin_dashboard_stats,
+    ttl=ADMIN_DASHBOARD_TTL,
+    stale_ttl=ADMIN_DASHBOARD_STALE_TTL
+)
+
 @app.get("/admin/dashboard")
 async def get_admin_dashboard(token: dict = Depends(verify_token)):
     """Get admin dashboard overview"""
     try:
-        # Get all data for dashboard
-        users = await supabase_request("profiles", "GET")
-        parcels = await supabase_request("parcels", "GET")
-        pickup_requests = await supabase_request("pickup_requests", "GET")
-        couriers = await supabase_request("couriers", "GET")
-        
-        # Calculate statistics
-        stats = {
-            "total_merchants": len([u for u in (users or []) if u.get("role") == "merchant"]),
-            "total_admins": len([u for u in (users or []) if u.get("role") == "admin"]),
-            "total_parcels": len(parcels) if parcels else 0,
-            "pending_parcels": len([p for p in (parcels or []) if p.get("status") == "pending"]),
-            "in_transit_parcels": len([p for p in (parcels or []) if p.get("status") in ["assigned", "picked_up", "in_transit"]]),
-            "delivered_parcels": len([p for p in (parcels or []) if p.get("status") == "delivered"]),
-            "total_pickup_requests": len(pickup_requests) if pickup_requests else 0,
-            "pending_pickup_requests": len([r for r in (pickup_requests or []) if r.get("status") == "pending"]),
-            "approved_pickup_requests": len([r for r in (pickup_requests or []) if r.get("status") == "approved"]),
-            "rejected_pickup_requests": len([r for r in (pickup_requests or []) if r.get("status") == "rejected"]),
-            "active_couriers": len([c for c in (couriers or []) if c.get("status") == "active"]) if couriers else 0,
-        }
+        stats, age = await admin_dashboard_snapshot.get()
         
-        return stats
+        return {**stats, "snapshot_age_seconds": round(age, 3)}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/admin/users")
-async def get_all_users(token: dict = Depends(verify_token)):
-    """Get all users"""
+async def get_all_users(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    token: dict = Depends(verify_token)
+):
+    """Get all users (one page, newest first; see X-Next-Cursor)"""
     try:
         # Check admin role
         user_role = token.get("role")
@@ -1106,8 +1757,9 @@ async def get_all_users(token: dict = Depends(verify_token)):
                 detail="Admin access required"
             )
         
-        users = await supabase_request("profiles", "GET")
-        return users or []
+        return json_rows(await fetch_page(storage.profiles, {}, response, limit, cursor, include_total), response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1123,37 +1775,45 @@ async def get_pending_pickup_requests(token: dict = Depends(verify_token)):
                 detail="Admin access required"
             )
         
-        requests = await supabase_request("pickup_requests?status=eq.pending", "GET")
-        return requests or []
+        return json_rows(await storage.pickup_requests.find({"status": "pending"}))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def update_parcel_statuses_for_pickup_request(request_id: str, status: str):
-    """Update parcel statuses for all parcels in a pickup request"""
-    try:
-        # Get all parcels in this pickup request
-        pickup_parcels = await supabase_request(
-            f"pickup_request_parcels?pickup_request_id=eq.{request_id}",
-            "GET"
-        )
-        
-        if pickup_parcels:
-            # Update each parcel's status
-            for pickup_parcel in pickup_parcels:
-                parcel_id = pickup_parcel["parcel_id"]
-                await supabase_request(
-                    f"parcels?id=eq.{parcel_id}",
-                    "PATCH",
-                    {
-                        "status": status,
-                        "updated_at": datetime.utcnow().isoformat()
-                    }
-                )
-        
-        return True
-    except Exception as e:
-        print(f"Error updating parcel statuses: {e}")
-        return False
+async def update_parcel_statuses_for_pickup_request(request_id: str, status: str) -> int:
+    """Update parcel statuses for all parcels in a pickup request, returning the number of rows changed"""
+    # Get the ids of all parcels in this pickup request
+    pickup_parcels = await storage.pickup_parcels.parcels_in_request(request_id, "id")
+    
+    if not pickup_parcels:
+        return 0
+    
+    update_data = {
+        "status": status,
+        "updated_at": datetime.utcnow().isoformat()
+    }
+    
+    # One set-based update that also returns each parcel's previous status for the counters
+    updated = await storage.parcels.transition(
+        {"id": [parcel["id"] for parcel in pickup_parcels]}, update_data, "id,sender_id,tracking_id"
+    )
+    
+    for parcel in updated:
+        status_counters.parcel_status_changed(parcel.get("sender_id"), parcel["id"], parcel.get("previous_status"), status)
+        invalidate_tracking(parcel.get("tracking_id"))
+    
+    return len(updated)
+
+async def set_pickup_request_status(request_id: str, update_data: dict):
+    """PATCH a pickup request's status and apply the transition to the merchant's status counters"""
+    request = first_row(await storage.pickup_requests.transition({"id": request_id}, update_data))
+    
+    if request is not None:
+        previous_status = request.pop("previous_status", None)
+        status_counters.pickup_status_changed(request.get("merchant_id"), request["id"], previous_status, request.get("status"))
+    
+    return request
 
 @app.patch("/admin/pickup-requests/{request_id}/approve")
 async def approve_pickup_request(
@@ -1178,17 +1838,15 @@ async def approve_pickup_request(
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        result = await supabase_request(
-            f"pickup_requests?id=eq.{request_id}",
-            "PATCH",
-            update_data
-        )
+        result = await set_pickup_request_status(request_id, update_data)
         
         # Update parcel statuses to "assigned" for all parcels in this pickup request
-        await update_parcel_statuses_for_pickup_request(request_id, "assigned")
+        parcels_updated = await update_parcel_statuses_for_pickup_request(request_id, "assigned")
         
-        return {"message": "Pickup request approved"}
+        return {"message": "Pickup request approved", "parcels_updated": parcels_updated}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1214,23 +1872,27 @@ async def reject_pickup_request(
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        result = await supabase_request(
-            f"pickup_requests?id=eq.{request_id}",
-            "PATCH",
-            update_data
-        )
+        result = await set_pickup_request_status(request_id, update_data)
         
         # Note: For rejected pickup requests, parcels remain "pending" 
         # so they can be used in other pickup requests
         
         return {"message": "Pickup request rejected"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/admin/couriers")
-async def get_couriers(token: dict = Depends(verify_token)):
-    """Get all couriers"""
+async def get_couriers(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    token: dict = Depends(verify_token)
+):
+    """Get all couriers (one page, newest first; see X-Next-Cursor)"""
     try:
         # Check admin role
         user_role = token.get("role")
@@ -1240,8 +1902,9 @@ async def get_couriers(token: dict = Depends(verify_token)):
                 detail="Admin access required"
             )
         
-        couriers = await supabase_request("couriers", "GET")
-        return couriers or []
+        return json_rows(await fetch_page(storage.couriers, {}, response, limit, cursor, include_total), response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1267,13 +1930,14 @@ async def create_courier(
             "updated_at": datetime.utcnow().isoformat()
         })
         
-        result = await supabase_request("couriers", "POST", courier_dict)
+        result = await storage.couriers.insert(courier_dict)
         
-        import uuid
-        courier_id = result.get("id") if result and result.get("id") else str(uuid.uuid4())
+        courier_id = result[0]["id"] if result else str(uuid.uuid4())
         
         return {**courier_dict, "id": courier_id}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1299,34 +1963,41 @@ async def assign_parcel_to_courier(
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        result = await supabase_request(
-            f"parcels?id=eq.{parcel_id}",
-            "PUT",
-            parcel_update
-        )
+        result = await storage.parcels.update({"id": parcel_id}, parcel_update, "tracking_id")
+        
+        invalidate_tracking(*[row.get("tracking_id") for row in result])
         
         return {"message": "Parcel assigned to courier successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-@app.get("/parcels/status/{status}")
+@app.get("/parcels/status/{status}", response_model=List[ParcelListItem], response_model_exclude_unset=True)
 async def get_parcels_by_status(
     status: str,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    select: str = Depends(parcel_select),
     token: dict = Depends(verify_token)
 ):
-    """Get parcels by specific status"""
+    """Get parcels by specific status (one page, newest first; see X-Next-Cursor)"""
     try:
         user_id = token.get("sub")
         user_role = token.get("role")
         
         # Build query
-        if user_role == "admin":
-            parcels = await supabase_request(f"parcels?status=eq.{status}", "GET")
-        else:
-            parcels = await supabase_request(f"parcels?sender_id=eq.{user_id}&status=eq.{status}", "GET")
+        filters = {"status": status}
+        if user_role != "admin":
+            filters["sender_id"] = user_id
         
-        return parcels or []
+        rows = await fetch_page(storage.parcels, filters, response, limit, cursor, include_total, select)
+        return json_rows(rows, response, ParcelListItem)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,98 @@
+"""
+Prometheus metrics for the FastTrack backend
+A pure ASGI middleware records request counts, in-flight requests and latency
+per route template; /metrics exposes them in the Prometheus text format
+"""
+
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from starlette.responses import Response
+
+# Label requests by route template ("/parcels/{parcel_id}"), never the raw path,
+# so the number of series stays bounded
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_COUNT = Counter(
+    "http_requests_total",
+    "HTTP requests handled",
+    ["method", "route", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being handled",
+    ["method"],
+    multiprocess_mode="livesum"
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response is fully sent",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+
+class PrometheusMiddleware:
+    """Records per-route request metrics; add it as the outermost middleware"""
+
+    def __init__(self, app):
+        self.app = app
+        # labels() takes a lock and builds a key on every call; keep the children instead
+        self._in_progress = {}
+        self._series = {}
+
+    def _series_for(self, method: str, route_path: str, status_code: int):
+        key = (method, route_path, status_code)
+        series = self._series.get(key)
+        if series is None:
+            status = str(status_code)
+            series = (
+                REQUEST_COUNT.labels(method, route_path, status),
+                REQUEST_LATENCY.labels(method, route_path, status)
+            )
+            self._series[key] = series
+        return series
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        in_progress = self._in_progress.get(method)
+        if in_progress is None:
+            in_progress = self._in_progress[method] = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            count, latency = self._series_for(method, route_path, status_code)
+            count.inc()
+            latency.observe(elapsed)
+
+
+def metrics_response() -> Response:
+    """Current metrics in the Prometheus text exposition format"""
+    # With several workers, set PROMETHEUS_MULTIPROC_DIR so every worker's samples are merged
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
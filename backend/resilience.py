@@ -0,0 +1,282 @@
+"""
+Retry, circuit breaker and hedging policy for Supabase calls
+Each call is a zero-argument coroutine factory, so the policy does not
+depend on how the request is built or sent
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# Retries (idempotent methods only), with full-jitter exponential backoff
+SUPABASE_RETRY_ATTEMPTS = int(os.getenv("SUPABASE_RETRY_ATTEMPTS", "3"))
+SUPABASE_RETRY_BASE_DELAY = float(os.getenv("SUPABASE_RETRY_BASE_DELAY", "0.1"))
+SUPABASE_RETRY_MAX_DELAY = float(os.getenv("SUPABASE_RETRY_MAX_DELAY", "2"))
+
+# Circuit breaker per endpoint (PostgREST table)
+SUPABASE_BREAKER_FAILURE_THRESHOLD = int(os.getenv("SUPABASE_BREAKER_FAILURE_THRESHOLD", "5"))
+SUPABASE_BREAKER_RESET_TIMEOUT = float(os.getenv("SUPABASE_BREAKER_RESET_TIMEOUT", "30"))
+
+# Hedged GETs: send a second copy once the first is slower than this latency percentile
+SUPABASE_HEDGE_ENABLED = os.getenv("SUPABASE_HEDGE_ENABLED", "false").lower() == "true"
+SUPABASE_HEDGE_PERCENTILE = float(os.getenv("SUPABASE_HEDGE_PERCENTILE", "95"))
+SUPABASE_HEDGE_MIN_SAMPLES = int(os.getenv("SUPABASE_HEDGE_MIN_SAMPLES", "50"))
+
+# DELETE is not retried: deletes return the removed rows, so a retry after a lost
+# response would see [] and report "not found" for a delete that succeeded
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT"}
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose breaker is open"""
+
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"Circuit open for {key}, retry in {retry_after:.1f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker
+
+    Opens after `failure_threshold` failures in a row and rejects calls for
+    `reset_timeout` seconds. Then one probe call is let through (half-open):
+    success closes the breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def before_call(self, key: str):
+        """Raise CircuitOpenError if the call must not go upstream"""
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(key, self.reset_timeout - elapsed)
+            self.state = self.HALF_OPEN
+
+        if self.state == self.HALF_OPEN:
+            if self.probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError(key, 0.0)
+            self.probe_in_flight = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Call ended without telling us anything about upstream health (e.g. cancelled)"""
+        self.probe_in_flight = False
+
+    def get_stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class LatencyWindow:
+    """Recent call latencies with a cached percentile"""
+
+    def __init__(self, size: int = 500, recompute_every: int = 25):
+        self._samples = deque(maxlen=size)
+        self._recompute_every = recompute_every
+        self._since_recompute = 0
+        self._cached: Dict[float, float] = {}
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self._since_recompute += 1
+        if self._since_recompute >= self._recompute_every:
+            self._cached.clear()
+            self._since_recompute = 0
+
+    def percentile(self, p: float, min_samples: int = 1) -> Optional[float]:
+        """Latency at percentile p, or None until min_samples calls were seen"""
+        if len(self._samples) < min_samples:
+            return None
+        if p not in self._cached:
+            ordered = sorted(self._samples)
+            self._cached[p] = ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+        return self._cached[p]
+
+
+class UpstreamPolicy:
+    """Applies retries, per-key circuit breakers and optional hedging to upstream calls"""
+
+    def __init__(
+        self,
+        retry_attempts: int = SUPABASE_RETRY_ATTEMPTS,
+        retry_base_delay: float = SUPABASE_RETRY_BASE_DELAY,
+        retry_max_delay: float = SUPABASE_RETRY_MAX_DELAY,
+        failure_threshold: int = SUPABASE_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = SUPABASE_BREAKER_RESET_TIMEOUT,
+        hedge_enabled: bool = SUPABASE_HEDGE_ENABLED,
+        hedge_percentile: float = SUPABASE_HEDGE_PERCENTILE,
+        hedge_min_samples: int = SUPABASE_HEDGE_MIN_SAMPLES
+    ):
+        self.retry_attempts = max(1, retry_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self.retries = 0
+        self.retries_exhausted = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[key]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+
+    async def call(self, key: str, method: str, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Run send() under the breaker for key, retrying idempotent methods on transient failures"""
+        breaker = self.breaker(key)
+        attempts = self.retry_attempts if method in IDEMPOTENT_METHODS else 1
+
+        for attempt in range(attempts):
+            last_attempt = attempt + 1 >= attempts
+            breaker.before_call(key)
+            try:
+                response = await self._send(key, method, send)
+            except httpx.PoolTimeout:
+                # Our own pool is saturated; retrying would only add load
+                breaker.release()
+                raise
+            except httpx.TransportError:
+                breaker.record_failure()
+                if last_attempt:
+                    if attempts > 1:
+                        self.retries_exhausted += 1
+                    raise
+            except BaseException:
+                breaker.release()
+                raise
+            else:
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+                if last_attempt:
+                    if attempts > 1:
+                        self.retries_exhausted += 1
+                    return response
+
+            self.retries += 1
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def _send(self, key: str, method: str, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        if method != "GET":
+            return await send()
+
+        window = self._latencies.setdefault(key, LatencyWindow())
+        delay = None
+        if self.hedge_enabled:
+            delay = window.percentile(self.hedge_percentile, self.hedge_min_samples)
+
+        started = time.perf_counter()
+        if delay is None:
+            response = await send()
+        else:
+            response = await self._hedged(send, delay)
+        window.record(time.perf_counter() - started)
+        return response
+
+    async def _hedged(self, send: Callable[[], Awaitable[httpx.Response]], delay: float) -> httpx.Response:
+        """Start send(); if it has not finished after delay, race a second copy and keep the first success"""
+        primary = asyncio.ensure_future(send())
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.hedges_sent += 1
+            hedge = asyncio.ensure_future(send())
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                        return task.result()
+            # Both copies failed; surface the original error
+            return primary.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> dict:
+        return {
+            "retry_attempts": self.retry_attempts,
+            "retries": self.retries,
+            "retries_exhausted": self.retries_exhausted,
+            "hedge_enabled": self.hedge_enabled,
+            "hedge_percentile": self.hedge_percentile,
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            "breakers": {
+                key: {
+                    **breaker.get_stats(),
+                    "p95_ms": self._p95_ms(key)
+                }
+                for key, breaker in self._breakers.items()
+            }
+        }
+
+    def _p95_ms(self, key: str) -> Optional[float]:
+        window = self._latencies.get(key)
+        p95 = window.percentile(95) if window else None
+        return round(p95 * 1000, 3) if p95 is not None else None
+
+
+# Global policy for Supabase calls
+supabase_policy = UpstreamPolicy()
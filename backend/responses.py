@@ -0,0 +1,68 @@
+"""
+Fast JSON responses for rows that come straight from the storage layer
+Storage rows are already JSON-ready, so list endpoints return them through
+ORJSONResponse instead of re-validating every row against the response_model
+and running jsonable_encoder; the response_model still documents the schema
+"""
+
+import os
+from decimal import Decimal
+from typing import Any, List, Optional, Type
+
+import orjson
+from dotenv import load_dotenv
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+load_dotenv(override=True)
+
+# Set to false to send rows through response_model validation again (e.g. while changing a schema)
+TRUST_STORAGE_ROWS = os.getenv("TRUST_STORAGE_ROWS", "true").lower() == "true"
+
+
+def json_default(value: Any) -> Any:
+    """Types orjson does not serialise natively, converted as jsonable_encoder would"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def project_rows(rows: List[dict], model: Type[BaseModel]) -> List[dict]:
+    """Drop columns the model does not declare, as response_model_exclude_unset would"""
+    fields = model.model_fields
+    # Every row of a page has the same keys, so the first one decides whether to copy
+    if not rows or rows[0].keys() <= fields.keys():
+        return rows
+    return [{key: value for key, value in row.items() if key in fields} for row in rows]
+
+
+def json_rows(rows: Any, response: Optional[Response] = None, model: Optional[Type[BaseModel]] = None):
+    """
+    Return storage rows without response_model revalidation
+
+    Headers already set on the endpoint's `response` (cursors, ETag) are carried over.
+    Responses (e.g. a 304 from fetch_page) are passed through unchanged.
+    """
+    if isinstance(rows, Response) or not TRUST_STORAGE_ROWS:
+        return rows
+
+    if model is not None:
+        rows = project_rows(rows, model)
+
+    result = ORJSONResponse(rows)
+    if response is not None:
+        result.headers.raw.extend(response.headers.raw)
+    return result
+
+
+def ndjson_lines(rows: List[dict]) -> bytes:
+    """Rows as newline-delimited JSON"""
+    return b"".join(orjson.dumps(row, default=json_default) + b"\n" for row in rows)
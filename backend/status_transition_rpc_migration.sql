@@ -0,0 +1,60 @@
+-- Migration: status transitions in one round trip on the PostgREST backend
+-- PATCH cannot return the values a row had before the update, so without this
+-- function the backend reads the current statuses first and then PATCHes
+-- conditionally on them (two round trips per status write). The function does
+-- both in one statement, the same way the asyncpg backend does, and returns each
+-- updated row as JSON with its previous status added as "previous_status".
+--
+-- Called as POST /rest/v1/rpc/status_transition with
+--   {"p_table": "parcels", "p_filters": {"id": "..."}, "p_changes": {"status": "..."}}
+-- Filters are equality matches; a JSON array matches any of its values and null
+-- matches NULL. It runs with the caller's privileges, so RLS applies as for PATCH.
+
+CREATE OR REPLACE FUNCTION public.status_transition(p_table text, p_filters jsonb, p_changes jsonb)
+RETURNS SETOF jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    assignments text;
+    conditions text;
+BEGIN
+    IF p_table NOT IN ('parcels', 'pickup_requests') THEN
+        RAISE EXCEPTION 'status_transition: unsupported table %', p_table USING ERRCODE = '22023';
+    END IF;
+
+    SELECT string_agg(format('%I = r.%I', key, key), ', ')
+    INTO assignments
+    FROM jsonb_object_keys(p_changes) AS key;
+
+    IF assignments IS NULL THEN
+        RAISE EXCEPTION 'status_transition: no changes' USING ERRCODE = '22023';
+    END IF;
+
+    -- Values are passed as untyped literals so they take the column's type and indexes apply
+    SELECT coalesce(string_agg(
+        CASE jsonb_typeof(value)
+            WHEN 'null' THEN format('t.%I IS NULL', key)
+            WHEN 'array' THEN format(
+                't.%I = ANY (%L)', key,
+                (SELECT coalesce(array_agg(element), '{}') FROM jsonb_array_elements_text(value) AS element)::text
+            )
+            ELSE format('t.%I = %L', key, value #>> '{}')
+        END,
+        ' AND '
+    ), 'true')
+    INTO conditions
+    FROM jsonb_each(p_filters);
+
+    -- The locked subquery reads the committed status each matched row had before this write
+    RETURN QUERY EXECUTE format(
+        'UPDATE %1$I AS t SET %2$s '
+        'FROM (SELECT t.id, t.status FROM %1$I AS t WHERE %3$s FOR UPDATE) AS old, '
+        'jsonb_populate_record(NULL::%1$I, $1) AS r '
+        'WHERE t.id = old.id '
+        'RETURNING to_jsonb(t) || jsonb_build_object(''previous_status'', old.status)',
+        p_table, assignments, conditions
+    ) USING p_changes;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.status_transition(text, jsonb, jsonb) TO anon, authenticated, service_role;
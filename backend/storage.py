@@ -0,0 +1,177 @@
+"""
+Storage layer: one repository per table, backed by PostgREST or Postgres
+STORAGE_BACKEND selects the implementation ("postgrest" or "asyncpg").
+Both return rows as JSON-ready dicts (UUIDs and timestamps as strings),
+so route handlers do not depend on the backend
+"""
+
+import base64
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+load_dotenv(override=True)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgrest").lower()
+
+
+class Contains(NamedTuple):
+    """Filter value for a case-insensitive substring match"""
+    text: str
+
+
+# column -> value. A list, tuple or set matches any of its values,
+# None matches NULL and Contains does a substring match
+Filters = Optional[Dict[str, Any]]
+Rows = Union[dict, Sequence[dict]]
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of a row"""
+    raw = json.dumps([row.get("created_at"), row.get("id")]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Decode a cursor from encode_cursor into (created_at, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(created_at), str(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def split_columns(columns: str) -> List[str]:
+    """Column names of a comma-separated projection ("*" for all columns)"""
+    return [column.strip() for column in columns.split(",") if column.strip()]
+
+
+class Table(ABC):
+    """
+    Repository for one table
+
+    `columns` arguments are comma-separated column lists, or "*".
+    Errors are raised as HTTPException with the status the database reported.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @abstractmethod
+    async def find(self, filters: Filters = None, columns: str = "*", limit: Optional[int] = None) -> List[dict]:
+        """Rows matching filters, in no particular order"""
+
+    async def get(self, row_id: str, columns: str = "*") -> Optional[dict]:
+        """One row by primary key"""
+        rows = await self.find({"id": row_id}, columns)
+        return rows[0] if rows else None
+
+    @abstractmethod
+    async def page(
+        self,
+        filters: Filters,
+        limit: int,
+        cursor: Optional[str] = None,
+        columns: str = "*"
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Keyset page ordered newest first by (created_at, id), returning (rows, next_cursor)"""
+
+    @abstractmethod
+    async def count(self, filters: Filters = None) -> int:
+        """Number of rows matching filters"""
+
+    @abstractmethod
+    async def insert(
+        self,
+        rows: Rows,
+        columns: str = "*",
+        on_conflict: Optional[str] = None,
+        ignore_duplicates: bool = False,
+        returning: bool = True
+    ) -> List[dict]:
+        """
+        Insert one row or many in a single statement, returning the stored rows
+
+        With ignore_duplicates, rows that conflict on the on_conflict columns are skipped.
+        """
+
+    @abstractmethod
+    async def update(self, filters: Filters, changes: dict, columns: str = "*") -> List[dict]:
+        """Apply changes to every row matching filters, returning the updated rows"""
+
+    @abstractmethod
+    async def transition(self, filters: Filters, changes: dict, columns: str = "*") -> List[dict]:
+        """
+        Like update, but each returned row also has previous_status, its status before the write
+        (columns must include id)
+
+        Status counters use it to apply the transition without rescanning.
+        """
+
+    @abstractmethod
+    async def delete(self, filters: Filters, columns: str = "*") -> List[dict]:
+        """Delete every row matching filters, returning the deleted rows"""
+
+    @abstractmethod
+    def scan_pages(self, columns: str, filters: Filters = None) -> AsyncIterator[List[dict]]:
+        """Every matching row in pages, ordered by id (columns must include id)"""
+
+    async def scan(self, columns: str, filters: Filters = None) -> List[dict]:
+        """Every matching row, ordered by id (columns must include id)"""
+        return [row async for page in self.scan_pages(columns, filters) for row in page]
+
+    @abstractmethod
+    async def created_since(self, since: str, columns: str) -> List[dict]:
+        """Rows created at or after since, ordered by (created_at, id)"""
+
+
+class ParcelTable(Table):
+    @abstractmethod
+    async def available_for_pickup(self, sender_id: str) -> List[dict]:
+        """A sender's pending parcels that are not in any pickup request"""
+
+
+class PickupParcelTable(Table):
+    @abstractmethod
+    async def parcels_in_request(self, request_id: str, columns: str = "*") -> List[dict]:
+        """Parcel rows linked to a pickup request through the junction table"""
+
+
+class Storage:
+    """The repositories of one backend, plus its connection lifecycle and stats"""
+
+    backend = ""
+    profiles: Table
+    parcels: ParcelTable
+    pickup_requests: Table
+    pickup_parcels: PickupParcelTable
+    couriers: Table
+
+    async def start(self):
+        """Open connections (called from the app lifespan)"""
+
+    async def close(self):
+        """Close all pooled connections"""
+
+    def pool_stats(self) -> dict:
+        return {}
+
+    def get_stats(self) -> dict:
+        return {"backend": self.backend, "pool": self.pool_stats()}
+
+
+def create_storage(backend: str = None, **options) -> Storage:
+    """Storage for the configured backend; asyncpg is only imported when selected"""
+    backend = (backend or STORAGE_BACKEND).lower()
+    if backend == "postgrest":
+        from storage_postgrest import PostgrestStorage
+        return PostgrestStorage(**options)
+    if backend in ("asyncpg", "postgres"):
+        from storage_asyncpg import AsyncpgStorage
+        return AsyncpgStorage(**options)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
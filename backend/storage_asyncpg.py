@@ -0,0 +1,454 @@
+"""
+Direct Postgres storage backend (asyncpg)
+Queries go straight to Postgres over a per-worker connection pool using the
+binary protocol. SQL text depends only on the query shape (lists are bound
+as arrays with = ANY), so asyncpg's per-connection statement cache prepares
+each shape once and reuses it
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import asyncpg
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from storage import (
+    Contains,
+    Filters,
+    ParcelTable,
+    PickupParcelTable,
+    Rows,
+    Storage,
+    Table,
+    decode_cursor,
+    encode_cursor,
+    split_columns,
+)
+from tracing import record_upstream_call
+
+load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Pool configuration (per worker process)
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "2"))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+# Prepared statements cached per connection; must be 0 behind a transaction-mode pooler (pgbouncer, Supavisor :6543)
+DATABASE_STATEMENT_CACHE_SIZE = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "100"))
+# Timeouts (seconds)
+DATABASE_COMMAND_TIMEOUT = float(os.getenv("DATABASE_COMMAND_TIMEOUT", "15"))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "10"))
+# Rows per page of a full-table scan (filter and counter rebuilds)
+DATABASE_SCAN_PAGE_SIZE = int(os.getenv("DATABASE_SCAN_PAGE_SIZE", "2000"))
+
+TABLES = ["profiles", "parcels", "pickup_requests", "pickup_request_parcels", "couriers"]
+
+# Postgres errors mapped to the status PostgREST would have returned
+CONFLICT_ERRORS = (asyncpg.UniqueViolationError, asyncpg.ForeignKeyViolationError)
+BAD_REQUEST_ERRORS = (
+    asyncpg.DataError,
+    asyncpg.CheckViolationError,
+    asyncpg.NotNullViolationError,
+    asyncpg.UndefinedColumnError
+)
+UNAVAILABLE_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.InterfaceError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError
+)
+
+
+def to_param(udt: str, value):
+    """Python value asyncpg can bind for a column type (JSON clients send dates as strings)"""
+    if value is None:
+        return None
+    if udt in ("timestamptz", "timestamp"):
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+    if udt == "date":
+        if isinstance(value, str):
+            return date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value).date()
+        return value
+    if udt in ("int2", "int4", "int8"):
+        return int(value)
+    if udt in ("float4", "float8"):
+        return float(value)
+    if udt == "numeric":
+        return Decimal(str(value))
+    if udt == "bool" and isinstance(value, str):
+        return value.lower() == "true"
+    if udt in ("json", "jsonb"):
+        return value if isinstance(value, str) else json.dumps(value)
+    if udt in ("text", "varchar", "bpchar") and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+# Column types converted to their PostgREST JSON form; everything else is already JSON-ready
+OUTPUT_CONVERTERS = {
+    "uuid": str,
+    "timestamptz": datetime.isoformat,
+    "timestamp": datetime.isoformat,
+    "date": date.isoformat,
+    "numeric": float,
+}
+
+
+def escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class SqlTable(Table):
+    def __init__(self, name: str, storage: "AsyncpgStorage"):
+        super().__init__(name)
+        self.storage = storage
+        # column -> type name (information_schema udt_name), loaded when the pool starts
+        self.types: Dict[str, str] = {}
+        self.converters: Dict[str, Callable] = {}
+
+    def load_columns(self, types: Dict[str, str]):
+        self.types = types
+        self.converters = {
+            column: OUTPUT_CONVERTERS[udt] for column, udt in types.items() if udt in OUTPUT_CONVERTERS
+        }
+
+    def _type(self, column: str) -> str:
+        # Column names are interpolated into SQL, so only known columns get through
+        if column not in self.types:
+            raise HTTPException(status_code=400, detail=f"Unknown column {column} on {self.name}")
+        return self.types[column]
+
+    def _columns(self, columns: str, alias: str = "") -> str:
+        prefix = f"{alias}." if alias else ""
+        if columns == "*":
+            return f"{prefix}*"
+        names = split_columns(columns)
+        for column in names:
+            self._type(column)
+        return ", ".join(f"{prefix}{column}" for column in names)
+
+    def _param(self, column: str, value):
+        udt = self._type(column)
+        try:
+            return to_param(udt, value)
+        except (ValueError, TypeError, ArithmeticError):
+            raise HTTPException(status_code=400, detail=f"Invalid {udt} value for {column}: {value!r}")
+
+    def _where(self, filters: Filters, args: list) -> List[str]:
+        """SQL conditions for filters, appending their values to args"""
+        clauses = []
+        for column, value in (filters or {}).items():
+            udt = self._type(column)
+            if value is None:
+                clauses.append(f"{column} IS NULL")
+            elif isinstance(value, Contains):
+                args.append(f"%{escape_like(value.text)}%")
+                clauses.append(f"{column} ILIKE ${len(args)}")
+            elif isinstance(value, (list, tuple, set)):
+                # One array parameter, so the statement is the same for any list length
+                args.append([self._param(column, v) for v in dict.fromkeys(value)])
+                clauses.append(f"{column} = ANY(${len(args)}::{udt}[])")
+            else:
+                args.append(self._param(column, value))
+                clauses.append(f"{column} = ${len(args)}")
+        return clauses
+
+    @staticmethod
+    def _where_sql(clauses: List[str]) -> str:
+        return f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    def to_dict(self, record) -> dict:
+        converters = self.converters
+        row = {}
+        for column, value in record.items():
+            if value is not None and column in converters:
+                value = converters[column](value)
+            row[column] = value
+        return row
+
+    async def _fetch(self, sql: str, args: list) -> List[dict]:
+        records = await self.storage.run("fetch", self.name, sql, args)
+        return [self.to_dict(record) for record in records]
+
+    async def find(self, filters: Filters = None, columns: str = "*", limit: Optional[int] = None) -> List[dict]:
+        args = []
+        sql = f"SELECT {self._columns(columns)} FROM {self.name}{self._where_sql(self._where(filters, args))}"
+        if limit is not None:
+            args.append(limit)
+            sql += f" LIMIT ${len(args)}"
+        return await self._fetch(sql, args)
+
+    async def page(self, filters: Filters, limit: int, cursor: Optional[str] = None, columns: str = "*"):
+        args = []
+        clauses = self._where(filters, args)
+
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            args.extend([self._param("created_at", created_at), self._param("id", row_id)])
+            # Row comparison, so an index on (created_at, id) serves it as a single range scan
+            clauses.append(f"(created_at, id) < (${len(args) - 1}, ${len(args)})")
+
+        # Fetch one extra row to learn whether another page exists
+        args.append(limit + 1)
+        rows = await self._fetch(
+            f"SELECT {self._columns(columns)} FROM {self.name}{self._where_sql(clauses)} "
+            f"ORDER BY created_at DESC, id DESC LIMIT ${len(args)}",
+            args
+        )
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_cursor(rows[-1])
+
+        return rows, None
+
+    async def count(self, filters: Filters = None) -> int:
+        args = []
+        sql = f"SELECT count(*) FROM {self.name}{self._where_sql(self._where(filters, args))}"
+        return await self.storage.run("fetchval", self.name, sql, args)
+
+    async def insert(
+        self,
+        rows: Rows,
+        columns: str = "*",
+        on_conflict: Optional[str] = None,
+        ignore_duplicates: bool = False,
+        returning: bool = True
+    ) -> List[dict]:
+        rows = [rows] if isinstance(rows, dict) else list(rows)
+        if not rows:
+            return []
+
+        names = list(dict.fromkeys(column for row in rows for column in row))
+        # One array per column through unnest(): the statement is the same for any row count
+        args = [[self._param(column, row.get(column)) for row in rows] for column in names]
+        arrays = ", ".join(f"${i}::{self._type(column)}[]" for i, column in enumerate(names, 1))
+        sql = f"INSERT INTO {self.name} ({', '.join(names)}) SELECT * FROM unnest({arrays})"
+
+        if ignore_duplicates:
+            target = f" ({self._columns(on_conflict)})" if on_conflict else ""
+            sql += f" ON CONFLICT{target} DO NOTHING"
+        if not returning:
+            await self.storage.run("execute", self.name, sql, args)
+            return []
+        return await self._fetch(f"{sql} RETURNING {self._columns(columns)}", args)
+
+    async def update(self, filters: Filters, changes: dict, columns: str = "*") -> List[dict]:
+        args = []
+        assignments = []
+        for column, value in changes.items():
+            args.append(self._param(column, value))
+            assignments.append(f"{column} = ${len(args)}")
+        where = self._where_sql(self._where(filters, args))
+        return await self._fetch(
+            f"UPDATE {self.name} SET {', '.join(assignments)}{where} RETURNING {self._columns(columns)}",
+            args
+        )
+
+    async def transition(self, filters: Filters, changes: dict, columns: str = "*") -> List[dict]:
+        args = []
+        assignments = []
+        for column, value in changes.items():
+            args.append(self._param(column, value))
+            assignments.append(f"{column} = ${len(args)}")
+        where = self._where_sql(self._where(filters, args))
+        # The locked subquery reads the committed status each matched row had before this write
+        return await self._fetch(
+            f"UPDATE {self.name} AS t SET {', '.join(assignments)} "
+            f"FROM (SELECT id, status FROM {self.name}{where} FOR UPDATE) AS old "
+            f"WHERE t.id = old.id RETURNING {self._columns(columns, 't')}, old.status AS previous_status",
+            args
+        )
+
+    async def delete(self, filters: Filters, columns: str = "*") -> List[dict]:
+        args = []
+        where = self._where_sql(self._where(filters, args))
+        return await self._fetch(f"DELETE FROM {self.name}{where} RETURNING {self._columns(columns)}", args)
+
+    async def scan_pages(self, columns: str, filters: Filters = None) -> AsyncIterator[List[dict]]:
+        # Keyset pages by id, so a scan of a large table never holds every row at once
+        last_id = None
+
+        while True:
+            args = []
+            clauses = self._where(filters, args)
+            if last_id is not None:
+                args.append(self._param("id", last_id))
+                clauses.append(f"id > ${len(args)}")
+            args.append(DATABASE_SCAN_PAGE_SIZE)
+            page = await self._fetch(
+                f"SELECT {self._columns(columns)} FROM {self.name}{self._where_sql(clauses)} ORDER BY id LIMIT ${len(args)}",
+                args
+            )
+            if not page:
+                break
+            yield page
+            if len(page) < DATABASE_SCAN_PAGE_SIZE:
+                break
+            last_id = page[-1]["id"]
+
+    async def created_since(self, since: str, columns: str) -> List[dict]:
+        return await self._fetch(
+            f"SELECT {self._columns(columns)} FROM {self.name} WHERE created_at >= $1 ORDER BY created_at, id",
+            [self._param("created_at", since)]
+        )
+
+
+class SqlParcels(SqlTable, ParcelTable):
+    async def available_for_pickup(self, sender_id: str) -> List[dict]:
+        return await self._fetch(
+            "SELECT p.* FROM parcels p "
+            "WHERE p.sender_id = $1 AND p.status = 'pending' "
+            "AND NOT EXISTS (SELECT 1 FROM pickup_request_parcels j WHERE j.parcel_id = p.id)",
+            [self._param("sender_id", sender_id)]
+        )
+
+
+class SqlPickupParcels(SqlTable, PickupParcelTable):
+    async def parcels_in_request(self, request_id: str, columns: str = "*") -> List[dict]:
+        parcels = self.storage.parcels
+        records = await self.storage.run(
+            "fetch",
+            self.name,
+            f"SELECT {parcels._columns(columns, 'p')} FROM {self.name} j "
+            f"JOIN parcels p ON p.id = j.parcel_id "
+            f"WHERE j.pickup_request_id = $1 ORDER BY j.created_at, j.id",
+            [self._param("pickup_request_id", request_id)]
+        )
+        return [parcels.to_dict(record) for record in records]
+
+
+class AsyncpgStorage(Storage):
+    backend = "asyncpg"
+
+    def __init__(self, dsn: str = None):
+        self.dsn = dsn or DATABASE_URL
+        self.pool: Optional[asyncpg.Pool] = None
+        self._starting = asyncio.Lock()
+        self.profiles = SqlTable("profiles", self)
+        self.parcels = SqlParcels("parcels", self)
+        self.pickup_requests = SqlTable("pickup_requests", self)
+        self.pickup_parcels = SqlPickupParcels("pickup_request_parcels", self)
+        self.couriers = SqlTable("couriers", self)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.total_queries = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.errors = 0
+        self.pool_timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def tables(self) -> Dict[str, SqlTable]:
+        return {
+            table.name: table
+            for table in (self.profiles, self.parcels, self.pickup_requests, self.pickup_parcels, self.couriers)
+        }
+
+    async def start(self):
+        """Create the pool and load column types (called from the app lifespan)"""
+        async with self._starting:
+            if self.pool is not None:
+                return
+            if not self.dsn:
+                raise HTTPException(status_code=500, detail="DATABASE_URL is not set")
+            pool = await asyncpg.create_pool(
+                self.dsn,
+                min_size=DATABASE_POOL_MIN_SIZE,
+                max_size=DATABASE_POOL_MAX_SIZE,
+                statement_cache_size=DATABASE_STATEMENT_CACHE_SIZE,
+                command_timeout=DATABASE_COMMAND_TIMEOUT
+            )
+            rows = await pool.fetch(
+                "SELECT table_name, column_name, udt_name FROM information_schema.columns "
+                "WHERE table_schema = 'public' AND table_name = ANY($1::text[])",
+                TABLES
+            )
+            types: Dict[str, Dict[str, str]] = {name: {} for name in TABLES}
+            for row in rows:
+                types[row["table_name"]][row["column_name"]] = row["udt_name"]
+            for name, table in self.tables.items():
+                if not types[name]:
+                    logger.warning("Table %s not found in the database", name)
+                table.load_columns(types[name])
+            self.pool = pool
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def run(self, kind: str, table: str, sql: str, args: list):
+        """Run one statement on a pooled connection, recording it in the request trace"""
+        if self.pool is None:
+            # Scripts that import main without running the lifespan still get a pool
+            await self.start()
+
+        started = time.perf_counter()
+        ok = False
+        self.total_queries += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            try:
+                connection = await self.pool.acquire(timeout=DATABASE_POOL_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.pool_timeouts += 1
+                raise
+            self._record_wait(time.perf_counter() - started)
+            try:
+                result = await getattr(connection, kind)(sql, *args)
+            finally:
+                await self.pool.release(connection)
+            ok = True
+            return result
+        except CONFLICT_ERRORS as e:
+            raise HTTPException(status_code=409, detail=f"Database error: {e}")
+        except BAD_REQUEST_ERRORS as e:
+            raise HTTPException(status_code=400, detail=f"Database error: {e}")
+        except UNAVAILABLE_ERRORS as e:
+            raise HTTPException(status_code=503, detail=f"Database unavailable: {e!r}")
+        except asyncpg.PostgresError as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {e}")
+        finally:
+            self.in_flight -= 1
+            if not ok:
+                self.errors += 1
+            # The statement text (placeholders, no values) is the query shape
+            record_upstream_call("SQL", table, 200 if ok else None, time.perf_counter() - started, 0, shape=sql)
+
+    def _record_wait(self, wait_seconds: float):
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def pool_stats(self) -> dict:
+        """Pool configuration and usage counters for this worker"""
+        avg_wait = self.total_wait_seconds / self.total_queries if self.total_queries else 0.0
+        return {
+            "min_size": DATABASE_POOL_MIN_SIZE,
+            "max_size": DATABASE_POOL_MAX_SIZE,
+            "statement_cache_size": DATABASE_STATEMENT_CACHE_SIZE,
+            "connections": self.pool.get_size() if self.pool else 0,
+            "idle_connections": self.pool.get_idle_size() if self.pool else 0,
+            "total_queries": self.total_queries,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "saturation": round(self.in_flight / DATABASE_POOL_MAX_SIZE, 3),
+            "peak_saturation": round(self.peak_in_flight / DATABASE_POOL_MAX_SIZE, 3),
+            "errors": self.errors,
+            "pool_timeouts": self.pool_timeouts,
+            "avg_wait_ms": round(avg_wait * 1000, 3),
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 3)
+        }
@@ -0,0 +1,452 @@
+"""
+PostgREST storage backend
+Every repository call becomes one or more Supabase REST requests sent through
+the shared HTTP pool, the retry/circuit breaker policy and read coalescing
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import quote, urlsplit
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from cache import SingleFlight
+from resilience import CircuitOpenError, supabase_policy
+from storage import (
+    Contains,
+    Filters,
+    ParcelTable,
+    PickupParcelTable,
+    Rows,
+    Storage,
+    Table,
+    decode_cursor,
+    encode_cursor,
+    split_columns,
+)
+from supabase_client import supabase_http
+from tracing import record_upstream_call
+
+load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+# in.() filters travel in the URL, so long ID lists are split to stay well under proxy URL limits
+SUPABASE_IN_FILTER_MAX_CHARS = int(os.getenv("SUPABASE_IN_FILTER_MAX_CHARS", "6000"))
+# Concurrent identical GETs share one upstream call
+SUPABASE_COALESCE_READS = os.getenv("SUPABASE_COALESCE_READS", "true").lower() == "true"
+# Page size for full table scans
+SUPABASE_SCAN_PAGE_SIZE = int(os.getenv("SUPABASE_SCAN_PAGE_SIZE", "1000"))
+# Attempts at a status transition whose rows keep changing between the read and the PATCH
+SUPABASE_TRANSITION_ATTEMPTS = int(os.getenv("SUPABASE_TRANSITION_ATTEMPTS", "3"))
+
+# Whether rpc/status_transition (status_transition_rpc_migration.sql) is installed;
+# cleared on the first 404, after which status writes use a read and a conditional PATCH
+status_transition_rpc = True
+
+
+def supabase_headers(headers: dict = None) -> dict:
+    """Build Supabase request headers"""
+    if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+        raise HTTPException(status_code=500, detail="Supabase configuration missing")
+
+    # Use service key for backend operations to bypass RLS
+    auth_key = SUPABASE_SERVICE_KEY if SUPABASE_SERVICE_KEY else SUPABASE_ANON_KEY
+
+    default_headers = {
+        "apikey": auth_key,
+        "Authorization": f"Bearer {auth_key}",
+        "Content-Type": "application/json"
+    }
+
+    if headers:
+        default_headers.update(headers)
+
+    return default_headers
+
+# In-flight Supabase GETs keyed by URL, headers (which carry the auth context)
+# and the table's write generation
+supabase_reads = SingleFlight()
+
+# Completed writes per table. A GET issued after a write returns gets a new key,
+# so it never joins a GET that started before the write committed
+table_write_generations: Dict[str, int] = {}
+
+def bump_write_generation(table: str):
+    table_write_generations[table] = table_write_generations.get(table, 0) + 1
+
+async def send_supabase_request(method: str, url: str, headers: dict, data=None):
+    """
+    Send one request upstream through the retry/circuit breaker policy,
+    sharing in-flight GETs between identical callers
+    """
+    # One breaker per PostgREST table (the last path segment)
+    endpoint_key = urlsplit(url).path.rsplit("/", 1)[-1]
+
+    def send():
+        return supabase_http.request(
+            method,
+            url,
+            headers=headers,
+            json=data if method in ("POST", "PUT", "PATCH") else None
+        )
+
+    def call():
+        return supabase_policy.call(endpoint_key, method, send)
+
+    started = time.perf_counter()
+    response = None
+    try:
+        if method in ("POST", "PUT", "PATCH", "DELETE"):
+            try:
+                response = await call()
+            finally:
+                # Bumped even on failure, since the write may have committed anyway
+                bump_write_generation(endpoint_key)
+        elif method != "GET" or not SUPABASE_COALESCE_READS:
+            response = await call()
+        else:
+            # Callers share the raw response and each parses its own copy of the body
+            key = (url, tuple(sorted(headers.items())), table_write_generations.get(endpoint_key, 0))
+            response = await supabase_reads.do(key, call)
+        return response
+    finally:
+        record_upstream_call(
+            method,
+            url,
+            response.status_code if response is not None else None,
+            time.perf_counter() - started,
+            len(response.content) if response is not None else 0
+        )
+
+async def supabase_request(endpoint: str, method: str = "GET", data=None, headers: dict = None):
+    """Make requests to Supabase API"""
+    default_headers = supabase_headers(headers)
+    url = f"{SUPABASE_URL}/rest/v1/{endpoint}"
+
+    if method not in ("GET", "POST", "PUT", "PATCH", "DELETE"):
+        raise HTTPException(status_code=400, detail="Invalid HTTP method")
+
+    try:
+        response = await send_supabase_request(method, url, default_headers, data)
+
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=f"Supabase error: {response.text}")
+
+        # Handle empty responses (common with POST/PUT operations)
+        if response.text.strip():
+            try:
+                return response.json()
+            except:
+                # If JSON parsing fails, return empty dict
+                return {}
+        else:
+            # For successful POST/PUT operations, return the data that was sent
+            return data if data else {}
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=f"Supabase unavailable: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Supabase request failed: {str(e)}")
+
+async def supabase_count(endpoint: str) -> int:
+    """Count rows matching a PostgREST query without downloading them (HEAD + Prefer: count=exact)"""
+    url = f"{SUPABASE_URL}/rest/v1/{endpoint}"
+
+    try:
+        response = await send_supabase_request("HEAD", url, supabase_headers({"Prefer": "count=exact"}))
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=f"Supabase unavailable: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Supabase request failed: {str(e)}")
+
+    if response.status_code >= 400:
+        raise HTTPException(status_code=response.status_code, detail=f"Supabase error: {response.text}")
+
+    # Content-Range looks like "0-24/3573" or "*/0"; the part after the slash is the total
+    total = response.headers.get("content-range", "*/0").rsplit("/", 1)[-1]
+    return int(total) if total.isdigit() else 0
+
+def chunk_in_values(values: List[str], max_chars: int = None) -> List[List[str]]:
+    """Split values into chunks whose comma-joined length fits an in.() filter"""
+    max_chars = max_chars or SUPABASE_IN_FILTER_MAX_CHARS
+    chunks = []
+    current = []
+    current_len = 0
+    for value in values:
+        value_len = len(value) + 1
+        if current and current_len + value_len > max_chars:
+            chunks.append(current)
+            current = []
+            current_len = 0
+        current.append(value)
+        current_len += value_len
+    if current:
+        chunks.append(current)
+    return chunks
+
+def filter_params(filters: Filters) -> List[str]:
+    """PostgREST query parameters for a filters dict"""
+    params = []
+    for column, value in (filters or {}).items():
+        if value is None:
+            params.append(f"{column}=is.null")
+        elif isinstance(value, Contains):
+            params.append(f"{column}=ilike.*{value.text}*")
+        elif isinstance(value, (list, tuple, set)):
+            params.append(f"{column}=in.({','.join(str(v) for v in value)})")
+        else:
+            params.append(f"{column}=eq.{value}")
+    return params
+
+def split_in_filter(filters: Filters) -> List[dict]:
+    """
+    Copies of filters with the first list-valued filter split by chunk_in_values
+
+    Returns no copies when that list is empty, since nothing can match.
+    """
+    filters = dict(filters or {})
+    for column, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            values = list(dict.fromkeys(str(v) for v in value))
+            return [{**filters, column: chunk} for chunk in chunk_in_values(values)]
+    return [filters]
+
+
+class PostgrestTable(Table):
+    def _endpoint(self, *params: str) -> str:
+        params = [param for param in params if param]
+        return f"{self.name}?{'&'.join(params)}" if params else self.name
+
+    @staticmethod
+    def _select(columns: str) -> str:
+        return f"select={columns}" if columns != "*" else ""
+
+    async def _each_chunk(self, method: str, filters: Filters, columns: str, data: dict = None) -> List[dict]:
+        """Run one request per in.() chunk concurrently and combine the returned rows"""
+        headers = {"Prefer": "return=representation"} if method != "GET" else None
+        results = await asyncio.gather(*[
+            supabase_request(
+                self._endpoint(*filter_params(chunk), self._select(columns)),
+                method,
+                data,
+                headers=headers
+            )
+            for chunk in split_in_filter(filters)
+        ])
+        return [row for rows in results if isinstance(rows, list) for row in rows]
+
+    async def find(self, filters: Filters = None, columns: str = "*", limit: Optional[int] = None) -> List[dict]:
+        if limit is None:
+            return await self._each_chunk("GET", filters, columns)
+        rows = await supabase_request(
+            self._endpoint(*filter_params(filters), self._select(columns), f"limit={limit}"),
+            "GET"
+        )
+        return rows or []
+
+    async def page(self, filters: Filters, limit: int, cursor: Optional[str] = None, columns: str = "*"):
+        params = filter_params(filters)
+
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            keyset = f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}"))'
+            params.append(f"or={quote(keyset, safe='(),.')}")
+
+        # Fetch one extra row to learn whether another page exists
+        rows = await supabase_request(
+            "&".join([f"{self.name}?select={columns}", *params, f"order=created_at.desc,id.desc&limit={limit + 1}"]),
+            "GET"
+        ) or []
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_cursor(rows[-1])
+
+        return rows, None
+
+    async def count(self, filters: Filters = None) -> int:
+        return await supabase_count(self._endpoint(*filter_params(filters)))
+
+    async def insert(
+        self,
+        rows: Rows,
+        columns: str = "*",
+        on_conflict: Optional[str] = None,
+        ignore_duplicates: bool = False,
+        returning: bool = True
+    ) -> List[dict]:
+        prefer = ["return=representation" if returning else "return=minimal"]
+        if ignore_duplicates:
+            prefer.insert(0, "resolution=ignore-duplicates")
+
+        result = await supabase_request(
+            self._endpoint(
+                self._select(columns) if returning else "",
+                f"on_conflict={on_conflict}" if on_conflict else ""
+            ),
+            "POST",
+            rows if isinstance(rows, dict) else list(rows),
+            headers={"Prefer": ",".join(prefer)}
+        )
+        return result if returning and isinstance(result, list) else []
+
+    async def update(self, filters: Filters, changes: dict, columns: str = "*") -> List[dict]:
+        return await self._each_chunk("PATCH", filters, columns, changes)
+
+    async def transition(self, filters: Filters, changes: dict, columns: str = "*") -> List[dict]:
+        global status_transition_rpc
+        if status_transition_rpc and not any(isinstance(value, Contains) for value in (filters or {}).values()):
+            try:
+                rows = await supabase_request("rpc/status_transition", "POST", {
+                    "p_table": self.name,
+                    "p_filters": {
+                        column: list(value) if isinstance(value, (list, tuple, set)) else value
+                        for column, value in (filters or {}).items()
+                    },
+                    "p_changes": changes
+                })
+            except HTTPException as e:
+                # 404 until status_transition_rpc_migration.sql has been run
+                if e.status_code != 404:
+                    raise
+                status_transition_rpc = False
+                logger.warning("rpc/status_transition not found; status writes take two round trips until the migration is run")
+            else:
+                if columns == "*":
+                    return rows or []
+                keep = set(split_columns(columns)) | {"previous_status"}
+                return [{key: value for key, value in row.items() if key in keep} for row in rows or []]
+            finally:
+                # The call is keyed as rpc/status_transition, so bump the table it wrote to as well
+                bump_write_generation(self.name)
+
+        return await self._transition_in_two_steps(filters, changes, columns)
+
+    async def _transition_in_two_steps(self, filters: Filters, changes: dict, columns: str) -> List[dict]:
+        # PATCH cannot return old values, so read the current statuses and make each
+        # PATCH conditional on them; rows that changed in between are read again
+        updated = []
+        for _ in range(SUPABASE_TRANSITION_ATTEMPTS):
+            current = await self.find(filters, "id,status")
+            if not current:
+                break
+
+            by_status = {}
+            for row in current:
+                by_status.setdefault(row.get("status"), []).append(row["id"])
+            results = await asyncio.gather(*[
+                self.update({**filters, "id": ids, "status": status}, changes, columns)
+                for status, ids in by_status.items()
+            ])
+
+            for status, rows in zip(by_status, results):
+                updated.extend({**row, "previous_status": status} for row in rows)
+            if sum(len(rows) for rows in results) == len(current):
+                break
+            done = {row["id"] for rows in results for row in rows}
+            filters = {**filters, "id": [row["id"] for row in current if row["id"] not in done]}
+
+        return updated
+
+    async def delete(self, filters: Filters, columns: str = "*") -> List[dict]:
+        return await self._each_chunk("DELETE", filters, columns)
+
+    async def scan_pages(self, columns: str, filters: Filters = None) -> AsyncIterator[List[dict]]:
+        # Keyset pages by id, since PostgREST caps the rows returned per request
+        last_id = None
+
+        while True:
+            params = [f"select={columns}", "order=id.asc", f"limit={SUPABASE_SCAN_PAGE_SIZE}", *filter_params(filters)]
+            if last_id is not None:
+                params.append(f"id=gt.{last_id}")
+            page = await supabase_request(self._endpoint(*params), "GET")
+            if not page:
+                break
+            yield page
+            if len(page) < SUPABASE_SCAN_PAGE_SIZE:
+                break
+            last_id = page[-1]["id"]
+
+    async def created_since(self, since: str, columns: str) -> List[dict]:
+        base = f"{self.name}?select={columns}&created_at=gte.{quote(since)}"
+        rows = []
+        last = None
+
+        while True:
+            endpoint = f"{base}&order=created_at.asc,id.asc&limit={SUPABASE_SCAN_PAGE_SIZE}"
+            if last is not None:
+                keyset = f'(created_at.gt."{last["created_at"]}",and(created_at.eq."{last["created_at"]}",id.gt."{last["id"]}"))'
+                endpoint += f"&or={quote(keyset, safe='(),.')}"
+            page = await supabase_request(endpoint, "GET")
+            if not page:
+                break
+            rows.extend(page)
+            last = page[-1]
+            if len(page) < SUPABASE_SCAN_PAGE_SIZE:
+                break
+
+        return rows
+
+
+class PostgrestParcels(PostgrestTable, ParcelTable):
+    async def available_for_pickup(self, sender_id: str) -> List[dict]:
+        # Pending parcels with no junction row, as a single anti-join:
+        # left-embed pickup_request_parcels and keep only rows where the embed is null
+        parcels = await supabase_request(
+            f"parcels?sender_id=eq.{sender_id}&status=eq.pending"
+            f"&select=*,pickup_request_parcels!left(parcel_id)"
+            f"&pickup_request_parcels=is.null",
+            "GET"
+        )
+
+        for parcel in parcels or []:
+            parcel.pop("pickup_request_parcels", None)
+
+        return parcels or []
+
+
+class PostgrestPickupParcels(PostgrestTable, PickupParcelTable):
+    async def parcels_in_request(self, request_id: str, columns: str = "*") -> List[dict]:
+        # Junction rows with their parcel embedded, in one request
+        rows = await supabase_request(
+            f"{self.name}?pickup_request_id=eq.{request_id}&select=parcel_id,parcels({columns})",
+            "GET"
+        )
+        return [row["parcels"] for row in rows or [] if row.get("parcels")]
+
+
+class PostgrestStorage(Storage):
+    backend = "postgrest"
+
+    def __init__(self):
+        self.profiles = PostgrestTable("profiles")
+        self.parcels = PostgrestParcels("parcels")
+        self.pickup_requests = PostgrestTable("pickup_requests")
+        self.pickup_parcels = PostgrestPickupParcels("pickup_request_parcels")
+        self.couriers = PostgrestTable("couriers")
+
+    async def start(self):
+        # One pooled Supabase client per worker, reused across requests
+        await supabase_http.start()
+
+    async def close(self):
+        await supabase_http.close()
+
+    def pool_stats(self) -> dict:
+        return supabase_http.get_stats()
+
+    def get_stats(self) -> dict:
+        return {
+            **super().get_stats(),
+            "reads": {"enabled": SUPABASE_COALESCE_READS, **supabase_reads.get_stats()},
+            "resilience": supabase_policy.get_stats()
+        }
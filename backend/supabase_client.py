@@ -0,0 +1,147 @@
+"""
+Shared HTTP client for Supabase
+Keeps one pooled, keep-alive httpx.AsyncClient per worker process and
+records connection pool statistics so the pool can be sized per worker
+"""
+
+import os
+import time
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# Pool configuration (per worker process)
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+SUPABASE_POOL_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30"))
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "true").lower() == "true"
+
+# Timeouts (seconds)
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "15"))
+SUPABASE_WRITE_TIMEOUT = float(os.getenv("SUPABASE_WRITE_TIMEOUT", "15"))
+SUPABASE_POOL_TIMEOUT = float(os.getenv("SUPABASE_POOL_TIMEOUT", "10"))
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (installed with httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class SupabaseHTTPClient:
+    """Owns the shared AsyncClient and tracks pool saturation and wait time"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.http2 = SUPABASE_HTTP2 and _http2_available()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset all pool counters"""
+        self.total_requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+        self.pool_timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _create_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=SUPABASE_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=SUPABASE_POOL_KEEPALIVE_EXPIRY
+        )
+        timeout = httpx.Timeout(
+            connect=SUPABASE_CONNECT_TIMEOUT,
+            read=SUPABASE_READ_TIMEOUT,
+            write=SUPABASE_WRITE_TIMEOUT,
+            pool=SUPABASE_POOL_TIMEOUT
+        )
+        return httpx.AsyncClient(limits=limits, timeout=timeout, http2=self.http2)
+
+    async def start(self):
+        """Create the shared client (called from the app lifespan)"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+
+    async def close(self):
+        """Close the shared client and all pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Scripts that import main without running the lifespan still get a client
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def request(self, method: str, url: str, headers: dict = None, json=None) -> httpx.Response:
+        """Send a request through the shared pool, recording wait time"""
+        started = time.perf_counter()
+        acquired = False
+
+        async def trace(event_name: str, info: dict):
+            nonlocal acquired
+            # The first connect or send event marks the moment the pool handed out a connection
+            if event_name == "connection.connect_tcp.started":
+                self.connections_opened += 1
+            if not acquired and (
+                event_name == "connection.connect_tcp.started"
+                or event_name.endswith("send_request_headers.started")
+            ):
+                acquired = True
+                self._record_wait(time.perf_counter() - started)
+
+        self.total_requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await self.client.request(
+                method,
+                url,
+                headers=headers,
+                json=json,
+                extensions={"trace": trace}
+            )
+        except httpx.PoolTimeout:
+            self.pool_timeouts += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def _record_wait(self, wait_seconds: float):
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def get_stats(self) -> dict:
+        """Pool configuration and usage counters for this worker"""
+        avg_wait = self.total_wait_seconds / self.total_requests if self.total_requests else 0.0
+        return {
+            "http2": self.http2,
+            "max_connections": SUPABASE_POOL_MAX_CONNECTIONS,
+            "max_keepalive_connections": SUPABASE_POOL_MAX_KEEPALIVE,
+            "keepalive_expiry": SUPABASE_POOL_KEEPALIVE_EXPIRY,
+            "total_requests": self.total_requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "saturation": round(self.in_flight / SUPABASE_POOL_MAX_CONNECTIONS, 3),
+            "peak_saturation": round(self.peak_in_flight / SUPABASE_POOL_MAX_CONNECTIONS, 3),
+            "connections_opened": self.connections_opened,
+            "pool_timeouts": self.pool_timeouts,
+            "avg_wait_ms": round(avg_wait * 1000, 3),
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 3)
+        }
+
+
+# Global client instance
+supabase_http = SupabaseHTTPClient()
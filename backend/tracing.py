@@ -0,0 +1,179 @@
+"""
+Request-scoped tracing of upstream (Supabase) calls and SQL statements
+Every call made while handling a request is recorded in a context variable.
+Responses get a Server-Timing header, and requests that make too many calls,
+or repeat the same query shape, are reported as likely N+1 patterns
+"""
+
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_TRACE_ENABLED = os.getenv("UPSTREAM_TRACE_ENABLED", "true").lower() == "true"
+# Warn when one request makes more than this many upstream calls
+UPSTREAM_TRACE_MAX_CALLS = int(os.getenv("UPSTREAM_TRACE_MAX_CALLS", "10"))
+# Warn when one request repeats the same query shape more than this many times
+UPSTREAM_TRACE_MAX_REPEATS = int(os.getenv("UPSTREAM_TRACE_MAX_REPEATS", "3"))
+
+# Query parameters whose values are part of the query shape rather than data
+SHAPE_PARAMS = {"select", "order", "on_conflict"}
+
+
+def query_shape(url: str) -> str:
+    """
+    Endpoint with filter values stripped, e.g. "parcels?id=eq&select=*"
+
+    Two calls with the same shape differ only in their filter values, which is
+    what a per-row loop looks like from the outside.
+    """
+    parts = urlsplit(url)
+    table = parts.path.rsplit("/", 1)[-1]
+    params = []
+    for key, value in parse_qsl(parts.query, keep_blank_values=True):
+        if key in SHAPE_PARAMS:
+            params.append(f"{key}={value}")
+        elif key in ("limit", "offset"):
+            params.append(key)
+        else:
+            # Keep the operator (eq, in, ilike, ...) and drop the value
+            params.append(f"{key}={value.split('.', 1)[0]}")
+    return f"{table}?{'&'.join(sorted(params))}" if params else table
+
+
+class UpstreamCall:
+    __slots__ = ("method", "shape", "status", "duration", "bytes")
+
+    def __init__(self, method: str, shape: str, status: Optional[int], duration: float, size: int):
+        self.method = method
+        self.shape = shape
+        self.status = status
+        self.duration = duration
+        self.bytes = size
+
+
+class RequestTrace:
+    """Upstream calls made while handling one inbound request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls: List[UpstreamCall] = []
+
+    def record(self, method: str, url: str, status: Optional[int], duration: float, size: int, shape: str = None):
+        self.calls.append(UpstreamCall(method, shape or query_shape(url), status, duration, size))
+
+    @property
+    def upstream_seconds(self) -> float:
+        # Summed, so concurrent calls can add up to more than the wall time
+        return sum(call.duration for call in self.calls)
+
+    def repeated_shapes(self, max_repeats: int) -> List[tuple]:
+        counts = Counter(f"{call.method} {call.shape}" for call in self.calls)
+        return [(shape, count) for shape, count in counts.most_common() if count > max_repeats]
+
+    def server_timing(self) -> str:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        upstream_ms = self.upstream_seconds * 1000
+        upstream_bytes = sum(call.bytes for call in self.calls)
+        return (
+            f'supabase;dur={upstream_ms:.1f};desc="{len(self.calls)} calls, {upstream_bytes} bytes", '
+            f"app;dur={total_ms:.1f}"
+        )
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("upstream_trace", default=None)
+
+
+def record_upstream_call(
+    method: str,
+    url: str,
+    status: Optional[int],
+    duration: float,
+    size: int,
+    shape: str = None
+):
+    """
+    Add a call to the current request's trace (no-op outside a request)
+
+    shape defaults to query_shape(url); SQL callers pass the statement text.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(method, url, status, duration, size, shape)
+
+
+class TraceStats:
+    def __init__(self):
+        self.requests_traced = 0
+        self.call_limit_warnings = 0
+        self.repeat_warnings = 0
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": UPSTREAM_TRACE_ENABLED,
+            "max_calls": UPSTREAM_TRACE_MAX_CALLS,
+            "max_repeats": UPSTREAM_TRACE_MAX_REPEATS,
+            "requests_traced": self.requests_traced,
+            "call_limit_warnings": self.call_limit_warnings,
+            "repeat_warnings": self.repeat_warnings
+        }
+
+
+trace_stats = TraceStats()
+
+
+class UpstreamTraceMiddleware:
+    """Opens a trace per HTTP request, adds Server-Timing and reports N+1 suspects"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not UPSTREAM_TRACE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Streaming responses only count the calls made before the first byte
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            trace_stats.requests_traced += 1
+            self._report(scope, trace)
+
+    @staticmethod
+    def _report(scope, trace: RequestTrace):
+        route = getattr(scope.get("route"), "path", None) or scope.get("path")
+        request_name = f"{scope['method']} {route}"
+
+        if len(trace.calls) > UPSTREAM_TRACE_MAX_CALLS:
+            trace_stats.call_limit_warnings += 1
+            logger.warning(
+                "%s made %d upstream calls (limit %d, %.1f ms total)",
+                request_name, len(trace.calls), UPSTREAM_TRACE_MAX_CALLS, trace.upstream_seconds * 1000
+            )
+
+        repeated = trace.repeated_shapes(UPSTREAM_TRACE_MAX_REPEATS)
+        if repeated:
+            trace_stats.repeat_warnings += 1
+            summary = ", ".join(f"{shape} x{count}" for shape, count in repeated)
+            logger.warning("Possible N+1 in %s: %s", request_name, summary)
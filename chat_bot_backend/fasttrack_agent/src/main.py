@@ -22,6 +22,7 @@ from config import settings
 from orchestration import orchestrator
 from ingestion import ingestion_pipeline
 from vector_store import vector_store
+from metrics import PrometheusMiddleware, metrics_response
 
 
 # Initialize FastAPI app
@@ -40,6 +41,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Add request metrics middleware (added last so it wraps everything, including CORS)
+app.add_middleware(PrometheusMiddleware)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory=str(settings.STATIC_DIR)), name="static")
 
@@ -242,6 +246,17 @@ async def health_check():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics endpoint
+
+    Returns:
+        Request counts, in-flight requests and latency per route
+    """
+    return metrics_response()
+
+
 # Run the application
 if __name__ == "__main__":
     import uvicorn
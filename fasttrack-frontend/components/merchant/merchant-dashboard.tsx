@@ -21,6 +21,7 @@ import {
 } from "lucide-react";
 import { useAuth } from "@/contexts/auth-context";
 import { Parcel, PickupRequest } from "@/lib/supabase";
+import { fetchAllPages } from "@/lib/api";
 import { ParcelCreateForm } from "@/components/parcel/parcel-create-form";
 import { PickupRequestForm } from "@/components/parcel/pickup-request-form";
 import { PickupRequestList } from "@/components/parcel/pickup-request-list";
@@ -73,7 +74,7 @@ export function MerchantDashboard() {
 
         // Fetch parcels from backend
         console.log("🔍 Fetching parcels from backend...");
-        const parcelsResponse = await fetch(
+        const parcelsResponse = await fetchAllPages(
           `${process.env.NEXT_PUBLIC_API_URL}/parcels`,
           {
             headers: {
@@ -172,7 +173,7 @@ export function MerchantDashboard() {
 
         // Fetch pickup requests from backend (if endpoint exists)
         try {
-          const pickupResponse = await fetch(
+          const pickupResponse = await fetchAllPages(
             `${process.env.NEXT_PUBLIC_API_URL}/pickup-requests`,
             {
               headers: {
@@ -230,7 +231,7 @@ export function MerchantDashboard() {
           return;
         }
 
-        const parcelsResponse = await fetch(
+        const parcelsResponse = await fetchAllPages(
           `${process.env.NEXT_PUBLIC_API_URL}/parcels`,
           {
             headers: {
@@ -20,6 +20,7 @@ import {
 import { Badge } from "@/components/ui/badge";
 import { useToast } from "@/hooks/use-toast";
 import { Parcel } from "@/lib/supabase"; // Import the global Parcel type
+import { fetchAllPages } from "@/lib/api";
 // Direct API calls for now'
 import {
   Package,
@@ -127,7 +128,7 @@ export function ParcelList({
         throw new Error("Not authenticated. Please login again.");
       }
 
-      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/parcels`, {
+      const response = await fetchAllPages(`${process.env.NEXT_PUBLIC_API_URL}/parcels`, {
         headers: {
           Authorization: `Bearer ${token}`,
           "Content-Type": "application/json",
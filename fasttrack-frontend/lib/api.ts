@@ -1,5 +1,32 @@
 import { Parcel } from "./supabase";
 
+// Drop-in for fetch() on a list endpoint: follows X-Next-Cursor and resolves to one
+// response whose JSON body holds every page's rows (or the first failed response)
+export async function fetchAllPages(
+  url: string,
+  init: RequestInit = {}
+): Promise<Response> {
+  const rows: unknown[] = [];
+  let cursor: string | null = null;
+  let response: Response;
+
+  do {
+    const separator = url.includes("?") ? "&" : "?";
+    response = await fetch(
+      cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url,
+      init
+    );
+    if (!response.ok) return response;
+    rows.push(...(await response.json()));
+    cursor = response.headers.get("X-Next-Cursor");
+  } while (cursor);
+
+  return new Response(JSON.stringify(rows), {
+    status: response.status,
+    headers: { "Content-Type": "application/json" },
+  });
+}
+
 class ApiClient {
   private baseUrl: string;
   private token: string | null = null;
@@ -20,6 +47,32 @@ class ApiClient {
     endpoint: string,
     options: RequestInit = {}
   ): Promise<T> {
+    const { data } = await this.requestWithHeaders<T>(endpoint, options);
+    return data;
+  }
+
+  // List endpoints return one page at a time; follow X-Next-Cursor to collect every row
+  private async requestAllPages<T>(endpoint: string): Promise<T[]> {
+    const rows: T[] = [];
+    let cursor: string | null = null;
+
+    do {
+      const separator = endpoint.includes("?") ? "&" : "?";
+      const pageEndpoint: string = cursor
+        ? `${endpoint}${separator}cursor=${encodeURIComponent(cursor)}`
+        : endpoint;
+      const { data, headers } = await this.requestWithHeaders<T[]>(pageEndpoint);
+      rows.push(...data);
+      cursor = headers.get("X-Next-Cursor");
+    } while (cursor);
+
+    return rows;
+  }
+
+  private async requestWithHeaders<T>(
+    endpoint: string,
+    options: RequestInit = {}
+  ): Promise<{ data: T; headers: Headers }> {
     const url = `${this.baseUrl}${endpoint}`;
 
     const headers: Record<string, string> = {
@@ -61,7 +114,7 @@ class ApiClient {
 
       const result = await response.json();
       console.log("🌐 API Success:", result);
-      return result;
+      return { data: result, headers: response.headers };
     } catch (error) {
       console.error(`🌐 API Request failed for ${url}:`, error);
       if (error instanceof Error) {
@@ -128,7 +181,7 @@ class ApiClient {
   }
 
   async getParcels() {
-    return this.request<any[]>("/parcels");
+    return this.requestAllPages<any>("/parcels");
   }
 
   async getParcel(id: string) {
@@ -164,14 +217,14 @@ class ApiClient {
       if (value) params.append(key, value as string);
     });
 
-    const response = await this.request<any[]>(
+    const response = await this.requestAllPages<any>(
       `/parcels/search?${params.toString()}`
     );
     return response;
   }
 
   async getParcelsByStatus(status: string): Promise<any[]> {
-    const response = await this.request<any[]>(`/parcels/status/${status}`);
+    const response = await this.requestAllPages<any>(`/parcels/status/${status}`);
     return response;
   }
 
@@ -189,7 +242,7 @@ class ApiClient {
   }
 
   async getPickupRequests() {
-    return this.request<any[]>("/pickup-requests");
+    return this.requestAllPages<any>("/pickup-requests");
   }
 
   async updatePickupRequest(id: string, updates: any) {
@@ -209,7 +262,7 @@ class ApiClient {
   }
 
   async getAllUsers() {
-    return this.request<any[]>("/admin/users");
+    return this.requestAllPages<any>("/admin/users");
   }
 
   async getPendingPickupRequests() {
@@ -231,7 +284,7 @@ class ApiClient {
   }
 
   async getCouriers() {
-    return this.request<any[]>("/admin/couriers");
+    return this.requestAllPages<any>("/admin/couriers");
   }
 
   async createCourier(courierData: any) {